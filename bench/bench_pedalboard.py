@@ -0,0 +1,291 @@
+"""Headless benchmarks of the input path against the simulated HID backend.
+
+Replays the captures in ``shutters/`` through ``sim/hid.py`` and records
+MIDI output with ``sim/rtmidi.py``, so no hardware or MIDI stack is needed:
+
+    python3 bench/bench_pedalboard.py
+    python3 bench/bench_pedalboard.py --counts 1,8,64 --duration 2 --rate 50
+
+For every simulated device count it reports:
+- process_inputs throughput with devices replaying as fast as possible
+- press-to-MIDI latency (p50/p99) in threaded mode, and in process mode
+  (readers in worker processes) to show what the process boundary adds
+- CPU per device in each run mode at the given report rate
+- joystick axis messages per second before and after filtering
+- MIDI Clock interval error and drift, idle and with devices being read
+- dispatch-table lookup and read-pass cost with 1 to 64 identical shutters
+"""
+import argparse
+import contextlib
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'sim'), ROOT]
+
+import hid  # noqa: E402  (simulated backend from sim/)
+import rtmidi  # noqa: E402  (simulated backend from sim/)
+import main as pedalboard  # noqa: E402
+from config.midi_config import midi_config  # noqa: E402
+from devices.axes import AxisFilter, AxisMapping  # noqa: E402
+from midi.controller import MIDIController  # noqa: E402
+from midi.tempo import CLOCK, PPQN, MIDIClock  # noqa: E402
+from runtime.monitor import DeviceMonitor  # noqa: E402
+
+DEVICE_KINDS = ('ab', 'm3', 'joystick')
+MODES = ('poll', 'event', 'threaded')
+# Time for worker processes to start before process-mode latency is measured (s)
+WORKER_STARTUP = 1.0
+WORKER_STARTUP_PER_DEVICE = 0.1
+
+
+def split_devices(count: int) -> dict:
+    """Spread ``count`` simulated units round-robin over the device kinds."""
+    devices = {kind: 0 for kind in DEVICE_KINDS}
+    for index in range(count):
+        devices[DEVICE_KINDS[index % len(DEVICE_KINDS)]] += 1
+    return {kind: n for kind, n in devices.items() if n}
+
+
+def build_manager(count: int, rate: float, isolated: bool = False, devices: dict = None):
+    devices = devices or split_devices(count)
+    hid.configure(devices=devices, rate=rate, loop=True)
+    # Worker processes start fresh and configure the simulator from the environment
+    os.environ['PEDALBOARD_SIM_DEVICES'] = ",".join(f"{kind}={n}" for kind, n in devices.items())
+    os.environ['PEDALBOARD_SIM_RATE'] = str(rate)
+    os.environ['PEDALBOARD_SIM_LOOP'] = '1'
+    manager = pedalboard.DeviceManager()
+    manager.midi_controller = MIDIController(midi_config)
+    DeviceMonitor(pedalboard.device_types(isolated), manager.attach_handler, manager.detach_handler).scan()
+    return manager
+
+
+def run_for(manager, mode: str, duration: float):
+    """Run one of the DeviceManager loops on a thread for ``duration`` seconds."""
+    target = {
+        'poll': manager.run_poll_loop,
+        'event': manager.run_event_loop,
+        'threaded': manager.run_threaded,
+        'process': manager.run_processes,
+    }[mode]
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    time.sleep(duration)
+    manager.stop()
+    thread.join()
+
+
+def bench_throughput(count: int, duration: float):
+    manager = build_manager(count, rate=0)
+    reads = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while time.perf_counter() < deadline:
+        manager.process_inputs()
+        reads += len(manager.handlers)
+    elapsed = time.perf_counter() - start
+    sent = manager.midi_controller.midi_out.sent
+    manager.cleanup()
+    return reads / elapsed, sent / elapsed
+
+
+def bench_latency(count: int, duration: float, rate: float, mode: str = 'threaded'):
+    manager = build_manager(count, rate, isolated=mode == 'process')
+    if mode == 'process':
+        # Leave interpreter start-up out of the measurement
+        run_for(manager, mode, WORKER_STARTUP + WORKER_STARTUP_PER_DEVICE * count)
+        manager.latency = pedalboard.LatencyTracker()
+        manager.running = True
+    run_for(manager, mode, duration)
+    total = manager.latency.stages['total']
+    manager.latency = pedalboard.LatencyTracker()
+    manager.cleanup()
+    return total.percentile(50) / 1e6, total.percentile(99) / 1e6
+
+
+def bench_cpu(count: int, duration: float, rate: float, mode: str):
+    manager = build_manager(count, rate)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    run_for(manager, mode, duration)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    manager.latency = pedalboard.LatencyTracker()
+    manager.cleanup()
+    return 100 * cpu / wall / count
+
+
+def bench_axes(duration: float, rate: float, mapping: AxisMapping):
+    """Feed a noisy stick sweep (0.5 Hz, +-2 raw jitter) through an axis filter.
+
+    Runs on simulated time so it measures the filter, not the clock.
+
+    Returns:
+        tuple: (raw changes/s in, CC messages/s out, microseconds per sample)
+    """
+    axis = AxisFilter(mapping)
+    noise = random.Random(0)
+    samples = int(duration * rate)
+    step_ns = int(1e9 / rate)
+    start = time.perf_counter()
+    for index in range(samples):
+        position = 128 + 127 * math.sin(2 * math.pi * 0.5 * index / rate)
+        raw = min(max(round(position) + noise.randint(-2, 2), 0), 255)
+        axis.update(raw, index * step_ns)
+    elapsed = time.perf_counter() - start
+    return axis.changes / duration, axis.sent / duration, 1e6 * elapsed / samples
+
+
+class SleepClock(threading.Thread):
+    """The naive clock: send, then sleep one period."""
+
+    def __init__(self, midi_out, bpm: float):
+        super().__init__(daemon=True)
+        self.midi_out = midi_out
+        self.period = 60 / (bpm * PPQN)
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.midi_out.send_message(CLOCK)
+            time.sleep(self.period)
+
+    def stop(self):
+        self.running = False
+        self.join()
+
+
+def bench_clock(duration: float, bpm: float, naive: bool = False, load: int = 0, rate: float = 20.0):
+    """Time MIDI Clock pulses, optionally while ``load`` devices are read in threaded mode.
+
+    Returns:
+        tuple: (p50, p99, max |tick interval - period| in µs, drift over the run in ms)
+    """
+    manager = build_manager(load, rate) if load else None
+    midi_out = rtmidi.MidiOut()
+    clock = SleepClock(midi_out, bpm) if naive else MIDIClock([midi_out])
+    if not naive:
+        clock.set_tempo(bpm)
+    clock.start()
+    if manager:
+        run_for(manager, 'threaded', duration)
+    else:
+        time.sleep(duration)
+    clock.stop()
+    if manager:
+        manager.cleanup()
+    period_ns = 60e9 / (bpm * PPQN)
+    stamps = [ns for ns, message in midi_out.messages if tuple(message) == CLOCK]
+    errors = sorted(abs(later - earlier - period_ns) for earlier, later in zip(stamps, stamps[1:]))
+    if not errors:
+        return 0.0, 0.0, 0.0, 0.0
+    drift_ns = stamps[-1] - stamps[0] - (len(stamps) - 1) * period_ns
+    return (errors[len(errors) // 2] / 1e3, errors[int(len(errors) * 0.99)] / 1e3,
+            errors[-1] / 1e3, drift_ns / 1e6)
+
+
+def bench_dispatch(units: int, duration: float):
+    """Per-press table lookup and per-pass read cost with ``units`` AB shutters."""
+    manager = build_manager(units, rate=0, devices={'ab': units})
+    presses = [(handler, button) for handler in manager.handlers
+               for button in handler.button_actions(handler.unit)]
+    lookups = 0
+    start = time.perf_counter()
+    deadline = start + duration / 2
+    while time.perf_counter() < deadline:
+        for handler, button in presses:
+            manager.resolve_action(handler, button)
+        lookups += len(presses)
+    lookup_ns = (time.perf_counter() - start) / lookups * 1e9
+
+    passes = 0
+    start = time.perf_counter()
+    deadline = start + duration / 2
+    while time.perf_counter() < deadline:
+        manager.process_inputs()
+        passes += 1
+    pass_us = (time.perf_counter() - start) / passes * 1e6
+    identities = len({handler.unit for handler in manager.handlers})
+    manager.cleanup()
+    return identities, lookup_ns, pass_us
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--counts", default="1,2,4,8,16,32,64",
+                        help="comma separated simulated device counts")
+    parser.add_argument("--duration", type=float, default=1.0,
+                        help="seconds per measurement")
+    parser.add_argument("--rate", type=float, default=20.0,
+                        help="reports per second per device for latency and CPU runs")
+    parser.add_argument("--modes", default=",".join(MODES),
+                        help="run modes to measure CPU for")
+    parser.add_argument("--axis-rate", type=float, default=1000.0,
+                        help="joystick axis samples per second for the axis filter run")
+    parser.add_argument("--bpm", type=float, default=120.0,
+                        help="tempo for the MIDI clock run")
+    parser.add_argument("--clock-load", type=int, default=8,
+                        help="simulated devices read while the clock runs under load")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    counts = [int(count) for count in args.counts.split(',')]
+    modes = [mode for mode in args.modes.split(',') if mode]
+
+    header = (f"{'devices':>7} {'reads/s':>11} {'sends/s':>9} {'p50 ms':>8} {'p99 ms':>8}"
+              f" {'proc p50':>9} {'proc p99':>9}")
+    header += "".join(f" {'cpu% ' + mode:>14}" for mode in modes)
+    print(f"Simulated HID benchmark: {args.duration}s per run, {args.rate:g} reports/s per device")
+    print(header)
+
+    for count in counts:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            reads, sends = bench_throughput(count, args.duration)
+            p50, p99 = bench_latency(count, args.duration, args.rate)
+            proc_p50, proc_p99 = bench_latency(count, args.duration, args.rate, 'process')
+            cpu = [bench_cpu(count, args.duration, args.rate, mode) for mode in modes]
+        row = (f"{count:>7} {reads:>11.0f} {sends:>9.0f} {p50:>8.3f} {p99:>8.3f}"
+               f" {proc_p50:>9.3f} {proc_p99:>9.3f}")
+        row += "".join(f" {value:>14.2f}" for value in cpu)
+        print(row, flush=True)
+
+    print(f"\nJoystick axis filter: {args.axis_rate:g} samples/s, 0.5 Hz sweep with jitter")
+    print(f"{'filter':>28} {'in/s':>8} {'out/s':>8} {'us/sample':>10}")
+    for label, mapping in (
+        ("changed values only", AxisMapping(cc=11, hysteresis=0, max_rate=0)),
+        ("hysteresis 2", AxisMapping(cc=11, max_rate=0)),
+        ("hysteresis 2, 100 msg/s", AxisMapping(cc=11)),
+        ("hysteresis 2, 30 msg/s", AxisMapping(cc=11, max_rate=30)),
+    ):
+        changes, sent, cost = bench_axes(max(args.duration, 2.0), args.axis_rate, mapping)
+        print(f"{label:>28} {changes:>8.0f} {sent:>8.0f} {cost:>10.2f}")
+
+    clock_duration = max(args.duration, 5.0)
+    print(f"\nMIDI clock: {args.bpm:g} BPM for {clock_duration:g}s, "
+          f"tick interval error and total drift")
+    print(f"{'scheduler':>28} {'p50 us':>8} {'p99 us':>8} {'max us':>8} {'drift ms':>9}")
+    for label, naive, load in (
+        ("sleep per tick", True, 0),
+        ("absolute deadlines", False, 0),
+        (f"absolute, {args.clock_load} devices", False, args.clock_load),
+    ):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            p50, p99, worst, drift = bench_clock(clock_duration, args.bpm, naive, load, args.rate)
+        print(f"{label:>28} {p50:>8.0f} {p99:>8.0f} {worst:>8.0f} {drift:>9.2f}")
+
+    print("\nDispatch: identical AB shutters, one (unit, button) table")
+    print(f"{'units':>7} {'ids':>5} {'ns/lookup':>10} {'us/pass':>9} {'us/unit':>8}")
+    for units in (1, 4, 16, 64):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            identities, lookup_ns, pass_us = bench_dispatch(units, args.duration)
+        print(f"{units:>7} {identities:>5} {lookup_ns:>10.0f} {pass_us:>9.1f} {pass_us / units:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+from runtime.gestures import Gesture, GestureConfig
+
+# Timing (ms): how long a hold becomes a long press, how soon a second tap
+# counts as a double tap, and how close two pedals must be for a chord
+long_press_ms = 500
+double_tap_ms = 300
+chord_ms = 50
+
+# Extra gestures per command key (from midi_config.commands). Keys listed
+# here wait until the gesture is decided; every other key fires on press.
+gestures = {
+    # '7': Gesture(long_press='8'),         # hold Delay to toggle Reverb
+    # 'a': Gesture(double_tap='c'),         # double tap Preset A for Preset C
+    # '1': Gesture(release='1'),            # Tunner only while held
+}
+
+# Keys pressed together on two pedals -> command key
+chords = {
+    # ('a', 'b'): 'h',
+}
+
+gesture_config = GestureConfig(
+    gestures=gestures,
+    chords=chords,
+    long_press_ms=long_press_ms,
+    double_tap_ms=double_tap_ms,
+    chord_ms=chord_ms
+)
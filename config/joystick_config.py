@@ -1,3 +1,4 @@
+from devices.axes import AxisMapping
 from devices.joystick import JoystickConfig
 
 vendor_id = 0x0810
@@ -16,9 +17,27 @@ actions = {
     'START': 'b',      
 }
 
+# Analog axes as expression pedals: report byte (1-4) -> continuous CC.
+# curve: 'linear', 'exp', 'log' or 's'; deadband/hysteresis in raw units
+# (0-255, centre 128); max_rate in messages per second per CC.
+axes = {
+    # 3: AxisMapping(cc=11, curve='s'),                       # left stick X -> wah
+    # 4: AxisMapping(cc=7, curve='exp', invert=True),         # left stick Y -> volume
+    # 1: AxisMapping(cc=20, deadband=6, max_rate=50),         # right stick X -> whammy
+}
+
+# Unit id -> {button: command key} for one physical unit, on top of the
+# mappings above. The id is the serial number, or the device path when
+# units share a serial; run main.py to see the id of every unit
+units = {
+    # '/dev/hidraw5': {'X': '8'},          # second joystick: X -> Reverb
+}
+
 joystick_config = JoystickConfig(
     vendor_id=vendor_id,
     product_id=product_id,
     actions=actions,
-    patterns={}
+    patterns={},
+    axes=axes,
+    units=units
 )
\ No newline at end of file
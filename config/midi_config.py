@@ -1,8 +1,15 @@
 from midi.controller import MIDIConfig
+from midi.routing import MIDIPort, Route
+from midi.scenes import Scene
+from midi.tempo import TempoConfig
 
 # MIDI Configuration
 midi_channel = 1
 port_name = "ARC MIDI Controller"
+# Send from a dedicated thread so terminal output never delays the next read
+async_output = True
+# Hold CCs back this long to collapse repeated values (ms, 0 = send immediately)
+coalesce_window_ms = 0
 
 # Key mapping to MIDI codes (key: (cc_number, description))
 commands = {
@@ -24,8 +31,45 @@ commands = {
     'h': (16, 'Preset H'),
 }
 
+# Additional output ports. The virtual port above is always available as 'main';
+# a non-virtual port connects to the existing port whose name contains `name`.
+ports = {
+    # 'katana': MIDIPort('KATANA', virtual=False),
+}
+
+# Optional per-key destinations (port, channel, cc, on_value, off_value).
+# Keys without an entry send their CC from `commands` on `midi_channel` of 'main'.
+routes = {
+    # '4': [Route('main', 1, 4), Route('katana', 1, 16)],
+}
+
+# Scenes: a key listed here recalls target states for several effects in one
+# burst (only the ones that change are sent) instead of toggling its own CC.
+# Optional bank select (CC 0/32) and Program Change go out first.
+scenes = {
+    # 'a': Scene({'3': True, '4': True, '5': False, '7': True}, program=0),
+    # 'b': Scene({'3': True, '4': False, '5': True, '7': False, '8': True}, program=1, bank=0),
+}
+
+# Follow changes made in BIAS FX or on the amp: open a MIDI input next to each
+# port and update effect states from received CC / Program Change messages.
+sync_input = False
+
+# Tap tempo: presses of `tap_key` set the tempo of a 24 PPQN MIDI Clock sent on
+# `ports`; `transport_key` sends Start/Stop. Map a button to the key with
+# `patterns` in a shutter config, e.g. (1, 2, 0): 'tap'.
+tempo = None
+# tempo = TempoConfig(tap_key='tap', transport_key='transport', bpm=120)
+
 midi_config = MIDIConfig(
     channel=midi_channel,
     port_name=port_name,
-    commands=commands
+    commands=commands,
+    async_output=async_output,
+    coalesce_window_ms=coalesce_window_ms,
+    ports=ports,
+    routes=routes,
+    scenes=scenes,
+    sync_input=sync_input,
+    tempo=tempo
 )
\ No newline at end of file
@@ -1,23 +1,26 @@
-import hid
 from devices.shutterAB import ShutterABConfig
 
-# Common IDs for all AB shutters
+# Common IDs for all AB shutters; the device monitor finds every
+# connected unit with these IDs at runtime
 vendor_id = 0x2717
 product_id = 0x0040
 
-# Find all connected AB devices
-def find_all_ab_shutters():
-    devices = hid.enumerate(vendor_id, product_id)
-    configs = []
-    
-    for device in devices:
-        configs.append(ShutterABConfig(
-            vendor_id=vendor_id,
-            product_id=product_id
-        ))
-    
-    print(f"Found {len(configs)} AB shutter(s)")
-    return configs
+# Report pattern -> command key, added to or replacing the handler's
+# BUTTON_PATTERNS (devices/shutterAB.py); reloadable with --watch-config
+patterns = {
+    # (1, 2, 0): 'c',                      # second button -> Preset C
+}
 
-# List of configurations for multiple AB shutters
-AB_SHUTTERS = find_all_ab_shutters()
\ No newline at end of file
+# Unit id -> {button: command key} for one physical unit, on top of the
+# mappings above. The id is the serial number, or the device path when
+# units share a serial; run main.py to see the id of every unit
+units = {
+    # '/dev/hidraw3': {'a': '5', 'b': '6'},  # this unit: Distortion / Chorus
+}
+
+ab_config = ShutterABConfig(
+    vendor_id=vendor_id,
+    product_id=product_id,
+    patterns=patterns,
+    units=units
+)
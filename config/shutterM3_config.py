@@ -1,23 +1,26 @@
-import hid
 from devices.shutterM3 import ShutterM3Config
 
-# Common IDs for all M3 shutters
+# Common IDs for all M3 shutters; the device monitor finds every
+# connected unit with these IDs at runtime
 vendor_id = 0x05ac
 product_id = 0x022c
 
-# Find all connected M3 devices
-def find_all_m3_shutters():
-    devices = hid.enumerate(vendor_id, product_id)
-    configs = []
-    
-    for device in devices:
-        configs.append(ShutterM3Config(
-            vendor_id=vendor_id,
-            product_id=product_id
-        ))
-    
-    print(f"Found {len(configs)} M3 shutter(s)")
-    return configs
+# Report pattern -> command key, added to or replacing the handler's
+# BUTTON_PATTERNS (devices/shutterM3.py); reloadable with --watch-config
+patterns = {
+    # (5, 40, 0, 5): '7',                  # left -> Delay instead of Preset A
+}
 
-# List of configurations for multiple M3 shutters
-M3_SHUTTERS = find_all_m3_shutters()
\ No newline at end of file
+# Unit id -> {button: command key} for one physical unit, on top of the
+# mappings above. The id is the serial number, or the device path when
+# units share a serial; run main.py to see the id of every unit
+units = {
+    # 'A1B2C3D4E5F6': {'a': '7'},          # this unit's left -> Delay
+}
+
+m3_config = ShutterM3Config(
+    vendor_id=vendor_id,
+    product_id=product_id,
+    patterns=patterns,
+    units=units
+)
@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+import math
+from typing import Callable, Dict, Optional, Sequence, Tuple, Union
+
+# Raw axis values are bytes with the stick centred at 128
+AXIS_CENTER = 128
+
+# Response curves: position in 0..1 -> output in 0..1
+CURVES: Dict[str, Callable[[float], float]] = {
+    'linear': lambda x: x,
+    # Fine control at the heel, fast at the toe (volume)
+    'exp': lambda x: x * x,
+    # Fast at the heel, fine control at the toe
+    'log': math.sqrt,
+    # Fine control at both ends (wah)
+    's': lambda x: x * x * (3 - 2 * x),
+}
+
+
+@dataclass
+class AxisMapping:
+    """Maps one analog axis (report byte) to a continuous Control Change."""
+    cc: int
+    # Curve name from CURVES, a callable 0..1 -> 0..1, or 256 explicit values
+    curve: Union[str, Callable[[float], float], Sequence[int]] = 'linear'
+    channel: Optional[int] = None
+    # Output range and direction
+    min_value: int = 0
+    max_value: int = 127
+    invert: bool = False
+    # Raw values within this distance of the centre read as the centre
+    deadband: int = 0
+    # A raw change must exceed this to move the output (the ends are always reachable)
+    hysteresis: int = 2
+    # At most this many messages per second for the CC (0 = unlimited)
+    max_rate: float = 100.0
+
+
+def build_curve_table(mapping: AxisMapping) -> Tuple[int, ...]:
+    """Precompute the CC value for every raw byte, deadband included."""
+    if not isinstance(mapping.curve, str) and not callable(mapping.curve):
+        table = tuple(int(value) for value in mapping.curve)
+        if len(table) != 256:
+            raise ValueError("An explicit axis curve needs 256 values")
+        return table
+
+    curve = CURVES[mapping.curve] if isinstance(mapping.curve, str) else mapping.curve
+    span = mapping.max_value - mapping.min_value
+    table = []
+    for raw in range(256):
+        if abs(raw - AXIS_CENTER) <= mapping.deadband:
+            raw = AXIS_CENTER
+        position = raw / 255
+        if mapping.invert:
+            position = 1 - position
+        table.append(mapping.min_value + round(span * min(max(curve(position), 0.0), 1.0)))
+    return tuple(table)
+
+
+class AxisFilter:
+    """Turns a stream of raw axis samples into as few CC values as needed.
+
+    Jitter smaller than the hysteresis is ignored, only values that differ
+    from the last one sent go out, and at most ``max_rate`` per second; a
+    value held back by the rate limit is kept and released by ``flush()``
+    once its interval has passed.
+    """
+
+    __slots__ = ('mapping', 'table', 'min_interval_ns', 'last_raw', 'last_value',
+                 'last_send_ns', 'pending', 'first_ns', 'samples', 'changes', 'sent')
+
+    def __init__(self, mapping: AxisMapping):
+        self.mapping = mapping
+        self.table = build_curve_table(mapping)
+        self.min_interval_ns = int(1e9 / mapping.max_rate) if mapping.max_rate > 0 else 0
+        self.last_raw: Optional[int] = None
+        self.last_value: Optional[int] = None
+        self.last_send_ns = 0
+        # Value held back by the rate limit
+        self.pending: Optional[int] = None
+        # Counters since the first sample: raw samples seen, raw samples
+        # that differed from the previous one, values sent
+        self.first_ns = 0
+        self.samples = 0
+        self.changes = 0
+        self.sent = 0
+
+    def update(self, raw: int, now_ns: int) -> Optional[int]:
+        """Feed one raw sample; returns the CC value to send, if any."""
+        if not self.samples:
+            self.first_ns = now_ns
+        self.samples += 1
+        last_raw = self.last_raw
+        if raw == last_raw:
+            return self.flush(now_ns)
+        self.changes += 1
+        if (last_raw is not None and abs(raw - last_raw) <= self.mapping.hysteresis
+                and raw not in (0, 255)):
+            return self.flush(now_ns)
+        self.last_raw = raw
+
+        value = self.table[raw]
+        if value == self.last_value:
+            self.pending = None
+            return None
+        if now_ns - self.last_send_ns < self.min_interval_ns:
+            self.pending = value
+            return None
+        return self._sent(value, now_ns)
+
+    def flush(self, now_ns: int) -> Optional[int]:
+        """Release a value held back by the rate limit once it may be sent."""
+        if self.pending is None or now_ns - self.last_send_ns < self.min_interval_ns:
+            return None
+        value, self.pending = self.pending, None
+        return self._sent(value, now_ns)
+
+    def _sent(self, value: int, now_ns: int) -> int:
+        self.last_value = value
+        self.last_send_ns = now_ns
+        self.sent += 1
+        return value
+
+    def stats(self, now_ns: int) -> str:
+        elapsed = max(now_ns - self.first_ns, 1) / 1e9 if self.samples else 0
+        if not elapsed:
+            return "no samples"
+        return (f"{self.samples / elapsed:.0f} samples/s, {self.changes / elapsed:.0f} changes/s in, "
+                f"{self.sent / elapsed:.0f} CC/s out")
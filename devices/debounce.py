@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from devices.patterns import RELEASE
+
+
+@dataclass(frozen=True)
+class DebounceProfile:
+    """Debounce windows of one kind of device (ms)."""
+    # A press of the same button this soon after its previous press is a
+    # retransmit (BLE devices resend reports) and is dropped
+    press_ms: float = 50
+    # A press this soon after the button was released is contact bounce
+    release_ms: float = 20
+    # A held button reports at least this often; a press after a longer
+    # silence is a new press whose release report was lost (BLE drops)
+    hold_ms: float = 500
+
+
+class InputState:
+    """Turns matched reports into press and release edges for one device.
+
+    Every button is tracked on its own: the first report of a press is an
+    edge, further reports while it is held are holds, and a release report
+    frees whatever is held. A lost release report does not leave a button
+    stuck: a report after ``hold_ms`` of silence, or a press of another
+    button on the device, ends the stale hold. Presses inside the
+    profile's windows are dropped as bounces. Timestamps are ``time.monotonic_ns()`` values and
+    all state lives in lists preallocated per button, so a report costs a
+    dict lookup and a few integer compares.
+    """
+
+    __slots__ = ('press_ns', 'release_ns', 'hold_ns', 'index', 'held', 'pressed_at', 'released_at',
+                 'seen_at', 'held_count', 'presses', 'holds', 'bounces', 'unmatched')
+
+    def __init__(self, profile: DebounceProfile, buttons: Iterable[str]):
+        self.press_ns = int(profile.press_ms * 1e6)
+        self.release_ns = int(profile.release_ms * 1e6)
+        self.hold_ns = int(profile.hold_ms * 1e6)
+        self.index = {button: i for i, button in enumerate(dict.fromkeys(buttons)) if button != RELEASE}
+        count = len(self.index)
+        self.held = [False] * count
+        # Monotonic ns of the last accepted press / release per button
+        self.pressed_at = [-self.press_ns] * count
+        self.released_at = [-self.release_ns] * count
+        # Monotonic ns of the last report of each held button
+        self.seen_at = [0] * count
+        self.held_count = 0
+        # Counters: press edges, repeated reports of a held button, dropped
+        # bounces, reports that matched no pattern
+        self.presses = 0
+        self.holds = 0
+        self.bounces = 0
+        self.unmatched = 0
+
+    def edge(self, action: Optional[str], now_ns: int) -> Optional[str]:
+        """Return ``action`` if the report is a new press or release edge."""
+        if action is None:
+            self.unmatched += 1
+            return None
+        if action == RELEASE:
+            return RELEASE if self.release(now_ns) else None
+        return action if self.press(action, now_ns) else None
+
+    def press(self, button: str, now_ns: int) -> bool:
+        i = self.index.get(button)
+        if i is None:
+            # Not one of the profile's buttons: no state to keep
+            return True
+        if self.held[i]:
+            if now_ns - self.seen_at[i] < self.hold_ns:
+                self.seen_at[i] = now_ns
+                self.holds += 1
+                return False
+            # Silent for longer than a hold: its release report was lost
+            self.held[i] = False
+            self.held_count -= 1
+            self.released_at[i] = self.seen_at[i]
+        if now_ns - self.pressed_at[i] < self.press_ns or now_ns - self.released_at[i] < self.release_ns:
+            self.bounces += 1
+            return False
+        if self.held_count:
+            # Another button still held means its release was lost
+            self.release(now_ns)
+        self.held[i] = True
+        self.held_count += 1
+        self.pressed_at[i] = now_ns
+        self.seen_at[i] = now_ns
+        self.presses += 1
+        return True
+
+    def release(self, now_ns: int) -> bool:
+        """Release every held button; False if nothing was held."""
+        if not self.held_count:
+            return False
+        held = self.held
+        i = 0
+        while self.held_count:
+            if held[i]:
+                held[i] = False
+                self.released_at[i] = now_ns
+                self.held_count -= 1
+            i += 1
+        return True
@@ -0,0 +1,67 @@
+"""Selects the HID backend the handlers and the device monitor use.
+
+``hidapi`` (the ``hid`` module) works everywhere; ``hidraw`` reads Linux
+``/dev/hidraw*`` nodes directly (see ``devices/hidraw.py``). ``auto``
+picks hidraw when a node is readable and falls back to hidapi otherwise.
+"""
+import logging
+import sys
+from typing import Optional
+from devices import hidraw
+
+try:
+    import hid
+except ImportError:
+    hid = None
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('auto', 'hidapi', 'hidraw')
+
+# Module implementing enumerate() and device(); hidapi until select() is called
+_backend = hid
+name = 'hidapi'
+
+
+def select(requested: str = 'auto') -> str:
+    """Switch backend; returns the name of the one in use.
+
+    Raises:
+        RuntimeError: If the requested backend can't be used here.
+    """
+    global _backend, name
+    if requested not in BACKENDS:
+        raise ValueError(f"Unknown HID backend '{requested}'")
+    if requested == 'auto':
+        # The simulated hid module (PYTHONPATH=sim) always wins over real nodes
+        simulated = getattr(hid, 'SIMULATED', False)
+        requested = 'hidraw' if sys.platform.startswith('linux') and not simulated and hidraw.available() else 'hidapi'
+    if requested == 'hidraw':
+        if not sys.platform.startswith('linux'):
+            raise RuntimeError("The hidraw backend needs Linux")
+        _backend = hidraw
+    else:
+        if hid is None:
+            raise RuntimeError("hidapi is not installed (pip install hidapi)")
+        _backend = hid
+    name = requested
+    logger.debug("HID backend: %s", name)
+    return name
+
+
+def enumerate(vendor_id: int = 0, product_id: int = 0):
+    return _backend.enumerate(vendor_id, product_id)
+
+
+def device():
+    return _backend.device()
+
+
+def device_info(path: bytes) -> Optional[dict]:
+    """Info of the device at ``path`` without enumerating the bus.
+
+    None if nothing is there, or if the backend can only tell from a full
+    enumeration (hidapi).
+    """
+    info = getattr(_backend, 'device_info', None)
+    return info(path) if info else None
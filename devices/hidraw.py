@@ -0,0 +1,181 @@
+"""Linux hidraw backend: reads ``/dev/hidraw*`` nodes directly.
+
+A drop-in for the parts of ``hid`` (hidapi) the handlers use, except that
+``read()`` fills a buffer preallocated per device and returns a
+``memoryview`` of it instead of a new list. The view is only valid until
+the next read of the same device. ``HidrawPoller`` waits on every open
+device with a single epoll.
+"""
+import glob
+import os
+import select
+from typing import Dict, List, Optional
+
+SYSFS_ROOT = '/sys/class/hidraw'
+DEV_ROOT = '/dev'
+# Largest report the handlers read
+REPORT_SIZE = 64
+
+
+def _uevent(name: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(SYSFS_ROOT, name, 'device', 'uevent'), encoding='utf-8') as uevent:
+            return dict(line.rstrip('\n').split('=', 1) for line in uevent if '=' in line)
+    except OSError:
+        return {}
+
+
+def _device_info(name: str) -> Optional[dict]:
+    """hidapi-style info dict for /dev/<name> from its sysfs uevent."""
+    uevent = _uevent(name)
+    try:
+        # HID_ID=<bus>:<vendor>:<product>, each in hex
+        _, vendor_id, product_id = (int(part, 16) for part in uevent['HID_ID'].split(':'))
+    except (KeyError, ValueError):
+        return None
+    return {
+        'path': os.path.join(DEV_ROOT, name).encode(),
+        'vendor_id': vendor_id,
+        'product_id': product_id,
+        'serial_number': uevent.get('HID_UNIQ', ''),
+        'manufacturer_string': '',
+        'product_string': uevent.get('HID_NAME', ''),
+        'interface_number': -1,
+    }
+
+
+def device_info(path: bytes) -> Optional[dict]:
+    """Info of the node at ``path`` from sysfs, None if there is none."""
+    return _device_info(os.path.basename(os.fsdecode(path)))
+
+
+def available() -> bool:
+    """True if at least one hidraw node exists and can be opened for reading."""
+    return any(os.access(node, os.R_OK) for node in glob.glob(os.path.join(DEV_ROOT, 'hidraw*')))
+
+
+def enumerate(vendor_id: int = 0, product_id: int = 0) -> List[dict]:
+    devices = []
+    for node in sorted(glob.glob(os.path.join(SYSFS_ROOT, 'hidraw*'))):
+        info = _device_info(os.path.basename(node))
+        if info is None:
+            continue
+        if vendor_id and info['vendor_id'] != vendor_id:
+            continue
+        if product_id and info['product_id'] != product_id:
+            continue
+        devices.append(info)
+    return devices
+
+
+class device:
+    """One open hidraw node, read with ``readinto`` into a fixed buffer."""
+
+    def __init__(self):
+        self.path: Optional[bytes] = None
+        self._fd = -1
+        self._file = None
+        self._buffer = bytearray(REPORT_SIZE)
+        self._view = memoryview(self._buffer)
+        self._empty = self._view[:0]
+        self._poll = None
+
+    def open(self, vendor_id: int, product_id: int, serial_number: Optional[str] = None):
+        for info in enumerate(vendor_id, product_id):
+            if serial_number is None or info['serial_number'] == serial_number:
+                return self.open_path(info['path'])
+        raise OSError(f"no hidraw device {vendor_id:04x}:{product_id:04x}")
+
+    def open_path(self, path: bytes):
+        self._fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+        self._file = os.fdopen(self._fd, 'rb', buffering=0)
+        self._poll = select.poll()
+        self._poll.register(self._fd, select.POLLIN)
+        self.path = path
+
+    def set_nonblocking(self, nonblocking: bool = True):
+        # Always non-blocking; read() waits in poll() when given a timeout
+        return 0
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def read(self, max_length: int = REPORT_SIZE, timeout_ms: int = 0):
+        """Return a memoryview of the next report, empty if none arrived.
+
+        Raises:
+            OSError: If the device is gone (e.g. ENODEV after unplugging).
+        """
+        if self._file is None:
+            raise OSError("device is not open")
+        if timeout_ms and not self._poll.poll(timeout_ms):
+            return self._empty
+        count = self._file.readinto(self._buffer)
+        if not count:
+            return self._empty
+        return self._view[:min(count, max_length)]
+
+    def close(self):
+        if self._file is not None:
+            self._poll = None
+            self._file.close()
+            self._file = None
+            self._fd = -1
+
+    def _info(self) -> dict:
+        if self.path is None:
+            return {}
+        return device_info(self.path) or {}
+
+    def get_serial_number_string(self) -> str:
+        return self._info().get('serial_number', '')
+
+    def get_product_string(self) -> str:
+        return self._info().get('product_string', '')
+
+    def get_manufacturer_string(self) -> str:
+        return ''
+
+
+class HidrawPoller:
+    """Waits on every open hidraw device with one epoll.
+
+    ``sync()`` keeps the registrations in line with the handler list;
+    ``wait()`` returns the handlers with a report ready to read.
+    """
+
+    def __init__(self):
+        self._epoll = select.epoll()
+        self._handlers: Dict[int, object] = {}
+        self._synced = None
+
+    def sync(self, handlers: List[object]):
+        # The handler list is replaced on every attach/detach, so an
+        # unchanged object means nothing to do
+        if handlers is self._synced:
+            return
+        self._synced = handlers
+        current = {}
+        for handler in handlers:
+            fileno = getattr(handler.device, 'fileno', None)
+            if fileno is not None and fileno() >= 0:
+                current[fileno()] = handler
+        for fd in list(self._handlers):
+            if current.get(fd) is not self._handlers[fd]:
+                try:
+                    self._epoll.unregister(fd)
+                except (OSError, ValueError):
+                    pass  # already closed, which removes it from the epoll
+                del self._handlers[fd]
+        for fd, handler in current.items():
+            if fd not in self._handlers:
+                self._epoll.register(fd, select.EPOLLIN)
+                self._handlers[fd] = handler
+
+    def wait(self, timeout_ms: int) -> List[object]:
+        events = self._epoll.poll(timeout_ms / 1000)
+        return [self._handlers[fd] for fd, _ in events if fd in self._handlers]
+
+    def close(self):
+        self._epoll.close()
+        self._handlers.clear()
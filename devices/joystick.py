@@ -1,7 +1,13 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import logging
 import time
-import hid
-from typing import Dict, Optional
+from devices import hidbackend
+from typing import Callable, Dict, Optional
+from devices.axes import AxisFilter, AxisMapping
+from devices.debounce import DebounceProfile, InputState
+from devices.patterns import ANY, RELEASE, PatternMatcher
+
+logger = logging.getLogger(__name__)
 
 @dataclass
 class JoystickConfig:
@@ -9,6 +15,12 @@ class JoystickConfig:
     product_id: int
     actions: Dict[str, str]
     patterns: Dict[str, list]
+    # Report byte (1-4) -> continuous CC mapping for the analog axes
+    axes: Dict[int, AxisMapping] = field(default_factory=dict)
+    # Overrides the handler's DEBOUNCE profile
+    debounce: Optional[DebounceProfile] = None
+    # Unit id (serial number, or path) -> {button: command key} for that unit only
+    units: Dict[str, Dict[str, str]] = field(default_factory=dict)
 
 class JoystickHandler:
     """Handles joystick input processing and button mapping."""
@@ -28,75 +40,144 @@ class JoystickHandler:
     
     IDLE_STATE = (15, 0)
     VALID_DATA_START = 1
+    # Pseudo-button reported when every button is released
+    IDLE = 'IDLE'
+    DEBOUNCE = DebounceProfile(press_ms=50, release_ms=10)
+
+    @classmethod
+    def build_patterns(cls, extra: Optional[Dict[str, list]] = None) -> dict:
+        """Report patterns for every button: byte 0 is the report id, bytes
+        1-4 the analog axes (ignored) and bytes 5/6 the button state."""
+        prefix = (cls.VALID_DATA_START, ANY, ANY, ANY, ANY)
+        patterns = {prefix + state: button for state, button in cls.BUTTON_MAPPING.items()}
+        patterns[prefix + cls.IDLE_STATE] = cls.IDLE
+        for button, pattern in (extra or {}).items():
+            patterns[tuple(pattern)] = button
+        return patterns
     
     def __init__(self, config: JoystickConfig):
         self.config = config
+        self.matcher = PatternMatcher(self.build_patterns(config.patterns)) if config.patterns else self.MATCHER
         self.device = None
-        self.last_action = None
-        self.debounce_time = 0.05
-        self.last_press_time = 0
+        self.path = None
+        # Stable identity of the physical unit, set when it is attached
+        self.unit: Optional[str] = None
+        # Press/release edges per button; a held button's reports are holds
+        buttons = [button for button in self.matcher.patterns.values() if button != self.IDLE]
+        self.input = InputState(config.debounce or self.DEBOUNCE, buttons)
+        # Monotonic timestamps (ns) of the last report and last match
+        self.read_ns = 0
+        self.match_ns = 0
+        # Source of those timestamps; a replay passes the recorded report times
+        self.clock = time.monotonic_ns
+        # Reports read and reads that returned nothing
+        self.reads = 0
+        self.empty_reads = 0
+        # Optional ReportRecorder receiving every raw report
+        self.recorder = None
+        # Analog axes: (report byte, filter), and the callback told
+        # (mapping, value) for every CC value that passes the filter
+        self.axes = [(index, AxisFilter(mapping)) for index, mapping in config.axes.items()]
+        self.on_axis: Optional[Callable[[AxisMapping, int], None]] = None
         
-    def connect(self):
+    def button_actions(self, unit: Optional[str]) -> Dict[str, str]:
+        """Command key of every mapped button on ``unit``."""
+        return {RELEASE: RELEASE, **self.config.actions, **self.config.units.get(unit, {})}
+
+    def reconfigure(self, config: JoystickConfig):
+        """Swap in a reloaded config; the device stays open.
+
+        Button actions live in the device manager's dispatch table, so only
+        changed patterns, debounce or axes rebuild anything here.
+        """
+        if config.patterns != self.config.patterns or config.debounce != self.config.debounce:
+            matcher = PatternMatcher(self.build_patterns(config.patterns)) if config.patterns else self.MATCHER
+            buttons = [button for button in matcher.patterns.values() if button != self.IDLE]
+            self.input = InputState(config.debounce or self.DEBOUNCE, buttons)
+            self.matcher = matcher
+        if config.axes != self.config.axes:
+            self.axes = [(index, AxisFilter(mapping)) for index, mapping in config.axes.items()]
+        self.config = config
+
+    def connect(self, path: Optional[bytes] = None):
         try:
-            self.device = hid.device()
-            self.device.open(self.config.vendor_id, self.config.product_id)
+            self.device = hidbackend.device()
+            if path is None:
+                self.device.open(self.config.vendor_id, self.config.product_id)
+            else:
+                self.device.open_path(path)
             self.device.set_nonblocking(True)
+            self.path = path
             return True
         except Exception as e:
-            print(f"Warning: Could not connect to joystick device: {e}")
+            logger.warning("Could not connect to joystick device: %s", e,
+                           extra={'device': self.__class__.__name__, 'path': path})
             self.device = None
             return False
             
-    def process_data(self, data, current_time):
+    def process_data(self, data, now_ns: int):
         if not data or len(data) < 8:
             return None
             
-        data = list(data)
+        button = self.matcher.match(data)
+        if button == self.IDLE:
+            button = RELEASE
+        return self.input.edge(button, now_ns)
         
-        if data[0] != self.VALID_DATA_START:
-            return None
-            
-        button_state = (data[5], data[6])
-        
-        if button_state == self.IDLE_STATE:
-            self.last_action = None
-            return None
-            
-        button = self.BUTTON_MAPPING.get(button_state)
-        if not button:
-            return None
-            
-        if (current_time - self.last_press_time) < self.debounce_time:
-            return None
-            
-        if button == self.last_action:
-            return None
-            
-        self.last_action = button
-        self.last_press_time = current_time
-        
-        return button
-        
-    def read(self):
+    def read(self, timeout_ms: int = 0):
+        # Reconnection is left to the device monitor
         if not self.device:
-            print("no joystick device found to read")
-            self.connect()
             return None
             
         try:
-            data = self.device.read(64)
+            data = self.device.read(64, timeout_ms)
             if not data:
+                self.empty_reads += 1
+                if self.axes:
+                    self.flush_axes(time.monotonic_ns())
                 return None
+            self.reads += 1
+            self.read_ns = self.clock()
+            if self.recorder:
+                self.recorder.record(self, data, self.read_ns)
+            if self.axes and len(data) >= 8 and data[0] == self.VALID_DATA_START:
+                self.update_axes(data, self.read_ns)
                 
-            return self.process_data(data, time.time())
+            button = self.process_data(data, self.read_ns)
+            if button:
+                self.match_ns = self.clock()
+            return button
                 
         except Exception as e:
             self.cleanup()
-            self.connect()
-            print(f"Error reading joystick: {e}")
+            logger.warning("Error reading joystick: %s", e,
+                           extra={'device': self.__class__.__name__, 'path': self.path})
             return None
             
+    def update_axes(self, data, now_ns: int):
+        """Run every mapped axis byte through its filter."""
+        for index, axis in self.axes:
+            value = axis.update(data[index], now_ns)
+            if value is not None and self.on_axis:
+                self.on_axis(axis.mapping, value)
+
+    def flush_axes(self, now_ns: int):
+        """Send values the rate limit held back while the stick is still."""
+        for _, axis in self.axes:
+            if axis.pending is not None:
+                value = axis.flush(now_ns)
+                if value is not None and self.on_axis:
+                    self.on_axis(axis.mapping, value)
+
+    def axis_stats(self):
+        now_ns = time.monotonic_ns()
+        return [f"byte {index} -> CC {axis.mapping.cc}: {axis.stats(now_ns)}" for index, axis in self.axes]
+
     def cleanup(self):
         if self.device:
             self.device.close()
-            self.device = None
\ No newline at end of file
+            self.device = None
+
+
+# Compiled once; handlers only recompile when their config adds patterns
+JoystickHandler.MATCHER = PatternMatcher(JoystickHandler.build_patterns())
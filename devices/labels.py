@@ -0,0 +1,12 @@
+"""How a device is named in logs, metrics and per-device state."""
+from typing import Optional, Union
+
+
+def path_label(path: Union[bytes, str, None]) -> str:
+    """A HID path as text; hidapi and hidraw paths are bytes."""
+    return path.decode(errors='replace') if isinstance(path, bytes) else str(path)
+
+
+def source_label(device: str, path: Optional[Union[bytes, str]]) -> str:
+    """``Handler:path``, the key of a device's gesture state and reports."""
+    return f"{device}:{path_label(path)}" if path else device
@@ -0,0 +1,103 @@
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+# Wildcard: matches any value at this offset
+ANY = None
+
+# Pseudo-action a handler reports when the held button is let go
+RELEASE = 'RELEASE'
+
+
+class Masked(NamedTuple):
+    """Matches a byte when ``byte & mask == value & mask``."""
+    value: int
+    mask: int
+
+
+# One entry of a pattern: an exact byte, ANY, or a Masked byte
+PatternByte = Union[int, Masked, None]
+
+
+def _byte_matches(spec: PatternByte, byte: int) -> bool:
+    if spec is ANY:
+        return True
+    if isinstance(spec, Masked):
+        return byte & spec.mask == spec.value & spec.mask
+    return byte == spec
+
+
+def pattern_matches(pattern: Sequence[PatternByte], data) -> bool:
+    """True if ``data`` starts with ``pattern`` (without compiling a matcher)."""
+    return len(data) >= len(pattern) and all(_byte_matches(spec, byte) for spec, byte in zip(pattern, data))
+
+
+class _Node:
+    __slots__ = ('next', 'action')
+
+    def __init__(self, action):
+        self.next: Sequence[Optional['_Node']] = _DEAD_END
+        self.action = action
+
+
+# Transition table of a node no pattern continues from
+_DEAD_END: Tuple[None, ...] = (None,) * 256
+
+
+class PatternMatcher:
+    """Matches HID reports against byte patterns with a compiled decision table.
+
+    Every pattern is a sequence of ``PatternByte`` and matches a report that
+    starts with it. At construction all patterns are compiled into a
+    deterministic automaton: each node holds a 256-entry table indexed by
+    the next report byte, so matching costs one table lookup per byte
+    regardless of how many patterns there are, and allocates nothing.
+
+    When several patterns match, the longest wins; among patterns of the
+    same length the one declared first wins.
+    """
+
+    def __init__(self, patterns: Dict[Sequence[PatternByte], str]):
+        self.patterns = dict(patterns)
+        specs: List[Tuple[Tuple[PatternByte, ...], str]] = [
+            (tuple(pattern), action) for pattern, action in self.patterns.items()
+        ]
+        self.depth = max((len(pattern) for pattern, _ in specs), default=0)
+        self._root = self._compile(specs)
+
+    @staticmethod
+    def _compile(specs) -> _Node:
+        nodes: Dict[Tuple[int, FrozenSet[int]], _Node] = {}
+
+        def build(depth: int, alive: FrozenSet[int]) -> Optional[_Node]:
+            if not alive:
+                return None
+            key = (depth, alive)
+            if key in nodes:
+                return nodes[key]
+
+            finished = [index for index in sorted(alive) if len(specs[index][0]) == depth]
+            node = _Node(specs[finished[0]][1] if finished else None)
+            nodes[key] = node
+
+            continuing = [index for index in sorted(alive) if len(specs[index][0]) > depth]
+            if continuing:
+                table = []
+                for byte in range(256):
+                    matching = frozenset(index for index in continuing
+                                         if _byte_matches(specs[index][0][depth], byte))
+                    table.append(build(depth + 1, matching))
+                node.next = tuple(table)
+            return node
+
+        return build(0, frozenset(range(len(specs)))) or _Node(None)
+
+    def match(self, data) -> Optional[str]:
+        """Return the action of the best pattern ``data`` starts with."""
+        node = self._root
+        action = node.action
+        for byte in data:
+            node = node.next[byte]
+            if node is None:
+                break
+            if node.action is not None:
+                action = node.action
+        return action
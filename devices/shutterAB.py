@@ -1,11 +1,23 @@
-from dataclasses import dataclass
-import hid
-from typing import Optional
+from dataclasses import dataclass, field
+import logging
+import time
+from devices import hidbackend
+from typing import Dict, Optional, Tuple
+from devices.debounce import DebounceProfile, InputState
+from devices.patterns import RELEASE, PatternMatcher
+
+logger = logging.getLogger(__name__)
 
 @dataclass
 class ShutterABConfig:
     vendor_id: int
     product_id: int
+    # Overrides the handler's DEBOUNCE profile
+    debounce: Optional[DebounceProfile] = None
+    # Report pattern -> action, added to (or replacing) BUTTON_PATTERNS
+    patterns: Dict[Tuple[int, ...], str] = field(default_factory=dict)
+    # Unit id (serial number, or path) -> {action: command key} for that unit only
+    units: Dict[str, Dict[str, str]] = field(default_factory=dict)
 
 
 class ShutterABHandler:
@@ -17,63 +29,121 @@ class ShutterABHandler:
     # Button press patterns mapped to their corresponding actions
     BUTTON_PATTERNS = {
         tuple([1, 1, 0]): 'a',
-        tuple([1, 2, 0]): 'b'
+        tuple([1, 2, 0]): 'b',
+        # Every button reports [1, 0, 0] when let go
+        tuple([1, 0, 0]): RELEASE,
     }
+    # Compiled once; every handler shares the same decision table
+    MATCHER = PatternMatcher(BUTTON_PATTERNS)
+    # BLE units resend reports, so a repeated press needs a wider window
+    DEBOUNCE = DebounceProfile(press_ms=60, release_ms=20)
     
     def __init__(self, config: ShutterABConfig):
         self.config = config
         self.device = None
         self.path = None
+        # Stable identity of the physical unit, set when it is attached
+        self.unit: Optional[str] = None
+        self.matcher = self.build_matcher(config)
+        # Press/release edges per button with the device's debounce windows
+        self.input = InputState(config.debounce or self.DEBOUNCE, self.matcher.patterns.values())
+        # Monotonic timestamps (ns) of the last report and last match
+        self.read_ns = 0
+        self.match_ns = 0
+        # Source of those timestamps; a replay passes the recorded report times
+        self.clock = time.monotonic_ns
+        # Reports read and reads that returned nothing
+        self.reads = 0
+        self.empty_reads = 0
+        # Optional ReportRecorder receiving every raw report
+        self.recorder = None
         
-    def connect(self):
-        """Attempt to connect to the shutter device."""
+    @classmethod
+    def build_matcher(cls, config) -> PatternMatcher:
+        if not config.patterns:
+            return cls.MATCHER
+        return PatternMatcher({**cls.BUTTON_PATTERNS, **config.patterns})
+
+    def button_actions(self, unit: Optional[str]) -> Dict[str, str]:
+        """What each matched action sends on ``unit``: itself unless remapped."""
+        actions = {action: action for action in self.matcher.patterns.values()}
+        actions.update(self.config.units.get(unit, {}))
+        return actions
+
+    def reconfigure(self, config):
+        """Swap in a reloaded config; the device stays open."""
+        if config.patterns != self.config.patterns or config.debounce != self.config.debounce:
+            matcher = self.build_matcher(config)
+            self.input = InputState(config.debounce or self.DEBOUNCE, matcher.patterns.values())
+            self.matcher = matcher
+        self.config = config
+
+    def connect(self, path: Optional[bytes] = None):
+        """Attempt to connect to the shutter device.
+
+        Args:
+            path: HID path to open. When omitted the bus is enumerated and the
+                  first AB shutter that isn't already connected is used.
+        """
         try:
-            # Enumerate all available devices with these IDs
-            devices = hid.enumerate(self.config.vendor_id, self.config.product_id)
-            
-            # Look for a device that isn't already connected
-            for device_info in devices:
-                if device_info['path'] not in self._connected_paths:
-                    self.path = device_info['path']
-                    self.device = hid.device()
-                    self.device.open_path(self.path)
-                    self.device.set_nonblocking(True)
-                    self._connected_paths.add(self.path)
-                    print(f"Connected to AB shutter at path: {self.path}")
-                    return True
-                    
-            print("No available AB shutter found (all are already connected)")
-            return False
+            if path is None:
+                # Enumerate all available devices with these IDs
+                devices = hidbackend.enumerate(self.config.vendor_id, self.config.product_id)
+
+                # Look for a device that isn't already connected
+                for device_info in devices:
+                    if device_info['path'] not in self._connected_paths:
+                        path = device_info['path']
+                        break
+                else:
+                    logger.warning("No available AB shutter found (all are already connected)")
+                    return False
+
+            self.device = hidbackend.device()
+            self.device.open_path(path)
+            self.device.set_nonblocking(True)
+            self.path = path
+            self._connected_paths.add(path)
+            logger.info("Connected to AB shutter at path: %s", self.path,
+                        extra={'device': self.__class__.__name__, 'path': self.path})
+            return True
             
         except Exception as e:
-            print(f"Warning: Could not connect to shutter AB device: {e}")
+            logger.warning("Could not connect to shutter AB device: %s", e,
+                           extra={'device': self.__class__.__name__, 'path': path})
             self.device = None
             return False
             
-    def read(self) -> Optional[str]:
+    def read(self, timeout_ms: int = 0) -> Optional[str]:
         """Read and process shutter input."""
+        # Reconnection is left to the device monitor so a missing device
+        # never costs an enumeration on the read path.
         if not self.device:
-            print("no AB device found to read")
-            self.connect()
             return None
             
         try:
-            data = self.device.read(64)
+            data = self.device.read(64, timeout_ms)
             if not data:
+                self.empty_reads += 1
                 return None
+            self.reads += 1
+            self.read_ns = self.clock()
+            if self.recorder:
+                self.recorder.record(self, data, self.read_ns)
                 
-            data_tuple = tuple(data[:3])
-            
-            # Look up the action in our patterns dictionary
-            action = self.BUTTON_PATTERNS.get(data_tuple)
+            # Look up the action in the compiled patterns; only new press
+            # and release edges get through
+            action = self.input.edge(self.matcher.match(data), self.read_ns)
             if action:
-                print(f"AB device {self.path} action: {action}")
+                self.match_ns = self.clock()
+                logger.debug("AB device %s action: %s", self.path, action,
+                             extra={'device': self.__class__.__name__, 'path': self.path, 'action': action})
             return action
                 
         except Exception as e:
             self.cleanup()
-            self.connect()
-            print(f"Error reading shutter AB: {e}")
+            logger.warning("Error reading shutter AB: %s", e,
+                           extra={'device': self.__class__.__name__, 'path': self.path})
             return None
             
     def cleanup(self):
@@ -1,7 +1,9 @@
 import hid
-import time
 from collections import OrderedDict
 
+# Lectura bloqueante: devuelve en cuanto llega un reporte, sin perder ráfagas
+READ_TIMEOUT_MS = 100
+
 def test_joystick():
     VENDOR_ID = 0x0810
     PRODUCT_ID = 0x0001
@@ -9,7 +11,6 @@ def test_joystick():
     try:
         device = hid.device()
         device.open(VENDOR_ID, PRODUCT_ID)
-        device.set_nonblocking(True)
         
         print("\nTwin USB Joystick connected")
         print("Move the joystick, press buttons, etc.")
@@ -20,7 +21,7 @@ def test_joystick():
         
         while True:
             try:
-                data = device.read(64)
+                data = device.read(64, READ_TIMEOUT_MS)
                 if data:
                     # Convertir a tuple para poder usarlo como key en el dict
                     data_tuple = tuple(data)
@@ -33,8 +34,6 @@ def test_joystick():
             except:
                 pass
             
-            time.sleep(0.01)
-            
         # Mostrar resumen
         print("\n=== Summary of unique patterns detected ===")
         for i, pattern in enumerate(unique_patterns.keys(), 1):
@@ -0,0 +1,394 @@
+"""Learn the button patterns of a HID controller and write a device profile.
+
+Guided: press each named button a few times when asked.
+
+    python3 helpers/pattern_learner.py 2717:0040 --buttons a,b --output config/learned_ab.py
+
+Without ``--buttons`` every distinct press found in ``--duration`` seconds
+becomes ``button1``, ``button2``, ... to be renamed in the profile.
+``--from-log FILE`` learns from a log written with ``main.py --record``.
+
+Reports are read with blocking reads and nothing else in the loop, so
+bursts (an M3 sends six reports per press) are captured completely. A
+pause of ``--gap`` ms ends a press sequence. Reports that several buttons
+send, or that show up in only a few of one button's presses, are not
+used to recognise a press. The rest become the shortest byte prefix
+(varying bits masked) that no other button's reports start with.
+"""
+import argparse
+from collections import Counter
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from devices import hidbackend
+from devices.patterns import ANY, RELEASE, Masked, PatternByte, PatternMatcher, pattern_matches
+from devices.shutterAB import ShutterABHandler
+from devices.shutterM3 import ShutterM3Handler
+from runtime.recorder import DEVICE_INFO, KIND_DEVICE, KIND_REPORT, read_log
+
+Report = Tuple[int, ...]
+# Reports of one press, from the first report to the last before a pause
+PressSequence = Tuple[Report, ...]
+Pattern = Tuple[PatternByte, ...]
+
+# A pause this long ends a press sequence (ms)
+SEQUENCE_GAP_MS = 250
+# Blocking read timeout; must be shorter than the gap (ms)
+READ_TIMEOUT_MS = 50
+REPORT_SIZE = 64
+
+# Handler kind -> (config file the profile replaces, module, config class,
+# config variable, built-in patterns)
+PROFILE_TARGETS = {
+    'ab': ('shutterAB_config.py', 'devices.shutterAB', 'ShutterABConfig', 'ab_config',
+           ShutterABHandler.BUTTON_PATTERNS),
+    'm3': ('shutterM3_config.py', 'devices.shutterM3', 'ShutterM3Config', 'm3_config',
+           ShutterM3Handler.BUTTON_PATTERNS),
+}
+
+
+class LearnedProfile:
+    """Patterns learned from labelled press sequences."""
+
+    def __init__(self):
+        # Pattern -> button key (RELEASE for the release report)
+        self.patterns: Dict[Pattern, str] = {}
+        # Button key -> (sequences recognised, sequences captured)
+        self.recognised: Dict[str, Tuple[int, int]] = {}
+        # Button key -> reports sent while held, per press on average
+        self.holds: Dict[str, float] = {}
+        self.problems: List[str] = []
+
+
+def read_sequences(device, count: int, gap_ms: int = SEQUENCE_GAP_MS,
+                   timeout: Optional[float] = None) -> List[PressSequence]:
+    """Capture ``count`` press sequences (fewer if ``timeout`` seconds pass)."""
+    gap_ns = gap_ms * 1_000_000
+    deadline = time.monotonic() + timeout if timeout else None
+    sequences: List[PressSequence] = []
+    current: List[Report] = []
+    last_ns = 0
+    while len(sequences) < count:
+        data = device.read(REPORT_SIZE, READ_TIMEOUT_MS)
+        now_ns = time.monotonic_ns()
+        if data:
+            current.append(tuple(data))
+            last_ns = now_ns
+        elif current and now_ns - last_ns > gap_ns:
+            sequences.append(tuple(current))
+            print(f"  press {len(sequences)}/{count}: {len(current)} report(s), first {list(current[0])}")
+            current = []
+        elif not current and deadline and time.monotonic() > deadline:
+            break
+    return sequences
+
+
+def split_sequences(timed_reports: Sequence[Tuple[int, Report]], gap_ms: int = SEQUENCE_GAP_MS) -> List[PressSequence]:
+    """Split (monotonic ns, report) pairs wherever the device paused."""
+    gap_ns = gap_ms * 1_000_000
+    sequences: List[PressSequence] = []
+    current: List[Report] = []
+    last_ns = None
+    for timestamp_ns, report in timed_reports:
+        if current and timestamp_ns - last_ns > gap_ns:
+            sequences.append(tuple(current))
+            current = []
+        current.append(tuple(report))
+        last_ns = timestamp_ns
+    if current:
+        sequences.append(tuple(current))
+    return sequences
+
+
+def generalize(reports: Sequence[Report]) -> Pattern:
+    """One pattern covering every report: bits that vary are masked out."""
+    length = min(len(report) for report in reports)
+    pattern: List[PatternByte] = []
+    for index in range(length):
+        first = reports[0][index]
+        varying = 0
+        for report in reports:
+            varying |= report[index] ^ first
+        if not varying:
+            pattern.append(first)
+        elif varying == 0xFF:
+            pattern.append(ANY)
+        else:
+            mask = ~varying & 0xFF
+            pattern.append(Masked(first & mask, mask))
+    return tuple(pattern)
+
+
+def shortest_prefix(pattern: Pattern, own: Sequence[Report], foreign: Sequence[Report]) -> Optional[Pattern]:
+    """Shortest prefix of ``pattern`` matching every ``own`` report and no ``foreign`` one."""
+    for length in range(1, len(pattern) + 1):
+        prefix = pattern[:length]
+        if all(pattern_matches(prefix, report) for report in own) and \
+                not any(pattern_matches(prefix, report) for report in foreign):
+            return prefix
+    return None
+
+
+def _release(sequences: Sequence[PressSequence]) -> Tuple[Optional[Pattern], List[Report]]:
+    """The report most presses end with (grouped by length and report id)."""
+    groups: Dict[Tuple[int, int], List[Report]] = {}
+    for sequence in sequences:
+        last = sequence[-1]
+        if len(sequence) > 1 and last:
+            groups.setdefault((len(last), last[0]), []).append(last)
+    if not groups:
+        return None, []
+    reports = max(groups.values(), key=len)
+    if len(reports) * 2 < len(sequences):
+        return None, []
+    return generalize(reports), reports
+
+
+def learn_patterns(labelled: Dict[str, Sequence[PressSequence]]) -> LearnedProfile:
+    """Infer a press pattern per button key and the release pattern."""
+    profile = LearnedProfile()
+    owners: Dict[Report, set] = {}
+    for key, sequences in labelled.items():
+        for sequence in sequences:
+            for report in sequence:
+                owners.setdefault(report, set()).add(key)
+    shared = {report for report, keys in owners.items() if len(keys) > 1}
+    release, release_reports = _release([sequence for sequences in labelled.values() for sequence in sequences])
+
+    def candidates(sequence: PressSequence) -> List[Report]:
+        return [report for report in sequence
+                if report not in shared and not (release and pattern_matches(release, report))]
+
+    presses: Dict[str, List[Report]] = {}
+    for key, sequences in labelled.items():
+        # Reports in at least half of this button's presses; the one in the
+        # most presses wins, then the one that comes earliest
+        seen = Counter(report for sequence in sequences for report in set(candidates(sequence)))
+        consistent = [report for report, count in seen.items() if count * 2 >= len(sequences)]
+        if consistent:
+            def rank(report: Report) -> Tuple[int, float]:
+                positions = [sequence.index(report) for sequence in sequences if report in sequence]
+                return -len(positions), sum(positions) / len(positions)
+            presses[key] = [min(consistent, key=rank)]
+        else:
+            # Every press looks different: mask what varies in the first usable report
+            presses[key] = [found[0] for found in map(candidates, sequences) if found]
+        if not presses[key]:
+            profile.problems.append(f"'{key}': every report is shared with another button")
+            del presses[key]
+
+    for key, reports in presses.items():
+        foreign = [report for report, keys in owners.items() if key not in keys or len(keys) > 1]
+        foreign += release_reports
+        pattern = shortest_prefix(generalize(reports), reports, foreign)
+        if pattern is None:
+            others = sorted({other for report in reports for other in owners.get(report, ()) if other != key})
+            profile.problems.append(f"'{key}' cannot be told apart from {', '.join(others) or 'the release'}")
+            continue
+        profile.patterns[pattern] = key
+
+    if release:
+        press_reports = {report for reports in presses.values() for report in reports}
+        held = [report for report in owners if report not in press_reports and report not in release_reports]
+        pattern = shortest_prefix(release, release_reports, list(press_reports) + held)
+        if pattern is None:
+            profile.problems.append("the release report is also sent while a button is held")
+        else:
+            profile.patterns[pattern] = RELEASE
+
+    verify(profile, labelled)
+    return profile
+
+
+def verify(profile: LearnedProfile, labelled: Dict[str, Sequence[PressSequence]]):
+    """Run the captured sequences through the learned patterns."""
+    matcher = PatternMatcher(profile.patterns)
+    for key, sequences in labelled.items():
+        recognised = 0
+        held = 0
+        for sequence in sequences:
+            actions = [action for action in map(matcher.match, sequence) if action]
+            presses = [action for action in actions if action != RELEASE]
+            if presses and all(action == key for action in presses):
+                recognised += 1
+            held += len(sequence) - len(actions)
+        profile.recognised[key] = (recognised, len(sequences))
+        profile.holds[key] = held / len(sequences) if sequences else 0
+
+
+def cluster(sequences: Sequence[PressSequence]) -> Dict[str, List[PressSequence]]:
+    """Label unlabelled sequences by their first report that isn't the release."""
+    release, _ = _release(sequences)
+    labels: Dict[Report, str] = {}
+    labelled: Dict[str, List[PressSequence]] = {}
+    for sequence in sequences:
+        press = next((report for report in sequence if not (release and pattern_matches(release, report))), None)
+        if press is None:
+            continue
+        key = labels.setdefault(press, f"button{len(labels) + 1}")
+        labelled.setdefault(key, []).append(sequence)
+    return labelled
+
+
+def _format_byte(spec: PatternByte) -> str:
+    if spec is ANY:
+        return 'ANY'
+    if isinstance(spec, Masked):
+        return f"Masked(0x{spec.value:02x}, 0x{spec.mask:02x})"
+    return str(spec)
+
+
+def format_pattern(pattern: Pattern) -> str:
+    return "(" + ", ".join(map(_format_byte, pattern)) + ("," if len(pattern) == 1 else "") + ")"
+
+
+def write_profile(profile: LearnedProfile, filename: str, vendor_id: int, product_id: int,
+                  handler: str = 'ab', source: str = ''):
+    """Write a config module in the style of ``config/shutterAB_config.py``."""
+    config_file, module, config_class, variable, _ = PROFILE_TARGETS[handler]
+    lines = [f"# Learned by helpers/pattern_learner.py{' from ' + source if source else ''}",
+             f"# Replace config/{config_file} with this file to use it (--watch-config reloads it)",
+             "from devices.patterns import ANY, RELEASE, Masked",
+             f"from {module} import {config_class}",
+             "",
+             f"vendor_id = 0x{vendor_id:04x}",
+             f"product_id = 0x{product_id:04x}",
+             "",
+             "# Report pattern -> command key",
+             "patterns = {"]
+    for pattern, key in profile.patterns.items():
+        if key == RELEASE:
+            lines.append(f"    {format_pattern(pattern)}: RELEASE,")
+            continue
+        recognised, captured = profile.recognised.get(key, (0, 0))
+        lines.append(f"    {format_pattern(pattern)}: {key!r},"
+                     f"  # {recognised}/{captured} presses, ~{profile.holds.get(key, 0):.0f} hold report(s)")
+    lines += ["}", ""]
+    for problem in profile.problems:
+        lines.append(f"# Not learned: {problem}")
+    if profile.problems:
+        lines.append("")
+    lines += ["# Unit id (serial number, or path) -> {button: command key} for one unit",
+              "units = {",
+              "}",
+              "",
+              f"{variable} = {config_class}(",
+              "    vendor_id=vendor_id,",
+              "    product_id=product_id,",
+              "    patterns=patterns,",
+              "    units=units",
+              ")",
+              ""]
+    with open(filename, 'w', encoding='utf-8') as profile_file:
+        profile_file.write("\n".join(lines))
+
+
+def builtin_conflicts(profile: LearnedProfile, labelled: Dict[str, Sequence[PressSequence]],
+                      handler: str) -> List[str]:
+    """Captured reports the handler would read differently because of its built-in patterns.
+
+    Profile patterns are added to the handler's BUTTON_PATTERNS, so those
+    stay active for the new device too.
+    """
+    learned = PatternMatcher(profile.patterns)
+    merged = PatternMatcher({**PROFILE_TARGETS[handler][4], **profile.patterns})
+    conflicts = {}
+    for sequences in labelled.values():
+        for sequence in sequences:
+            for report in sequence:
+                expected, actual = learned.match(report), merged.match(report)
+                if actual != expected:
+                    conflicts[report] = f"{list(report)} reads as {actual!r} instead of {expected!r} (built-in pattern)"
+    return list(conflicts.values())
+
+
+def sequences_from_log(filename: str, gap_ms: int) -> Tuple[int, int, List[PressSequence]]:
+    """Press sequences of the first device in a report log."""
+    device = None
+    vendor_id = product_id = 0
+    timed: List[Tuple[int, Report]] = []
+    for kind, device_id, timestamp_ns, payload in read_log(filename):
+        if kind == KIND_DEVICE and device is None:
+            device = device_id
+            vendor_id, product_id = DEVICE_INFO.unpack_from(payload)
+        elif kind == KIND_REPORT and device_id == device:
+            timed.append((timestamp_ns, tuple(payload)))
+    return vendor_id, product_id, split_sequences(timed, gap_ms)
+
+
+def open_device(vendor_id: int, product_id: int):
+    devices = hidbackend.enumerate(vendor_id, product_id)
+    if not devices:
+        raise SystemExit(f"No device {vendor_id:04x}:{product_id:04x} found")
+    device = hidbackend.device()
+    device.open_path(devices[0]['path'])
+    return device
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("device", nargs="?", help="vendor:product in hex, e.g. 2717:0040")
+    parser.add_argument("--buttons", help="comma separated command keys to learn, pressed in this order")
+    parser.add_argument("--presses", type=int, default=3, help="presses per button in guided mode")
+    parser.add_argument("--duration", type=float, default=20.0,
+                        help="capture time without --buttons, and the longest wait for one button (s)")
+    parser.add_argument("--gap", type=int, default=SEQUENCE_GAP_MS, help="pause that ends a press (ms)")
+    parser.add_argument("--from-log", metavar="FILE", help="learn from a main.py --record log")
+    parser.add_argument("--handler", choices=sorted(PROFILE_TARGETS), default='ab',
+                        help="handler whose config the profile is written for")
+    parser.add_argument("--output", default="learned_config.py", help="profile to write")
+    parser.add_argument("--hid-backend", choices=hidbackend.BACKENDS, default="auto")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.from_log:
+        vendor_id, product_id, sequences = sequences_from_log(args.from_log, args.gap)
+        labelled = cluster(sequences)
+        source = args.from_log
+    else:
+        if not args.device:
+            raise SystemExit("Give the device as vendor:product, or --from-log")
+        vendor_id, product_id = (int(part, 16) for part in args.device.split(':'))
+        hidbackend.select(args.hid_backend)
+        device = open_device(vendor_id, product_id)
+        try:
+            if args.buttons:
+                labelled = {}
+                for key in args.buttons.split(','):
+                    print(f"\nPress and release '{key}' {args.presses} times, pausing in between")
+                    labelled[key] = read_sequences(device, args.presses, args.gap, args.duration)
+            else:
+                print(f"\nPress every button a few times, pausing in between ({args.duration:g} s)")
+                timed = []
+                deadline = time.monotonic() + args.duration
+                while time.monotonic() < deadline:
+                    data = device.read(REPORT_SIZE, READ_TIMEOUT_MS)
+                    if data:
+                        timed.append((time.monotonic_ns(), tuple(data)))
+                labelled = cluster(split_sequences(timed, args.gap))
+        finally:
+            device.close()
+        source = f"{vendor_id:04x}:{product_id:04x}"
+
+    total = sum(len(sequences) for sequences in labelled.values())
+    if not total:
+        raise SystemExit("No presses captured")
+    profile = learn_patterns(labelled)
+    print(f"\nLearned from {total} press(es):")
+    for pattern, key in profile.patterns.items():
+        detail = "" if key == RELEASE else " ({}/{} presses recognised)".format(*profile.recognised[key])
+        print(f"  {format_pattern(pattern)} -> {key}{detail}")
+    for problem in profile.problems + builtin_conflicts(profile, labelled, args.handler):
+        print(f"  warning: {problem}")
+    write_profile(profile, args.output, vendor_id, product_id, args.handler, source)
+    print(f"\nProfile written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
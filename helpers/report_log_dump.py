@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime.recorder import DEVICE_INFO, KIND_DEVICE, read_log
+
+
+def dump_log(filename: str) -> None:
+    """Print every record of a report log written with main.py --record."""
+    devices = {}
+    first_ns = None
+    for kind, device_id, timestamp_ns, payload in read_log(filename):
+        if first_ns is None:
+            first_ns = timestamp_ns
+        elapsed = (timestamp_ns - first_ns) / 1e6
+        if kind == KIND_DEVICE:
+            vendor_id, product_id = DEVICE_INFO.unpack_from(payload)
+            devices[device_id] = bytes(payload[DEVICE_INFO.size:]).decode(errors='replace')
+            print(f"{elapsed:12.3f} ms  device {device_id}: {vendor_id:04x}:{product_id:04x} {devices[device_id]}")
+        else:
+            print(f"{elapsed:12.3f} ms  [{device_id}] {list(payload)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} <report log>")
+        sys.exit(1)
+    dump_log(sys.argv[1])
@@ -2,6 +2,10 @@ import hid
 import time
 from typing import List, Dict
 
+# Blocking read timeout (ms): reads return as soon as a report arrives, so
+# bursts are not dropped, and the duration is still checked regularly
+READ_TIMEOUT_MS = 100
+
 class HIDDetector:
     def __init__(self):
         self.devices: List[Dict] = []
@@ -32,19 +36,19 @@ class HIDDetector:
             # Open the device
             device = hid.device()
             device.open(vendor_id, product_id)
-            device.set_nonblocking(True)
             
             print(f"\nMonitoring device (Vendor ID: {vendor_id:04x}, Product ID: {product_id:04x})")
             print(f"Press buttons on your device (monitoring for {duration} seconds)...")
             
             start_time = time.time()
             while time.time() - start_time < duration:
-                data = device.read(64)
+                data = device.read(64, READ_TIMEOUT_MS)
                 if data:
                     print(f"Button Press Detected - Raw Data: {data}")
-                time.sleep(0.1)
                 
             device.close()
+            print("\nTo turn presses into patterns: "
+                  f"python3 helpers/pattern_learner.py {vendor_id:04x}:{product_id:04x} --buttons a,b")
             
         except Exception as e:
             print(f"Error monitoring device: {e}")
@@ -1,105 +1,906 @@
+import argparse
+import functools
+import logging
+import queue
+import signal
+import threading
 import time
-from config.midi_config import midi_config
-from config.joystick_config import joystick_config
-from config.shutterM3_config import M3_SHUTTERS
-from config.shutterAB_config import AB_SHUTTERS
+from typing import Optional
+from devices import hidbackend
+from devices.hidraw import HidrawPoller
 from devices.joystick import JoystickHandler
+from devices.labels import path_label, source_label
+from devices.patterns import RELEASE
 from devices.shutterM3 import ShutterM3Handler
 from devices.shutterAB import ShutterABHandler
 from midi.controller import MIDIController
+from midi.state import StateStore
+from runtime.discovery import load_device_cache, save_device_cache
+from runtime.gestures import GestureEngine
+from runtime.monitor import DeviceMonitor, DeviceType
+from runtime.profiler import PROFILE_FILE, PROFILE_SECONDS, SamplingProfiler
+from runtime.recorder import ReportRecorder, replay_log
+from runtime.reload import (
+    APPLY_TIMEOUT, ConfigWatcher, ControlServer, Mappings, load_mappings, mapping_versions,
+)
+from runtime.logs import setup_logging
+from runtime.latency import LatencyReporter, LatencyTracker, REPORT_INTERVAL
+from runtime.metrics import HealthCheck, LoopStats, MetricsRegistry, MetricsServer, STALE_AFTER
+from runtime.threads import (
+    ActionEvent, DeviceReader, MIDIDispatcher, DISPATCH_TIMEOUT, EVENT_QUEUE_SIZE, dispatch,
+)
+from runtime.watchdog import WATCHDOG_BUDGET_MS, Watchdog
+from runtime.workers import KIND_ACTION, KIND_AXIS, WorkerHandler, wait_for_workers
+
+# Polling interval of the classic loop (seconds)
+POLL_INTERVAL = 0.05
+# How long one pass of the event loop may block waiting for reports (ms)
+EVENT_TIMEOUT_MS = 50
+# Blocking read timeout while gesture timers are pending (ms)
+GESTURE_TIMEOUT_MS = 5
+logger = logging.getLogger(__name__)
+
+# How long the process-mode loop waits for worker events (seconds); also
+# how often workers are checked for crashes and hangs
+WORKER_WAIT = 0.1
+
+
+class _PendingReload:
+    """Reloaded mappings compiled off the input path, waiting to be swapped in."""
+
+    def __init__(self, mappings: Mappings, changed, midi_tables: dict, store_layout: Optional[tuple] = None):
+        self.mappings = mappings
+        self.changed = changed
+        self.midi_tables = midi_tables
+        # State file for a new command set, from StateStore.prepare
+        self.store_layout = store_layout
+        self.done = threading.Event()
+
 
 class DeviceManager:
     def __init__(self):
+        self.mappings = load_mappings()
+        # Handlers run in worker processes (--mode process)
+        self.isolated = False
         self.handlers = []
+        # (unit, button) -> command key for every attached unit; one lookup
+        # per press however many units there are, replaced as a whole
+        self.actions = {}
         self.midi_controller = None
+        self.monitor = None
+        self.readers = {}
+        # Detached handlers waiting for cleanup() on the input loop thread,
+        # which may still be draining them
+        self._detached = []
+        self.events = None
+        self.dispatcher = None
+        self.latency = LatencyTracker()
+        self.latency_reporter = None
+        # Turns press/release edges into actions; runs on whichever thread
+        # dispatches (the input loop, or the dispatcher in threaded mode)
+        self.gestures = GestureEngine(self.mappings.gestures, self.send_action)
+        self.recorder = None
+        # Tick timing of whichever input loop runs, for metrics and health
+        self.loop = LoopStats()
+        # Work per pass of the loop reading every device, and who overran it
+        self.watchdog = Watchdog(describe=_source_label)
+        # Sampling profiler started and stopped at runtime
+        self.profiler: Optional[SamplingProfiler] = None
+        self.profile_file = PROFILE_FILE
+        self.profile_seconds = PROFILE_SECONDS
+        # Set by SIGUSR1, acted on by the input loop
+        self._profile_requested = False
+        self._profile_lock = threading.Lock()
+        self.metrics_server = None
+        self.config_watcher = None
+        self.control_server = None
+        # Set by reload(), swapped in by the input loop between two events
+        self._reload: Optional[_PendingReload] = None
+        self._reload_lock = threading.Lock()
+        self.running = True
+        self._lock = threading.Lock()
 
     def add_handler(self, handler):
         if handler.connect():
-            self.handlers.append(handler)
+            self.attach_handler(handler)
             return True
         return False
+
+    def attach_handler(self, handler):
+        """Start reading from a connected handler (called by the device monitor).
+
+        ``self.handlers`` is replaced rather than mutated so the input loop
+        can keep iterating over the old list while a device comes or goes.
+        """
+        handler.recorder = self.recorder
+        handler.attached_ns = time.monotonic_ns()
+        # Replayed and directly added devices have no unit id from the monitor
+        handler.unit = handler.unit or path_label(handler.path or handler.__class__.__name__)
+        if isinstance(handler, JoystickHandler):
+            handler.on_axis = self.send_axis
+        with self._lock:
+            self.handlers = self.handlers + [handler]
+            self.actions = self.build_actions(self.handlers)
+            # Worker processes read their own device
+            if self.dispatcher and not isinstance(handler, WorkerHandler):
+                self._start_reader(handler)
+
+    def detach_handler(self, handler):
+        """Stop reading from a handler whose device went away.
+
+        Its resources (a worker's shared-memory ring and pipes) are
+        released by the next ``tick`` on the input loop thread.
+        """
+        with self._lock:
+            self.handlers = [h for h in self.handlers if h is not handler]
+            self.actions = self.build_actions(self.handlers)
+            reader = self.readers.pop(id(handler), None)
+            self._detached = self._detached + [handler]
+        if reader:
+            reader.stop()
+
+    def release_detached(self):
+        with self._lock:
+            detached, self._detached = self._detached, []
+        for handler in detached:
+            handler.cleanup()
             
     def print_device_info(self):
-        print(f"\nMIDI Controller started on port: {midi_config.port_name}")
+        commands = self.mappings.midi.commands
+        tempo = self.mappings.midi.tempo
+        names = {tempo.tap_key: "Tap tempo", tempo.transport_key: "Start/Stop"} if tempo else {}
+
+        def effect_name(action: str) -> str:
+            return commands[action][1] if action in commands else names.get(action, action)
+
+        print(f"\nMIDI Controller started on port: {self.mappings.midi.port_name}")
         
         # Group handlers by type
         handler_groups = {}
         for handler in self.handlers:
+            unit = handler.unit
+            if isinstance(handler, WorkerHandler):
+                handler = handler.handler
             handler_type = handler.__class__.__name__
             if handler_type not in handler_groups:
                 handler_groups[handler_type] = []
-            handler_groups[handler_type].append(handler)
+            handler_groups[handler_type].append((unit, handler))
             
         # Print information by group
+        actions = self.actions
         for handler_type, handlers in handler_groups.items():
             if handlers:
                 print(f"\n{handler_type}: {len(handlers)} device(s) connected")
-                for i, handler in enumerate(handlers, 1):
+                for i, (unit, handler) in enumerate(handlers, 1):
                     if isinstance(handler, (ShutterM3Handler, ShutterABHandler)):
-                        print(f"\n{handler_type} #{i} mappings:")
-                        for pattern, action in handler.BUTTON_PATTERNS.items():
-                            effect = midi_config.commands[action][1]
+                        print(f"\n{handler_type} #{i} (unit {unit}) mappings:")
+                        for pattern, button in handler.matcher.patterns.items():
+                            if button == RELEASE:
+                                continue
+                            effect = effect_name(actions.get((unit, button)))
                             print(f"Button pattern {pattern} -> {effect}")
                     elif isinstance(handler, JoystickHandler):
-                        print(f"\nJoystick #{i} mappings:")
-                        for button, action in joystick_config.actions.items():
-                            effect = midi_config.commands[action][1]
+                        print(f"\nJoystick #{i} (unit {unit}) mappings:")
+                        for button in handler.button_actions(unit):
+                            if button == RELEASE:
+                                continue
+                            effect = effect_name(actions.get((unit, button)))
                             print(f"Button '{button}' -> {effect}")
+                        for index, mapping in handler.config.axes.items():
+                            print(f"Axis byte {index} -> CC {mapping.cc} ({mapping.curve} curve)")
+
+    @staticmethod
+    def build_actions(handlers) -> dict:
+        """The dispatch table: every unit's buttons, per-unit mappings applied."""
+        return {
+            (handler.unit, button): action
+            for handler in handlers
+            for button, action in handler.button_actions(handler.unit).items()
+        }
+
+    def resolve_action(self, handler, result):
+        """Translate what a handler's read() returned into a MIDI command key."""
+        return self.actions.get((handler.unit, result))
+
+    def send_axis(self, mapping, value: int):
+        """Send a continuous CC from a joystick axis (called on the reading thread)."""
+        self.midi_controller.send_cc(mapping.cc, value, mapping.channel)
+
+    def send_action(self, event: ActionEvent):
+        """Send an action the gesture engine settled on."""
+        dispatch(self.midi_controller, event, self.latency)
+
+    def read_handler(self, handler, timeout_ms: int = 0):
+        """Read one handler and hand its press or release to the gesture engine."""
+        start_ns = time.monotonic_ns()
+        if result := handler.read(timeout_ms):
+            read_end_ns = time.monotonic_ns()
+            if action := self.resolve_action(handler, result):
+                self.gestures.feed(ActionEvent.from_handler(handler, action))
+            self.watchdog.lap(handler, start_ns, timeout_ms, read_end_ns)
+        else:
+            self.watchdog.lap(handler, start_ns, timeout_ms)
+
+    def process_inputs(self, timeout_ms: int = 0):
+        """Read every handler once.
+
+        Args:
+            timeout_ms: Per-handler blocking read timeout (0 = non-blocking)
+        """
+        self.watchdog.begin(time.monotonic_ns())
+        for handler in self.handlers:
+            self.read_handler(handler, timeout_ms)
+        self.gestures.advance()
+        self.watchdog.end(time.monotonic_ns())
+
+    def run_event_loop(self, timeout_ms: int = EVENT_TIMEOUT_MS):
+        """Block on the devices instead of sleeping between polls.
+
+        With the hidraw backend a single epoll waits on every device
+        (``run_epoll_loop``). hidapi can only block in one device's read(),
+        so this loop does that while a single device is connected; once
+        there are more, it hands over to reader threads (``run_threaded``)
+        so each device is read as soon as it is ready, instead of waiting
+        behind the others' read timeouts.
+        """
+        if hidbackend.name == 'hidraw':
+            self.run_epoll_loop(timeout_ms)
+            return
+        self.loop.start(timeout_ms / 1000)
+        while self.running:
+            now_ns = time.monotonic_ns()
+            self.tick(now_ns)
+            connected = [handler for handler in self.handlers if handler.device]
+            if not connected:
+                time.sleep(timeout_ms / 1000)
+                self.gestures.advance()
+                continue
+
+            if len(connected) > 1:
+                logger.info("%d hidapi devices connected; reading them from one thread each", len(connected))
+                self.run_threaded()
+                return
+
+            # Don't block past a pending long-press or double-tap deadline
+            wait_ms = min(timeout_ms, GESTURE_TIMEOUT_MS) if self.gestures.pending else timeout_ms
+            self.watchdog.begin(now_ns)
+            self.read_handler(connected[0], wait_ms)
+            self.gestures.advance()
+            self.watchdog.end(time.monotonic_ns())
+
+    def run_epoll_loop(self, timeout_ms: int = EVENT_TIMEOUT_MS):
+        """Sleep in one epoll wait until any hidraw device has a report.
+
+        Only the devices that are ready get read, so an idle pedalboard
+        costs one wake-up per ``timeout_ms`` and a press is picked up as
+        soon as the kernel delivers it.
+        """
+        poller = HidrawPoller()
+        handlers = axis_handlers = None
+        self.loop.start(timeout_ms / 1000)
+        try:
+            while self.running:
+                self.tick(time.monotonic_ns())
+                if handlers is not self.handlers:
+                    handlers = self.handlers
+                    poller.sync(handlers)
+                    axis_handlers = [h for h in handlers if isinstance(h, JoystickHandler) and h.axes]
+                wait_ms = min(timeout_ms, GESTURE_TIMEOUT_MS) if self.gestures.pending else timeout_ms
+                ready = poller.wait(wait_ms)
+                self.watchdog.begin(time.monotonic_ns())
+                for handler in ready:
+                    self.read_handler(handler)
+                # Axis values held back by the rate limit need no new report
+                for handler in axis_handlers:
+                    handler.flush_axes(time.monotonic_ns())
+                self.gestures.advance()
+                self.watchdog.end(time.monotonic_ns())
+        finally:
+            poller.close()
+
+    def run_poll_loop(self, interval: float = POLL_INTERVAL):
+        """Classic loop: non-blocking reads followed by a fixed sleep."""
+        self.loop.start(interval)
+        while self.running:
+            self.tick(time.monotonic_ns())
+            self.process_inputs()
+            time.sleep(interval)
+
+    def run_processes(self, timeout: float = WORKER_WAIT):
+        """Devices are read in worker processes; the main thread sends MIDI.
+
+        Each worker writes its events to a shared-memory ring and wakes this
+        loop through a pipe. A crashed or hung worker only costs its own
+        device a restart; the MIDI port and every other device stay up.
+        """
+        handlers = proxies = None
+        self.loop.start(timeout)
+        while self.running:
+            self.tick(time.monotonic_ns())
+            if handlers is not self.handlers:
+                handlers = self.handlers
+                proxies = [h for h in handlers if isinstance(h, WorkerHandler)]
+            wait = min(timeout, GESTURE_TIMEOUT_MS / 1000) if self.gestures.pending else timeout
+            wait_for_workers(proxies, wait)
+            now = time.monotonic()
+            self.watchdog.begin(time.monotonic_ns())
+            for proxy in proxies:
+                if proxy.ring is None:
+                    continue
+                # The worker did the reading; this lap is all dispatch
+                start_ns = time.monotonic_ns()
+                for kind, read_ns, match_ns, action, cc, channel, value in proxy.drain():
+                    proxy.read_ns = read_ns
+                    if kind == KIND_ACTION:
+                        if action := self.resolve_action(proxy, action):
+                            self.gestures.feed(ActionEvent(
+                                action, proxy.handler.__class__.__name__, proxy.path, read_ns, match_ns))
+                    elif kind == KIND_AXIS:
+                        self.midi_controller.send_cc(cc, value, channel or None)
+                self.watchdog.lap(proxy, start_ns, read_end_ns=start_ns)
+                proxy.check(now)
+            self.gestures.advance()
+            self.watchdog.end(time.monotonic_ns())
+
+    def run_threaded(self):
+        """One reader thread per handler feeding a single MIDI dispatcher.
+
+        A stalled read on one device no longer holds up the others; only the
+        dispatcher thread touches the MIDI controller.
+        """
+        self.events = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        with self._lock:
+            self.loop.start(DISPATCH_TIMEOUT)
+            self.dispatcher = MIDIDispatcher(self.gestures, self.events, self.tick)
+            self.dispatcher.start()
+            for handler in self.handlers:
+                self._start_reader(handler)
+
+        # Keep the main thread interruptible by Ctrl+C
+        while self.running:
+            time.sleep(POLL_INTERVAL * 10)
 
-    def process_inputs(self):
+    def _start_reader(self, handler):
+        reader = DeviceReader(handler, self.resolve_action, self.events)
+        self.readers[id(handler)] = reader
+        reader.start()
+
+    def tick(self, now_ns: int):
+        """Called once per input loop pass, between two events."""
+        self.loop.tick(now_ns)
+        if self._detached:
+            self.release_detached()
+        if self._reload is not None:
+            self.apply_reload()
+        if self._profile_requested:
+            self._profile_requested = False
+            logger.info(self.toggle_profiler(wait=False))
+
+    def request_profile(self, signum=None, frame=None):
+        """Signal handler: toggle the profiler from the input loop.
+
+        Only sets a flag; starting a thread or logging from a signal
+        handler could deadlock on a lock the interrupted code holds.
+        """
+        self._profile_requested = True
+
+    def toggle_profiler(self, wait: bool = True) -> str:
+        """Start a sampling profile, or end the running one early.
+
+        Args:
+            wait: Wait for the profile to be written when ending one; the
+                input loop passes False and leaves that to the profiler thread
+        """
+        with self._profile_lock:
+            profiler = self.profiler
+            if profiler and profiler.is_alive():
+                profiler.stop(wait)
+                if not wait:
+                    return f"profile stopping, writing {profiler.filename}"
+                return f"profile stopped after {profiler.samples} sample(s): {profiler.filename}"
+            self.profiler = SamplingProfiler(time.strftime(self.profile_file), self.profile_seconds)
+            self.profiler.start()
+            return f"profiling for {self.profile_seconds:g}s into {self.profiler.filename}"
+
+    def reload(self) -> str:
+        """Reload the mapping configs and wait until the input loop swapped them in.
+
+        Called from the config watcher or the control socket. Everything is
+        compiled here; the input loop only assigns the new tables, keeping
+        open devices, MIDI ports and effect states.
+        """
+        with self._reload_lock:
+            try:
+                mappings = load_mappings(reload=True)
+                pending = self.prepare_reload(mappings)
+            except Exception as e:
+                logger.warning("Reload failed, keeping the current mappings: %s", e)
+                return f"error: {e}"
+            if not pending.changed:
+                return "unchanged"
+            self._reload = pending
+            if not pending.done.wait(APPLY_TIMEOUT):
+                with self._lock:
+                    withdrawn = self._reload is pending
+                    if withdrawn:
+                        self._reload = None
+                if withdrawn:
+                    self.discard_reload(pending)
+                    return "error: the input loop did not pick up the reload"
+                # The input loop took it just after the timeout
+                pending.done.wait()
+            logger.info("Reloaded mappings: %s", ", ".join(pending.changed))
+            return "ok: " + ", ".join(pending.changed)
+
+    def prepare_reload(self, mappings: Mappings) -> _PendingReload:
+        old = self.mappings
+        midi_changed, midi_tables = self.midi_controller.prepare_reload(mappings.midi)
+        changed = [f"midi.{name}" for name in midi_changed]
+        changed += [name for name in ('joystick', 'm3', 'ab', 'gestures')
+                    if getattr(mappings, name) != getattr(old, name)]
+        controller = self.midi_controller
+        commands = midi_tables['config'].commands
+        store_layout = None
+        if controller.store and commands.keys() != controller.states.keys():
+            states = {key: controller.states.get(key, False) for key in commands}
+            try:
+                store_layout = controller.store.prepare(states, controller.active_scene,
+                                                        mapping_versions(mappings))
+            except Exception:
+                controller.discard_tables(midi_tables)
+                raise
+        return _PendingReload(mappings, changed, midi_tables, store_layout)
+
+    def discard_reload(self, pending: _PendingReload):
+        """Close what ``prepare_reload`` opened for a reload that is not applied."""
+        self.midi_controller.discard_tables(pending.midi_tables)
+        if pending.store_layout:
+            self.midi_controller.store.discard(pending.store_layout)
+
+    def apply_reload(self):
+        """Swap in the pending reload (on the thread that dispatches)."""
+        with self._lock:
+            pending, self._reload = self._reload, None
+        if pending is None:
+            # reload() withdrew it after timing out
+            return
+        mappings = pending.mappings
+        self.midi_controller.swap_tables(pending.midi_tables)
+        configs = {JoystickHandler: mappings.joystick, ShutterM3Handler: mappings.m3,
+                   ShutterABHandler: mappings.ab}
+        for handler in self.handlers:
+            target = handler.handler if isinstance(handler, WorkerHandler) else handler
+            config = configs.get(type(target))
+            if config is None or config == target.config:
+                continue
+            if isinstance(handler, WorkerHandler):
+                handler.reconfigure(functools.partial(type(target), config))
+            else:
+                handler.reconfigure(config)
+        if mappings.gestures != self.mappings.gestures:
+            self.gestures.reconfigure(mappings.gestures)
+        with self._lock:
+            self.actions = self.build_actions(self.handlers)
+        if self.monitor:
+            # Devices plugged in from now on get the new configs
+            self.monitor.device_types = device_types(self.isolated, mappings)
+        controller = self.midi_controller
+        if pending.store_layout:
+            controller.store.install(pending.store_layout, controller.states, controller.active_scene)
+        elif controller.store:
+            controller.store.set_versions(mapping_versions(mappings))
+        self.mappings = mappings
+        pending.done.set()
+
+    def restore_state(self, filename: str, resend: bool = False):
+        """Restore effect states saved by an earlier run and keep saving them."""
+        store = StateStore(filename)
+        versions = mapping_versions(self.mappings)
+        restored = self.midi_controller.attach_store(store, versions)
+        store.start()
+        print(f"Restored {restored} effect state(s) from {filename}")
+        changed = [name for name, version in store.saved_versions.items() if versions.get(name) != version]
+        if changed:
+            logger.warning("Mappings changed since the state was saved: %s", ", ".join(changed))
+        if resend and restored:
+            sent = self.midi_controller.resend_states()
+            print(f"Re-sent the restored state ({sent} message(s))")
+
+    def start_reload(self, watch: bool, control_socket: Optional[str]):
+        if watch:
+            self.config_watcher = ConfigWatcher(self.reload)
+            self.config_watcher.start()
+        if control_socket:
+            self.control_server = ControlServer(control_socket, {
+                'reload': self.reload,
+                'profile': self.toggle_profiler,
+                'watchdog': self.watchdog.summary,
+            })
+            self.control_server.start()
+            print(f"Control socket: {control_socket} (send 'reload', 'profile' or 'watchdog')")
+
+    def device_ages(self):
+        """(label, monotonic ns of the last report or attach) per connected device."""
         for handler in self.handlers:
-            if isinstance(handler, ShutterM3Handler) or isinstance(handler, ShutterABHandler):
-                if action := handler.read():
-                    self.midi_controller.toggle_effect(action)
-            elif isinstance(handler, JoystickHandler):
-                if button := handler.read():
-                    if action := joystick_config.actions.get(button):
-                        self.midi_controller.toggle_effect(action)
+            if handler.device:
+                yield _source_label(handler), max(handler.read_ns, handler.attached_ns)
+
+    def collect_metrics(self):
+        """Samples for the metrics registry, read from the live objects."""
+        now_ns = time.monotonic_ns()
+        handlers = self.handlers
+        yield ('pedalboard_devices_connected', 'gauge', "Connected input devices", {},
+               sum(1 for handler in handlers if handler.device))
+        for handler in handlers:
+            if isinstance(handler, WorkerHandler):
+                labels = {'device': handler.handler.__class__.__name__, 'path': path_label(handler.path)}
+                yield ('pedalboard_reader_restarts_total', 'counter',
+                       "Worker process restarts after a crash or hang", labels, handler.restarts)
+                yield ('pedalboard_ring_dropped_total', 'counter',
+                       "Events dropped because the worker's ring was full", labels,
+                       handler.ring.dropped if handler.ring else 0)
+            else:
+                labels = {'device': handler.__class__.__name__, 'path': path_label(handler.path)}
+                yield ('pedalboard_reads_total', 'counter', "Reports read", labels, handler.reads)
+                yield ('pedalboard_empty_reads_total', 'counter', "Reads that returned no report",
+                       labels, handler.empty_reads)
+                yield ('pedalboard_reports_unmatched_total', 'counter', "Reports matching no pattern",
+                       labels, handler.input.unmatched)
+                yield ('pedalboard_presses_total', 'counter', "Press edges", labels, handler.input.presses)
+                yield ('pedalboard_holds_total', 'counter', "Repeated reports of a held button",
+                       labels, handler.input.holds)
+                yield ('pedalboard_bounces_total', 'counter', "Presses dropped by debouncing",
+                       labels, handler.input.bounces)
+            if handler.device:
+                last_ns = max(handler.read_ns, handler.attached_ns)
+                yield ('pedalboard_last_report_age_seconds', 'gauge',
+                       "Time since the device's last report (or attach)", labels, (now_ns - last_ns) / 1e9)
+
+        if self.monitor:
+            yield ('pedalboard_device_attaches_total', 'counter', "Devices attached", {}, self.monitor.attaches)
+            yield ('pedalboard_device_reconnects_total', 'counter', "Devices attached again at a known path",
+                   {}, self.monitor.reconnects)
+            yield ('pedalboard_device_detaches_total', 'counter', "Devices dropped after a read error",
+                   {}, self.monitor.detaches)
+        dropped = sum(reader.dropped for reader in list(self.readers.values()))
+        yield ('pedalboard_event_queue_dropped_total', 'counter', "Actions dropped on a full event queue",
+               {}, dropped)
+
+        controller = self.midi_controller
+        if controller:
+            output = controller.output
+            yield ('pedalboard_midi_sends_total', 'counter', "MIDI sends (a scene burst counts once)",
+                   {}, output.sent if output else controller.sent)
+            if output:
+                yield ('pedalboard_midi_coalesced_total', 'counter', "CC values replaced by a newer one",
+                       {}, output.coalesced)
+                yield ('pedalboard_midi_dropped_total', 'counter', "MIDI sends dropped on a full queue",
+                       {}, output.dropped)
+                yield ('pedalboard_midi_send_errors_total', 'counter', "MIDI sends that raised",
+                       {}, output.errors)
+            if controller.sync:
+                yield ('pedalboard_midi_resyncs_total', 'counter', "Effect states changed from MIDI input",
+                       {}, controller.sync.resyncs)
+            clock = controller.clock
+            if clock:
+                yield ('pedalboard_midi_clock_ticks_total', 'counter', "MIDI Clock pulses sent", {}, clock.ticks)
+                yield ('pedalboard_midi_clock_skipped_total', 'counter', "MIDI Clock pulses skipped after a stall",
+                       {}, clock.skipped)
+                yield ('pedalboard_midi_clock_bpm', 'gauge', "Current clock tempo", {}, clock.bpm or 0)
+                for quantile in (0.5, 0.99):
+                    yield ('pedalboard_midi_clock_jitter_seconds', 'gauge', "MIDI Clock send time minus deadline",
+                           {'quantile': quantile}, clock.jitter.percentile(quantile * 100) / 1e9)
+
+        yield ('pedalboard_loop_ticks_total', 'counter', "Input loop passes", {}, self.loop.ticks)
+        yield ('pedalboard_loop_overruns_total', 'counter', "Input loop passes later than expected",
+               {}, self.loop.overruns)
+        yield ('pedalboard_loop_max_period_seconds', 'gauge', "Longest time between two loop passes",
+               {}, self.loop.max_period_ns / 1e9)
+        watchdog = self.watchdog
+        yield ('pedalboard_watchdog_passes_total', 'counter', "Loop passes timed by the watchdog",
+               {}, watchdog.passes)
+        for source, count in list(watchdog.by_source.items()):
+            yield ('pedalboard_watchdog_overruns_total', 'counter', "Loop passes over the watchdog budget",
+                   {'source': source}, count)
+        for quantile in (0.5, 0.99):
+            yield ('pedalboard_watchdog_pass_work_seconds', 'gauge', "Work per loop pass, blocking reads excluded",
+                   {'quantile': quantile}, watchdog.costs.percentile(quantile * 100) / 1e9)
+        total = self.latency.stages['total']
+        for quantile in (0.5, 0.99):
+            yield ('pedalboard_press_latency_seconds', 'gauge', "Press-to-MIDI latency quantiles",
+                   {'quantile': quantile}, total.percentile(quantile * 100) / 1e9)
+
+    def start_metrics_server(self, port: int, stale_after: float = STALE_AFTER):
+        registry = MetricsRegistry()
+        health = HealthCheck(self.device_ages, self.loop, stale_after)
+        registry.collector(self.collect_metrics)
+        registry.collector(health.collect)
+        self.metrics_server = MetricsServer(registry, health, port)
+        self.metrics_server.start()
+        host, port = self.metrics_server.address[:2]
+        print(f"Metrics on http://{host}:{port}/metrics, health on /health")
+
+    def start_latency_reporter(self, interval: float):
+        if interval > 0:
+            self.latency_reporter = LatencyReporter(self.latency, interval)
+            self.latency_reporter.start()
+
+    def stop_threads(self):
+        if self.config_watcher:
+            self.config_watcher.stop()
+            self.config_watcher = None
+        if self.control_server:
+            self.control_server.stop()
+            self.control_server = None
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.latency_reporter:
+            self.latency_reporter.stop()
+            self.latency_reporter = None
+        if self.profiler:
+            # An unfinished profile is still written
+            self.profiler.stop()
+            self.profiler = None
+        if self.monitor:
+            self.monitor.stop()
+            self.monitor.join()
+            if self.monitor.cache_file:
+                save_device_cache(self.monitor.cache_file, self.monitor.cache_entries())
+            self.monitor = None
+        with self._lock:
+            readers = list(self.readers.values())
+            self.readers = {}
+        for reader in readers:
+            reader.stop()
+        for reader in readers:
+            reader.join()
+        if self.dispatcher:
+            self.dispatcher.stop()
+            self.dispatcher.join()
+            self.dispatcher = None
+        if self.recorder:
+            self.recorder.stop()
+            print(f"Recorded {self.recorder.recorded} report(s) to {self.recorder.filename}")
+            self.recorder = None
+
+    def stop(self):
+        """Make the running input loop return."""
+        self.running = False
 
     def cleanup(self):
+        self.stop_threads()
+        self.release_detached()
+        self.latency.print_report()
+        if self.watchdog.passes:
+            for line in self.watchdog.summary().splitlines():
+                print(f"Watchdog: {line}")
         for handler in self.handlers:
+            if isinstance(handler, JoystickHandler):
+                for line in handler.axis_stats():
+                    print(f"Joystick axis {line}")
+            elif isinstance(handler, WorkerHandler) and handler.restarts:
+                print(f"Reader for {handler.handler.__class__.__name__} {handler.path} "
+                      f"restarted {handler.restarts} time(s)")
             handler.cleanup()
         if self.midi_controller:
             self.midi_controller.cleanup()
 
+def _source_label(handler) -> str:
+    name = (handler.handler if isinstance(handler, WorkerHandler) else handler).__class__.__name__
+    return source_label(name, handler.path)
+
+def device_types(isolated: bool = False, mappings: Optional[Mappings] = None):
+    """Device kinds the monitor watches for, with a factory for their handlers.
+
+    With ``isolated`` the handlers run in worker processes behind a
+    ``WorkerHandler``; the factories are partials so they can be pickled
+    into the workers.
+    """
+    mappings = mappings or load_mappings()
+    types = [
+        DeviceType("joystick", mappings.joystick.vendor_id, mappings.joystick.product_id,
+                   functools.partial(JoystickHandler, mappings.joystick)),
+        DeviceType("M3 shutter", mappings.m3.vendor_id, mappings.m3.product_id,
+                   functools.partial(ShutterM3Handler, mappings.m3)),
+        DeviceType("AB shutter", mappings.ab.vendor_id, mappings.ab.product_id,
+                   functools.partial(ShutterABHandler, mappings.ab)),
+    ]
+    if isolated:
+        for device_type in types:
+            device_type.create_handler = functools.partial(WorkerHandler, device_type.create_handler)
+    return types
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Guitar pedalboard MIDI controller")
+    parser.add_argument(
+        "--mode",
+        choices=("poll", "event", "threaded", "process"),
+        default="poll",
+        help="poll: fixed 50 ms loop; event: blocking reads, actions sent as soon as they arrive "
+             "(several hidapi devices are read from one thread each, as in threaded); "
+             "threaded: one reader thread per device feeding a single MIDI dispatcher; "
+             "process: one reader process per device, restarted if it crashes or hangs",
+    )
+    parser.add_argument(
+        "--hid-backend",
+        choices=hidbackend.BACKENDS,
+        default="auto",
+        help="hidraw reads /dev/hidraw* directly (Linux, one epoll in event mode); "
+             "auto uses it when a node is readable and falls back to hidapi",
+    )
+    parser.add_argument(
+        "--latency-interval",
+        type=float,
+        default=REPORT_INTERVAL,
+        metavar="SECONDS",
+        help="print a press-to-MIDI latency summary line this often (0 disables); "
+             "the full breakdown is always printed on exit",
+    )
+    parser.add_argument(
+        "--state-file",
+        metavar="FILE",
+        help="save effect states and the active scene here and restore them on the next start",
+    )
+    parser.add_argument(
+        "--resend-state",
+        action="store_true",
+        help="with --state-file, send the restored states as one burst before reading any input",
+    )
+    parser.add_argument(
+        "--watch-config",
+        action="store_true",
+        help="reload the mappings whenever a file in config/ changes",
+    )
+    parser.add_argument(
+        "--control-socket",
+        metavar="PATH",
+        help="accept 'reload', 'profile' and 'watchdog' commands on this Unix socket",
+    )
+    parser.add_argument(
+        "--watchdog-budget",
+        type=float,
+        default=WATCHDOG_BUDGET_MS,
+        metavar="MS",
+        help="log input loop passes doing more than this much work, with the device that took longest",
+    )
+    parser.add_argument(
+        "--profile-seconds",
+        type=float,
+        default=PROFILE_SECONDS,
+        metavar="SECONDS",
+        help="length of a sampling profile started with SIGUSR1 or 'profile' on the control socket",
+    )
+    parser.add_argument(
+        "--profile-file",
+        default=PROFILE_FILE,
+        metavar="PATTERN",
+        help="folded-stack output for flame graphs (strftime fields are expanded)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics and a health check on /health",
+    )
+    parser.add_argument(
+        "--stale-after",
+        type=float,
+        default=STALE_AFTER,
+        metavar="SECONDS",
+        help="health check fails for a connected device silent this long (0 disables)",
+    )
+    parser.add_argument(
+        "--log-json",
+        metavar="FILE",
+        help="also write every log record as a JSON line with its structured fields",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+        default="INFO",
+        help="DEBUG also logs every matched report per device",
+    )
+    parser.add_argument(
+        "--device-cache",
+        metavar="FILE",
+        help="remember device paths and serials here and reopen them directly on the next start",
+    )
+    log = parser.add_mutually_exclusive_group()
+    log.add_argument("--record", metavar="FILE",
+                     help="append every raw HID report to a binary log")
+    log.add_argument("--replay", metavar="FILE",
+                     help="feed a recorded log through the handlers instead of reading devices")
+    parser.add_argument(
+        "--replay-speed",
+        choices=("original", "max"),
+        default="original",
+        help="replay with the recorded timing or as fast as possible (debounce and gestures "
+             "still see the recorded timing)",
+    )
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    if args.record and args.mode == "process":
+        raise SystemExit("Error: --record needs the reports in this process; use another --mode")
+    log_listener = setup_logging(args.log_json, getattr(logging, args.log_level))
+    device_manager = None
+    try:
+        print(f"HID backend: {hidbackend.select(args.hid_backend)}")
+    except RuntimeError as e:
+        log_listener.stop()
+        raise SystemExit(f"Error: {e}")
+
     try:
         device_manager = DeviceManager()
-        device_manager.midi_controller = MIDIController(midi_config)
-        
-        # Initialize joystick
-        device_manager.add_handler(JoystickHandler(joystick_config))
-        
-        # Initialize all detected M3 shutters
-        m3_connected = 0
-        for shutter_config in M3_SHUTTERS:
-            if device_manager.add_handler(ShutterM3Handler(shutter_config)):
-                m3_connected += 1
-        if m3_connected > 0:
-            print(f"Connected to {m3_connected} M3 shutter(s)")
-        
-        # Initialize all detected AB shutters
-        ab_connected = 0
-        for shutter_config in AB_SHUTTERS:
-            if device_manager.add_handler(ShutterABHandler(shutter_config)):
-                ab_connected += 1
+        device_manager.midi_controller = MIDIController(device_manager.mappings.midi)
+        device_manager.watchdog.budget_ns = int(args.watchdog_budget * 1e6)
+        device_manager.profile_file = args.profile_file
+        device_manager.profile_seconds = args.profile_seconds
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, device_manager.request_profile)
+
+        if args.replay:
+            replayed = replay_log(args.replay, device_manager, device_types(),
+                                  realtime=args.replay_speed == "original")
+            print(f"\nReplayed {replayed} report(s) from {args.replay}")
+            return
+
+        if args.state_file:
+            device_manager.restore_state(args.state_file, args.resend_state)
+
+        if args.record:
+            device_manager.recorder = ReportRecorder(args.record)
+            device_manager.recorder.start()
         
-        if ab_connected > 0:        
-            print(f"Connected to {ab_connected} AB shutter(s)")
+        # Attach every known device (from the cache, or with a single bus
+        # scan), then keep watching for hot-plugged or dropped devices in
+        # the background
+        discovery_start = time.perf_counter()
+        device_manager.isolated = args.mode == "process"
+        device_manager.monitor = DeviceMonitor(
+            device_types(device_manager.isolated, device_manager.mappings),
+            on_attach=device_manager.attach_handler,
+            on_detach=device_manager.detach_handler,
+            cache_file=args.device_cache,
+        )
+        cached = load_device_cache(args.device_cache) if args.device_cache else []
+        warm = cached and device_manager.monitor.warm_start(cached)
+        if not warm:
+            device_manager.monitor.scan()
+        discovery_ms = (time.perf_counter() - discovery_start) * 1000
+        if warm:
+            how = "warm start from cache"
+        else:
+            how = f"cold start, enumeration {device_manager.monitor.inventory.scan_time * 1000:.1f} ms"
+        print(f"Device discovery: {len(device_manager.handlers)} device(s) in {discovery_ms:.1f} ms ({how})")
+        device_manager.monitor.start()
         
         # Print device information
         device_manager.print_device_info()
         print("\nPress 'Ctrl+C' to exit")
+        device_manager.start_latency_reporter(args.latency_interval)
+        if args.metrics_port is not None:
+            device_manager.start_metrics_server(args.metrics_port, args.stale_after)
+        device_manager.start_reload(args.watch_config, args.control_socket)
         
         # Main loop
-        while True:
-            device_manager.process_inputs()
-            time.sleep(0.05)
+        if args.mode == "event":
+            device_manager.run_event_loop()
+        elif args.mode == "threaded":
+            device_manager.run_threaded()
+        elif args.mode == "process":
+            device_manager.run_processes()
+        else:
+            device_manager.run_poll_loop()
 
     except KeyboardInterrupt:
         print("\nProgram terminated")
     finally:
-        device_manager.cleanup()
+        if device_manager:
+            device_manager.cleanup()
+        log_listener.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,7 +1,14 @@
-from dataclasses import dataclass
-import rtmidi
-from typing import Dict, Tuple
-from datetime import datetime
+from dataclasses import dataclass, field, replace
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from midi.output import MIDIOutputStage, log_effect, port_lock, report_sent
+from midi.routing import DEFAULT_PORT, MIDIPort, Route, compile_routes, open_ports, resolve_routes
+from midi.scenes import Scene, compile_scenes
+from midi.sync import MIDIStateSync, SysExDecoder
+from midi.tempo import MIDIClock, TapTempo, TempoConfig
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -9,35 +16,333 @@ class MIDIConfig:
     channel: int
     port_name: str
     commands: Dict[str, Tuple[int, str]]
+    # Send from a dedicated output thread instead of the input thread
+    async_output: bool = False
+    # How long the output thread holds a CC back to collapse newer values (ms)
+    coalesce_window_ms: float = 0.0
+    # Extra output ports by name; the virtual port_name port is always DEFAULT_PORT
+    ports: Dict[str, MIDIPort] = field(default_factory=dict)
+    # Per-command destinations; commands without routes use (DEFAULT_PORT, channel, cc)
+    routes: Dict[str, List[Route]] = field(default_factory=dict)
+    # Action key -> scene recalled instead of toggling that key's CC
+    scenes: Dict[str, Scene] = field(default_factory=dict)
+    # Listen on an input for every port and follow effect changes made elsewhere
+    sync_input: bool = False
+    # Turns a received SysEx message into {command key: state}
+    sysex_decoder: Optional[SysExDecoder] = None
+    # Tap tempo key and the MIDI Clock it drives
+    tempo: Optional[TempoConfig] = None
+
+
+# Fields a reload can change; the rest need a restart
+RELOADABLE = ('channel', 'commands', 'ports', 'routes', 'scenes')
+RESTART_ONLY = ('port_name', 'async_output', 'coalesce_window_ms', 'sync_input', 'sysex_decoder', 'tempo')
+
 
 class MIDIController:
     """Handles MIDI message processing and effect state management."""
     
     def __init__(self, config: MIDIConfig):
         self.config = config
-        self.midi_out = rtmidi.MidiOut()
-        self.midi_out.open_virtual_port(config.port_name)
+        ports = {DEFAULT_PORT: MIDIPort(config.port_name), **config.ports}
+        self.outputs = open_ports(ports)
+        self.midi_out = self.outputs[DEFAULT_PORT]
         self.states = {key: False for key in config.commands}
-        
-    def send_cc(self, cc_number: int, value: int):
+        # Monotonic timestamp (ns) of the last local change per command
+        self.changed_ns = {key: 0 for key in config.commands}
+        # Monotonic timestamp (ns) taken right after the last send_message
+        self.last_send_ns = 0
+        # Sends made without the output thread (its own stage counts the rest)
+        self.sent = 0
+        # Key of the last recalled scene
+        self.active_scene: Optional[str] = None
+        # Optional StateStore persisting states and the active scene
+        self.store = None
+
+        # Outputs dropped by a reload; closed on cleanup since queued
+        # messages may still be on their way to them
+        self.retired_outputs = []
+
+        # Pre-encoded (off, on) destinations and log fields per command
+        self.routes, self.messages, self.log_fields = self._compile_routes(config, self.outputs)
+        self.scenes = compile_scenes(config.scenes, config.commands, self.messages,
+                                     config.channel, self.outputs)
+
+        self.output = None
+        if config.async_output:
+            self.output = MIDIOutputStage(config.coalesce_window_ms / 1000)
+            self.output.start()
+
+        self.sync = None
+        if config.sync_input:
+            self.sync = MIDIStateSync(self, ports, config.sysex_decoder)
+
+        self.tap_tempo = None
+        self.clock = None
+        # Action key -> tempo method, checked before scenes and commands
+        self.tempo_actions = {}
+        if config.tempo:
+            self._start_clock(config.tempo)
+
+    def _start_clock(self, tempo: TempoConfig):
+        self.tap_tempo = TapTempo(tempo.taps, tempo.tolerance, tempo.min_bpm, tempo.max_bpm)
+        self.clock = MIDIClock(self._clock_outputs(tempo))
+        if tempo.bpm:
+            self.clock.set_tempo(tempo.bpm)
+        self.clock.start()
+        self.tempo_actions[tempo.tap_key] = self.tap
+        if tempo.transport_key:
+            self.tempo_actions[tempo.transport_key] = self.toggle_transport
+
+    def _clock_outputs(self, tempo: TempoConfig) -> list:
+        return [self.outputs[port] for port in tempo.ports if port in self.outputs]
+
+    @staticmethod
+    def _compile_routes(config: MIDIConfig, outputs: dict):
+        routes = resolve_routes(config.commands, config.routes, config.channel)
+        messages = compile_routes(routes, outputs)
+        log_fields = {}
+        for key, (cc_number, effect_name) in config.commands.items():
+            first = routes[key][0]
+            log_fields[key] = tuple(
+                {'action': key, 'effect': effect_name, 'state': state, 'cc': first.cc, 'value': value}
+                for state, value in (("OFF", first.off_value), ("ON", first.on_value))
+            )
+        return routes, messages, log_fields
+
+    def prepare_reload(self, config: MIDIConfig) -> Tuple[List[str], dict]:
+        """Compile the lookup tables a reloaded config changes.
+
+        Only tables whose inputs changed are rebuilt. Ports that are already
+        open stay open (the virtual port is never recreated) and new ports
+        are opened here, so ``swap_tables`` only assigns.
+
+        Returns:
+            tuple: (names of the changed config fields, tables for ``swap_tables``)
+        """
+        old = self.config
+        for name in RESTART_ONLY:
+            if getattr(old, name) != getattr(config, name):
+                logger.warning("MIDI config '%s' changed; it takes effect after a restart", name)
+        config = replace(config, **{name: getattr(old, name) for name in RESTART_ONLY})
+        changed = [name for name in RELOADABLE if getattr(old, name) != getattr(config, name)]
+        tables = {'config': config}
+        if not changed:
+            return changed, tables
+
+        outputs = self.outputs
+        if 'ports' in changed:
+            ports = {DEFAULT_PORT: MIDIPort(config.port_name), **config.ports}
+            opened = open_ports({key: port for key, port in ports.items() if key not in outputs})
+            outputs = {key: midi_out for key, midi_out in outputs.items() if key in ports}
+            outputs.update(opened)
+            tables['outputs'] = outputs
+        messages = self.messages
+        try:
+            if {'channel', 'commands', 'ports', 'routes'} & set(changed):
+                tables['routes'], messages, tables['log_fields'] = self._compile_routes(config, outputs)
+                tables['messages'] = messages
+            tables['scenes'] = compile_scenes(config.scenes, config.commands, messages,
+                                              config.channel, outputs)
+        except Exception:
+            self.discard_tables(tables)
+            raise
+        return changed, tables
+
+    def discard_tables(self, tables: dict):
+        """Close the ports ``prepare_reload`` opened for tables that won't be swapped in."""
+        current = {id(midi_out) for midi_out in self.outputs.values()}
+        for midi_out in tables.get('outputs', {}).values():
+            if id(midi_out) not in current:
+                midi_out.close_port()
+
+    def swap_tables(self, tables: dict):
+        """Install tables from ``prepare_reload``.
+
+        Call between two events on the thread that dispatches. Effect states
+        are kept for every command that still exists.
+        """
+        config = tables['config']
+        outputs = tables.get('outputs')
+        if outputs is not None:
+            self.retired_outputs += [midi_out for key, midi_out in self.outputs.items() if key not in outputs]
+            self.outputs = outputs
+            if self.clock:
+                self.clock.outputs = self._clock_outputs(config.tempo)
+        if config.commands.keys() != self.states.keys():
+            self.states = {key: self.states.get(key, False) for key in config.commands}
+            self.changed_ns = {key: self.changed_ns.get(key, 0) for key in config.commands}
+        for name in ('routes', 'messages', 'log_fields', 'scenes'):
+            if name in tables:
+                setattr(self, name, tables[name])
+        self.config = config
+        if self.sync:
+            self.sync.build_tables()
+
+    def attach_store(self, store, versions: Dict[str, int]) -> int:
+        """Restore saved effect states and keep ``store`` up to date from now on.
+
+        Call before the first input is processed.
+
+        Returns:
+            int: Number of effect states restored
+        """
+        restored, scene = store.restore(self.states)
+        self.states.update(restored)
+        if scene in self.scenes:
+            self.active_scene = scene
+        store.layout(self.states, self.active_scene, versions)
+        self.store = store
+        return len(restored)
+
+    def resend_states(self) -> int:
+        """Send every effect's current state as one burst.
+
+        The active scene's bank select and Program Change go first, so the
+        rig ends up exactly where the saved state says it is.
+
+        Returns:
+            int: Number of messages sent (or queued)
+        """
+        scene = self.scenes.get(self.active_scene)
+        destinations = (scene.prefix if scene else ()) + tuple(
+            destination for key, state in self.states.items() for destination in self.messages[key][state]
+        )
+        fields = {'action': self.active_scene, 'effect': "Restored state", 'state': 'RESTORE',
+                  'value': len(self.states)}
+        self.send(destinations, fields, None, object())
+        return len(destinations)
+
+    def send_cc(self, cc_number: int, value: int, channel: Optional[int] = None):
         """Send MIDI Control Change message."""
-        status_byte = 0xB0 | (self.config.channel - 1)
-        self.midi_out.send_message([status_byte, cc_number, value])
+        status_byte = 0xB0 | ((channel or self.config.channel) - 1)
+        self.send_message((status_byte, cc_number, value))
+
+    def send_message(self, message, fields: Optional[dict] = None, trace=None):
+        """Send an encoded message on the default port."""
+        self.send(((self.midi_out, message),), fields, trace)
+
+    def send(self, destinations, fields: Optional[dict] = None, trace=None, key=None):
+        """Send pre-encoded messages, through the output thread if enabled.
+
+        Args:
+            destinations: Tuple of (MIDI output, encoded message) pairs
+            fields: Structured log fields describing the effect change
+            trace: Press trace told the monotonic send time (ns) once sent
+            key: Coalescing key for the output thread (defaults to the first CC)
+        """
+        if self.output:
+            self.output.submit(destinations, fields, trace, key)
+            return
+        for midi_out, message in destinations:
+            with port_lock(midi_out):
+                midi_out.send_message(message)
+        self.sent += 1
+        self.last_send_ns = time.monotonic_ns()
+        report_sent(fields, trace, self.last_send_ns)
         
-    def toggle_effect(self, key: str):
-        """Toggle effect state and send corresponding MIDI message."""
+    def trigger(self, key: str, trace=None) -> bool:
+        """Tap the tempo, recall the scene bound to ``key``, or toggle its effect."""
+        if self.tempo_actions:
+            action = self.tempo_actions.get(key)
+            if action:
+                return action(key, trace)
+        if key in self.scenes:
+            return self.recall_scene(key, trace)
+        return self.toggle_effect(key, trace)
+
+    def recall_scene(self, key: str, trace=None) -> bool:
+        """Bring every effect of a scene to its target state in one burst.
+
+        Only effects whose state differs are sent, after the scene's bank
+        select and Program Change (if any).
+
+        Returns:
+            bool: True if the burst was sent (or queued), False for unknown scenes.
+        """
+        scene = self.scenes.get(key)
+        if scene is None:
+            return False
+
+        changed, destinations = scene.burst(self.states)
+        now = time.monotonic_ns()
+        store = self.store
+        for effect, state in changed:
+            self.states[effect] = state
+            self.changed_ns[effect] = now
+            if store:
+                store.set_state(effect, state)
+        self.active_scene = key
+        if store:
+            store.set_scene(key)
+        # A unique key: a pending burst must never be replaced by a later one
+        self.send(destinations, dict(scene.fields, value=len(changed)), trace, object())
+        return True
+
+    def tap(self, key: str, trace=None) -> bool:
+        """Tap the tempo; the clock follows once two taps give a tempo.
+
+        The tap time is when the press was read, not when it got here.
+        """
+        tap_ns = trace.event.read_ns if trace else time.monotonic_ns()
+        bpm = self.tap_tempo.tap(tap_ns)
+        if bpm is None:
+            return True
+        first = self.clock.bpm is None
+        # Anchor the beat on the tap so the clock lands where the player is
+        self.clock.set_tempo(bpm, tap_ns)
+        if first and self.config.tempo.start_on_tap:
+            self.clock.play()
+        fields = {'action': key, 'effect': "Tempo", 'state': f"{bpm:.1f} BPM", 'value': round(bpm)}
+        event = trace.event if trace else None
+        log_effect(fields, event and event.device, event and event.path)
+        return True
+
+    def toggle_transport(self, key: str, trace=None) -> bool:
+        """Send MIDI Start, or Stop when the clock is playing."""
+        if self.clock.playing:
+            self.clock.halt()
+        else:
+            self.clock.play()
+        log_effect({'action': key, 'effect': "Transport", 'state': "START" if self.clock.playing else "STOP"})
+        return True
+
+    def toggle_effect(self, key: str, trace=None) -> bool:
+        """Toggle effect state and send corresponding MIDI message.
+
+        Args:
+            key: Command key from the MIDI config
+            trace: Press trace told the monotonic send time (ns) once sent
+
+        Returns:
+            bool: True if a message was sent (or queued), False for unknown keys.
+        """
         if key not in self.config.commands:
-            return
+            return False
             
-        cc_number, effect_name = self.config.commands[key]
-        self.states[key] = not self.states[key]
-        value = 127 if self.states[key] else 0
-        self.send_cc(cc_number, value)
-        state = "ON" if self.states[key] else "OFF"
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{current_time}] {effect_name}: {state}")
+        state = self.states[key] = not self.states[key]
+        self.changed_ns[key] = time.monotonic_ns()
+        if self.store:
+            self.store.set_state(key, state)
+        self.send(self.messages[key][state], self.log_fields[key][state], trace, key)
+        return True
         
     def cleanup(self):
         """Clean up MIDI resources."""
-        self.midi_out.close_port()
-        del self.midi_out
\ No newline at end of file
+        if self.sync:
+            self.sync.close()
+            logger.info("MIDI sync: %s", self.sync.stats())
+        if self.store:
+            self.store.stop()
+            self.store = None
+        if self.clock:
+            self.clock.stop()
+            logger.info("MIDI clock: %s", self.clock.stats())
+        if self.output:
+            self.output.stop()
+            logger.info("MIDI output: %s", self.output.stats())
+        for midi_out in list(self.outputs.values()) + self.retired_outputs:
+            midi_out.close_port()
+        self.outputs.clear()
+        self.retired_outputs.clear()
+        del self.midi_out
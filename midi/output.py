@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of distinct messages waiting to be sent
+MAX_PENDING = 256
+
+# id(MIDI output) -> lock held around each send_message on it
+_port_locks: Dict[int, threading.Lock] = {}
+
+
+def port_lock(midi_out) -> threading.Lock:
+    """The lock serializing sends to ``midi_out`` across threads.
+
+    The output thread, the MIDI clock and direct sends share one output;
+    rtmidi does not serialize concurrent ``send_message`` calls itself.
+    """
+    lock = _port_locks.get(id(midi_out))
+    if lock is None:
+        lock = _port_locks.setdefault(id(midi_out), threading.Lock())
+    return lock
+
+
+def log_effect(fields: dict, device: Optional[str] = None, path: Optional[bytes] = None,
+               latency_ns: Optional[int] = None):
+    """Log an effect change with its structured fields."""
+    extra = dict(fields)
+    extra['device'] = device
+    extra['path'] = path
+    extra['latency_ms'] = round(latency_ns / 1e6, 3) if latency_ns is not None else None
+    logger.info("%s: %s", fields['effect'], fields['state'], extra=extra)
+
+
+def report_sent(fields: Optional[dict], trace, send_ns: int):
+    """Hand a sent message to its press trace, or just log it."""
+    if trace is not None:
+        trace.sent(send_ns, fields)
+    elif fields:
+        log_effect(fields)
+
+
+class _Pending:
+    __slots__ = ('destinations', 'fields', 'trace', 'queued_ns', 'replaced')
+
+    def __init__(self, destinations, fields, trace, queued_ns):
+        self.destinations = destinations
+        self.fields = fields
+        self.trace = trace
+        self.queued_ns = queued_ns
+        # Traces of earlier presses whose message this one replaced
+        self.replaced = None
+
+
+class MIDIOutputStage(threading.Thread):
+    """Sends pre-encoded MIDI messages from a dedicated thread.
+
+    ``submit()`` only queues the destinations, so the input thread never
+    waits on ``send_message`` or on logging. Pending messages with the same
+    key (by default the output and (channel, CC) of the first message) are
+    collapsed into the latest value; ``coalesce_window`` (seconds) holds each message back that
+    long to give later ones the chance to replace it. With a window of 0
+    messages go out immediately and only those that pile up while the
+    thread is busy are collapsed.
+    """
+
+    def __init__(self, coalesce_window: float = 0.0, max_pending: int = MAX_PENDING):
+        super().__init__(name="midi-output", daemon=True)
+        self.coalesce_window_ns = int(coalesce_window * 1e9)
+        self.max_pending = max_pending
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        # send_message calls that raised
+        self.errors = 0
+        self._pending: Dict[object, _Pending] = {}
+        lock = threading.Lock()
+        self._condition = threading.Condition(lock)
+        # Notified when nothing is queued or being sent, for drain()
+        self._idle = threading.Condition(lock)
+        self._busy = False
+        self._running = True
+
+    def submit(self, destinations: Sequence[Tuple[object, Sequence[int]]],
+               fields: Optional[dict] = None, trace=None, key=None) -> bool:
+        """Queue messages for one or more outputs.
+
+        Args:
+            destinations: Tuple of (MIDI output, encoded message) pairs
+            fields: Structured log fields describing the effect change
+            trace: Press trace told the monotonic send time (ns) after sending
+            key: Coalescing key; a newer submit with the same key replaces a pending one
+
+        Returns:
+            bool: False if the message was dropped because the queue is full.
+        """
+        if key is None:
+            # A CC is keyed by (output, status, controller) so a newer value
+            # replaces a pending one; anything else gets a unique key.
+            midi_out, message = destinations[0]
+            key = (id(midi_out), message[0], message[1]) if message[0] & 0xF0 == 0xB0 else object()
+        with self._condition:
+            pending = self._pending.get(key)
+            if pending is not None:
+                if pending.trace is not None:
+                    # The earlier press still counts, as sent with this message
+                    if pending.replaced is None:
+                        pending.replaced = []
+                    pending.replaced.append(pending.trace)
+                pending.destinations = destinations
+                pending.fields = fields
+                pending.trace = trace
+                self.coalesced += 1
+                return True
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending[key] = _Pending(destinations, fields, trace, time.monotonic_ns())
+            self._condition.notify()
+        return True
+
+    def run(self):
+        while True:
+            with self._condition:
+                self._busy = False
+                if not self._pending:
+                    self._idle.notify_all()
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                while self.coalesce_window_ns and self._running:
+                    oldest = next(iter(self._pending.values())).queued_ns
+                    delay_ns = oldest + self.coalesce_window_ns - time.monotonic_ns()
+                    if delay_ns <= 0:
+                        break
+                    self._condition.wait(delay_ns / 1e9)
+                batch: List[_Pending] = list(self._pending.values())
+                self._pending.clear()
+                self._busy = True
+
+            for pending in batch:
+                for midi_out, message in pending.destinations:
+                    try:
+                        with port_lock(midi_out):
+                            midi_out.send_message(message)
+                    except Exception as e:
+                        # A closed or failing port must not end the thread
+                        self.errors += 1
+                        logger.warning("MIDI send failed: %s", e)
+                send_ns = time.monotonic_ns()
+                self.sent += 1
+                if pending.replaced:
+                    for trace in pending.replaced:
+                        trace.sent(send_ns, None)
+                report_sent(pending.fields, pending.trace, send_ns)
+
+    def drain(self):
+        """Wait until every message submitted so far has been sent."""
+        with self._idle:
+            while self._pending or self._busy:
+                self._idle.wait()
+
+    def stop(self):
+        """Send whatever is still pending, then stop the thread."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self.join()
+
+    def stats(self) -> str:
+        return f"sent {self.sent}, coalesced {self.coalesced}, dropped {self.dropped}, errors {self.errors}"
@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+import logging
+import rtmidi
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Port name used for the virtual port from MIDIConfig.port_name
+DEFAULT_PORT = 'main'
+
+
+@dataclass
+class MIDIPort:
+    # Virtual port name, or a substring of an existing output port's name
+    name: str
+    # True creates a virtual port; False connects to an existing port (e.g. a Katana over USB)
+    virtual: bool = True
+
+
+@dataclass
+class Route:
+    """One destination of an action: a CC on a channel of a named port."""
+    port: str
+    channel: int
+    cc: int
+    on_value: int = 127
+    off_value: int = 0
+
+
+# A destination ready to send: (rtmidi output, encoded message)
+Destination = Tuple[object, Tuple[int, ...]]
+
+
+def open_ports(ports: Dict[str, MIDIPort], port_class=None) -> Dict[str, object]:
+    """Open every configured port; ports that can't be found are skipped.
+
+    Args:
+        ports: Port key -> MIDIPort
+        port_class: ``rtmidi.MidiOut`` (default) or ``rtmidi.MidiIn``
+    """
+    port_class = port_class or rtmidi.MidiOut
+    opened = {}
+    for port_key, port in ports.items():
+        midi_port = port_class()
+        if port.virtual:
+            midi_port.open_virtual_port(port.name)
+            opened[port_key] = midi_port
+            continue
+
+        available = midi_port.get_ports()
+        index = next((i for i, name in enumerate(available) if port.name in name), None)
+        if index is None:
+            logger.warning("MIDI port '%s' not found (available: %s)", port.name, ", ".join(available) or "none")
+            del midi_port
+            continue
+        midi_port.open_port(index)
+        opened[port_key] = midi_port
+    return opened
+
+
+def resolve_routes(commands: Dict[str, Tuple[int, str]], routes: Dict[str, List[Route]],
+                   channel: int) -> Dict[str, List[Route]]:
+    """Routes for every command; commands without explicit routes send
+    their CC on ``channel`` of the default port."""
+    return {
+        key: list(routes.get(key) or [Route(DEFAULT_PORT, channel, cc_number)])
+        for key, (cc_number, _) in commands.items()
+    }
+
+
+def compile_routes(routes: Dict[str, List[Route]],
+                   outputs: Dict[str, object]) -> Dict[str, Tuple[tuple, tuple]]:
+    """Build the (off, on) destination tuples for every command.
+
+    Everything is encoded once here, so a press only walks a prebuilt tuple
+    of (output, message) pairs.
+
+    Args:
+        routes: Resolved routes per command (see ``resolve_routes``)
+        outputs: Open outputs by port key
+    """
+    compiled = {}
+    for key, key_routes in routes.items():
+        destinations: List[Tuple[Destination, Destination]] = []
+        for route in key_routes:
+            midi_out = outputs.get(route.port)
+            if midi_out is None:
+                continue
+            status_byte = 0xB0 | (route.channel - 1)
+            destinations.append((
+                (midi_out, (status_byte, route.cc, route.off_value)),
+                (midi_out, (status_byte, route.cc, route.on_value)),
+            ))
+        compiled[key] = (
+            tuple(off for off, _ in destinations),
+            tuple(on for _, on in destinations),
+        )
+    return compiled
@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from midi.routing import DEFAULT_PORT
+
+
+@dataclass
+class Scene:
+    """Target states for several effects, recalled by one action key."""
+    # Command key -> desired state (True = ON)
+    effects: Dict[str, bool]
+    # Program Change sent before the CCs (0-127)
+    program: Optional[int] = None
+    # Bank select MSB (CC 0) / LSB (CC 32) sent before the Program Change
+    bank: Optional[int] = None
+    bank_lsb: Optional[int] = None
+    # Port and channel for bank select / Program Change (channel defaults to MIDIConfig.channel)
+    port: str = DEFAULT_PORT
+    channel: Optional[int] = None
+
+
+class CompiledScene:
+    """A scene with every message it can send already encoded.
+
+    ``full`` is the whole scene as one buffer; when only some effects
+    differ from the current states ``burst()`` joins the prefix with the
+    prebuilt destinations of just those effects.
+    """
+
+    __slots__ = ('key', 'name', 'prefix', 'changes', 'full', 'fields')
+
+    def __init__(self, key: str, name: str, prefix: tuple, changes: tuple):
+        self.key = key
+        self.name = name
+        # (output, message) pairs for bank select and Program Change
+        self.prefix = prefix
+        # (command key, target state, destinations) per effect
+        self.changes = changes
+        self.full = prefix + tuple(
+            destination for _, _, destinations in changes for destination in destinations
+        )
+        self.fields = {'action': key, 'effect': name, 'state': 'SCENE'}
+
+    def burst(self, states: Dict[str, bool]) -> Tuple[List[Tuple[str, bool]], tuple]:
+        """Return the (key, state) pairs that change and the buffer to send."""
+        changed = [(key, state) for key, state, _ in self.changes if states[key] != state]
+        if len(changed) == len(self.changes):
+            return changed, self.full
+        destinations = self.prefix + tuple(
+            destination
+            for key, state, effect_destinations in self.changes if states[key] != state
+            for destination in effect_destinations
+        )
+        return changed, destinations
+
+
+def compile_scenes(scenes: Dict[str, Scene], commands: Dict[str, Tuple[int, str]],
+                   messages: Dict[str, Tuple[tuple, tuple]], channel: int,
+                   outputs: Dict[str, object]) -> Dict[str, CompiledScene]:
+    """Encode every scene against the compiled command routes.
+
+    Bank select and Program Change are skipped when the scene's port is
+    not open, the same way routes to a missing port are.
+
+    Raises:
+        ValueError: If a scene refers to an unknown command.
+    """
+    compiled = {}
+    for key, scene in scenes.items():
+        unknown = [effect for effect in scene.effects if effect not in messages]
+        if unknown:
+            raise ValueError(f"Scene '{key}' refers to unknown command(s): {', '.join(unknown)}")
+
+        prefix = []
+        midi_out = outputs.get(scene.port)
+        if midi_out is not None:
+            scene_channel = (scene.channel or channel) - 1
+            if scene.bank is not None:
+                prefix.append((midi_out, (0xB0 | scene_channel, 0, scene.bank)))
+            if scene.bank_lsb is not None:
+                prefix.append((midi_out, (0xB0 | scene_channel, 32, scene.bank_lsb)))
+            if scene.program is not None:
+                prefix.append((midi_out, (0xC0 | scene_channel, scene.program)))
+
+        changes = tuple(
+            (effect, bool(state), messages[effect][bool(state)])
+            for effect, state in scene.effects.items()
+        )
+        name = commands[key][1] if key in commands else key
+        compiled[key] = CompiledScene(key, name, tuple(prefix), changes)
+    return compiled
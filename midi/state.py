@@ -0,0 +1,197 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# File layout (fixed size, so the file is mapped once and updated in place):
+#   header     magic, layout version, command count, mapping count, active scene
+#   mappings   MAX_MAPPINGS x (name, version) of the configs the states belong to
+#   commands   MAX_COMMANDS x (command key, state)
+STATE_MAGIC = b'PBST'
+STATE_VERSION = 1
+HEADER = struct.Struct('<4sHHH16s')
+MAPPING = struct.Struct('<16sI')
+RECORD = struct.Struct('<15sB')
+MAX_MAPPINGS = 8
+MAX_COMMANDS = 128
+MAPPINGS_OFFSET = HEADER.size
+RECORDS_OFFSET = MAPPINGS_OFFSET + MAX_MAPPINGS * MAPPING.size
+FILE_SIZE = RECORDS_OFFSET + MAX_COMMANDS * RECORD.size
+# Offset of the active scene key in the header
+SCENE_OFFSET = HEADER.size - 16
+
+# How often changed pages are flushed to disk (seconds)
+FLUSH_INTERVAL = 1.0
+
+
+def _text(raw: bytes) -> str:
+    return raw.rstrip(b'\0').decode(errors='replace')
+
+
+class StateStore(threading.Thread):
+    """Effect states, the active scene and mapping versions in a small file.
+
+    The layout is written once with write-and-rename and then memory
+    mapped, so a state change is a one-byte store into the mapping: it
+    survives a crash of the process immediately (the page cache holds it)
+    and this thread flushes it to disk within ``FLUSH_INTERVAL``. A new
+    command set gets a new file, built by ``prepare`` off the input path
+    and swapped in by ``install``.
+    """
+
+    def __init__(self, filename: str):
+        super().__init__(name="state-store", daemon=True)
+        self.filename = filename
+        # What the file held at startup
+        self.saved_states: Dict[str, bool] = {}
+        self.saved_scene: Optional[str] = None
+        self.saved_versions: Dict[str, int] = {}
+        self._load()
+        # (mapping, command key -> offset of its state byte), swapped as one
+        # so a writer on another thread never pairs an offset with the wrong map
+        self._slots: Tuple[Optional[mmap.mmap], Dict[str, int]] = (None, {})
+        self.dirty = False
+        self._stop_event = threading.Event()
+
+    def _load(self):
+        try:
+            with open(self.filename, 'rb') as state_file:
+                data = state_file.read(FILE_SIZE + 1)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning("Could not read state file %s: %s", self.filename, e)
+            return
+        if len(data) != FILE_SIZE:
+            logger.warning("Ignoring state file %s: unexpected size", self.filename)
+            return
+        magic, version, count, mapping_count, scene = HEADER.unpack_from(data, 0)
+        if magic != STATE_MAGIC or version != STATE_VERSION or count > MAX_COMMANDS or mapping_count > MAX_MAPPINGS:
+            logger.warning("Ignoring state file %s: not a pedalboard state file", self.filename)
+            return
+        for index in range(mapping_count):
+            name, mapping_version = MAPPING.unpack_from(data, MAPPINGS_OFFSET + index * MAPPING.size)
+            self.saved_versions[_text(name)] = mapping_version
+        for index in range(count):
+            key, state = RECORD.unpack_from(data, RECORDS_OFFSET + index * RECORD.size)
+            self.saved_states[_text(key)] = bool(state)
+        self.saved_scene = _text(scene) or None
+
+    def prepare(self, states: Dict[str, bool], scene: Optional[str], versions: Dict[str, int]) -> tuple:
+        """Write and map a complete file for these commands, beside the current one.
+
+        This does the file I/O (write, fsync, open, mmap); ``install`` only
+        renames it into place.
+        """
+        keys = [key for key in states if len(key.encode()) <= RECORD.size - 1]
+        if len(keys) < len(states):
+            logger.warning("Command keys longer than %d bytes are not persisted", RECORD.size - 1)
+        keys = keys[:MAX_COMMANDS]
+        mappings = list(versions.items())[:MAX_MAPPINGS]
+
+        data = bytearray(FILE_SIZE)
+        HEADER.pack_into(data, 0, STATE_MAGIC, STATE_VERSION, len(keys), len(mappings),
+                         (scene or '').encode()[:16])
+        for index, (name, version) in enumerate(mappings):
+            MAPPING.pack_into(data, MAPPINGS_OFFSET + index * MAPPING.size, name.encode()[:16], version)
+        offsets = {}
+        for index, key in enumerate(keys):
+            offset = RECORDS_OFFSET + index * RECORD.size
+            RECORD.pack_into(data, offset, key.encode(), states[key])
+            offsets[key] = offset + RECORD.size - 1
+
+        temp = f"{self.filename}.tmp"
+        with open(temp, 'wb') as state_file:
+            state_file.write(data)
+            state_file.flush()
+            os.fsync(state_file.fileno())
+        with open(temp, 'r+b') as state_file:
+            return temp, mmap.mmap(state_file.fileno(), FILE_SIZE), offsets
+
+    def install(self, prepared: tuple, states: Dict[str, bool], scene: Optional[str]):
+        """Swap in a file from ``prepare`` and close the previous one.
+
+        Called between two events on the thread that dispatches; states
+        changed since ``prepare`` are copied into the new mapping.
+        """
+        temp, mapped, offsets = prepared
+        os.replace(temp, self.filename)
+        old_map = self._slots[0]
+        self._slots = (mapped, offsets)
+        for key, offset in offsets.items():
+            mapped[offset] = states.get(key, False)
+        self.set_scene(scene)
+        if old_map is not None:
+            old_map.close()
+
+    def discard(self, prepared: tuple):
+        """Drop a file from ``prepare`` that will not be installed."""
+        temp, mapped, _ = prepared
+        mapped.close()
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+
+    def layout(self, states: Dict[str, bool], scene: Optional[str], versions: Dict[str, int]):
+        """Write a complete file for these commands (atomically) and map it."""
+        self.install(self.prepare(states, scene, versions), states, scene)
+
+    def set_versions(self, versions: Dict[str, int]):
+        """Record reloaded mapping versions without a new layout."""
+        mapped = self._slots[0]
+        if mapped is None:
+            return
+        for index, (name, version) in enumerate(list(versions.items())[:MAX_MAPPINGS]):
+            MAPPING.pack_into(mapped, MAPPINGS_OFFSET + index * MAPPING.size, name.encode()[:16], version)
+        self.dirty = True
+
+    def set_state(self, key: str, state: bool):
+        """Record one effect state (called on the dispatch path)."""
+        mapped, offsets = self._slots
+        offset = offsets.get(key)
+        if offset is not None:
+            try:
+                mapped[offset] = state
+            except ValueError:
+                # install() closed this mapping after we read the slots
+                self.set_state(key, state)
+                return
+            self.dirty = True
+
+    def set_scene(self, key: Optional[str]):
+        mapped = self._slots[0]
+        if mapped is not None:
+            mapped[SCENE_OFFSET:SCENE_OFFSET + 16] = (key or '').encode()[:16].ljust(16, b'\0')
+            self.dirty = True
+
+    def flush(self):
+        mapped = self._slots[0]
+        if self.dirty and mapped is not None:
+            self.dirty = False
+            try:
+                mapped.flush()
+            except ValueError:
+                # Replaced by install(); flush the new mapping next time
+                self.dirty = True
+
+    def run(self):
+        while not self._stop_event.wait(FLUSH_INTERVAL):
+            self.flush()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.flush()
+        mapped, self._slots = self._slots[0], (None, {})
+        if mapped is not None:
+            mapped.close()
+
+    def restore(self, keys) -> Tuple[Dict[str, bool], Optional[str]]:
+        """Saved states of the given command keys, and the saved scene."""
+        return {key: self.saved_states[key] for key in keys if key in self.saved_states}, self.saved_scene
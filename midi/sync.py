@@ -0,0 +1,125 @@
+import logging
+import time
+import rtmidi
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from midi.routing import MIDIPort, open_ports
+
+logger = logging.getLogger(__name__)
+
+# A remote change this soon after our own change of the same effect is a
+# conflict: our message is probably still in flight, so local state wins (ns)
+CONFLICT_WINDOW_NS = 100_000_000
+
+# Turns a received SysEx message into {command key: state}
+SysExDecoder = Callable[[Sequence[int]], Dict[str, bool]]
+
+
+class MIDIStateSync:
+    """Follows effect changes made elsewhere (BIAS FX, the amp's own knobs).
+
+    Opens a MIDI input next to every output port and updates the
+    controller's ``states`` from the rtmidi callback thread as messages
+    arrive: Control Changes that match a route, Program Changes that match
+    a scene, and SysEx through an optional decoder. Each update is a single
+    dict item store, so the dispatcher never takes a lock and its next
+    toggle is computed against the device's actual state.
+
+    A remote value that disagrees with local state counts as a resync and
+    replaces it, unless the effect was changed locally within
+    ``conflict_window_ns``; then it counts as a conflict and is ignored.
+    """
+
+    def __init__(self, controller, ports: Dict[str, MIDIPort],
+                 sysex_decoder: Optional[SysExDecoder] = None,
+                 conflict_window_ns: int = CONFLICT_WINDOW_NS):
+        self.controller = controller
+        self.sysex_decoder = sysex_decoder
+        self.conflict_window_ns = conflict_window_ns
+        self.received = 0
+        self.resyncs = 0
+        self.conflicts = 0
+        self.build_tables()
+
+        self.inputs = open_ports(ports, rtmidi.MidiIn)
+        for port_key, midi_in in self.inputs.items():
+            midi_in.ignore_types(sysex=sysex_decoder is None, timing=True, active_sense=True)
+            midi_in.set_callback(self._on_message, port_key)
+
+    def build_tables(self):
+        """(Re)build the lookup tables from the controller's routes and scenes.
+
+        Each table is built aside and assigned in one step, so the callback
+        thread sees either the old table or the new one.
+        """
+        controller = self.controller
+        # (port, status, cc) -> [(command key, on value, off value), ...]
+        cc_table: Dict[Tuple[str, int, int], List[Tuple[str, int, int]]] = {}
+        for key, routes in controller.routes.items():
+            for route in routes:
+                cc_table.setdefault((route.port, 0xB0 | (route.channel - 1), route.cc), []).append(
+                    (key, route.on_value, route.off_value))
+
+        # (port, status, program) -> [{command key: state}, ...]
+        program_table: Dict[Tuple[str, int, int], List[Dict[str, bool]]] = {}
+        for key, scene in controller.config.scenes.items():
+            if scene.program is not None:
+                status = 0xC0 | ((scene.channel or controller.config.channel) - 1)
+                program_table.setdefault((scene.port, status, scene.program), []).append(
+                    {effect: bool(state) for effect, state in scene.effects.items()})
+        self.cc_table = cc_table
+        self.program_table = program_table
+
+    def _on_message(self, event, port_key: str):
+        message = event[0]
+        if not message:
+            return
+        self.received += 1
+        status = message[0]
+        kind = status & 0xF0
+        if kind == 0xB0 and len(message) >= 3:
+            for key, on_value, off_value in self.cc_table.get((port_key, status, message[1]), ()):
+                value = message[2]
+                if value == on_value or value == off_value:
+                    state = value == on_value
+                else:
+                    state = (value >= (on_value + off_value) / 2) == (on_value > off_value)
+                self._apply(key, state, port_key)
+        elif kind == 0xC0 and len(message) >= 2:
+            for effects in self.program_table.get((port_key, status, message[1]), ()):
+                for key, state in effects.items():
+                    self._apply(key, state, port_key)
+        elif status == 0xF0 and self.sysex_decoder:
+            try:
+                changes = self.sysex_decoder(message)
+            except Exception as e:
+                logger.warning("SysEx decoder failed: %s", e)
+                return
+            for key, state in (changes or {}).items():
+                if key in self.controller.states:
+                    self._apply(key, bool(state), port_key)
+
+    def _apply(self, key: str, state: bool, port_key: str):
+        controller = self.controller
+        current = controller.states.get(key)
+        # None: the key went away in a reload while this message was in flight
+        if current is None or current == state:
+            return
+        if time.monotonic_ns() - controller.changed_ns.get(key, 0) < self.conflict_window_ns:
+            self.conflicts += 1
+            return
+        controller.states[key] = state
+        if controller.store:
+            controller.store.set_state(key, state)
+        self.resyncs += 1
+        effect = controller.config.commands[key][1]
+        logger.info("%s: %s (changed on %s)", effect, "ON" if state else "OFF", port_key,
+                    extra={'action': key, 'effect': effect, 'state': "ON" if state else "OFF"})
+
+    def close(self):
+        for midi_in in self.inputs.values():
+            midi_in.cancel_callback()
+            midi_in.close_port()
+        self.inputs.clear()
+
+    def stats(self) -> str:
+        return f"received {self.received}, resyncs {self.resyncs}, conflicts {self.conflicts}"
@@ -0,0 +1,207 @@
+from collections import deque
+from dataclasses import dataclass
+import logging
+import statistics
+import threading
+import time
+from typing import List, Optional, Tuple
+from midi.output import port_lock
+from midi.routing import DEFAULT_PORT
+from runtime.latency import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# MIDI real-time messages
+CLOCK = (0xF8,)
+START = (0xFA,)
+STOP = (0xFC,)
+# MIDI Clock pulses per quarter note
+PPQN = 24
+
+# The clock thread sleeps until this long before a tick, then spins (ns);
+# covers the wake-up latency of Event.wait. The spin holds the GIL, so
+# other threads wait at most this long per tick.
+SPIN_NS = 500_000
+
+
+@dataclass
+class TempoConfig:
+    # Action key that taps the tempo (does not need to be in `commands`)
+    tap_key: str
+    # Action key that sends Start / Stop in turn (optional)
+    transport_key: Optional[str] = None
+    # Tempo the clock runs at before the first taps (None = silent until tapped)
+    bpm: Optional[float] = None
+    # Ports the clock goes to
+    ports: Tuple[str, ...] = (DEFAULT_PORT,)
+    # Intervals averaged for the tempo
+    taps: int = 4
+    # An interval further than this fraction from the median of the recent
+    # ones is an outlier
+    tolerance: float = 0.2
+    min_bpm: float = 30.0
+    max_bpm: float = 300.0
+    # Send Start along with the first tapped tempo
+    start_on_tap: bool = False
+
+
+class TapTempo:
+    """Tempo from the intervals between taps.
+
+    The tempo is the mean of the last ``taps`` intervals. A single interval
+    further than ``tolerance`` from their median (a missed or doubled tap)
+    is ignored; a second one agreeing with it starts a new series, since
+    the player changed tempo. A pause longer than a ``min_bpm`` beat
+    starts over.
+    """
+
+    def __init__(self, taps: int = 4, tolerance: float = 0.2,
+                 min_bpm: float = 30.0, max_bpm: float = 300.0):
+        self.tolerance = tolerance
+        self.max_interval_ns = int(60e9 / min_bpm)
+        self.min_interval_ns = int(60e9 / max_bpm)
+        self.intervals = deque(maxlen=max(taps, 1))
+        self.last_tap_ns = 0
+        self.rejected = 0
+        # Previous rejected interval, for detecting a tempo change
+        self._outlier_ns = 0
+
+    def _agrees(self, interval: int, reference: float) -> bool:
+        return abs(interval - reference) <= self.tolerance * reference
+
+    def tap(self, now_ns: int) -> Optional[float]:
+        """Record a tap; returns the new tempo (BPM) or None if it is unchanged."""
+        last = self.last_tap_ns
+        if last and now_ns - last < self.min_interval_ns:
+            # Faster than max_bpm: a double hit, not a tap
+            self.rejected += 1
+            return None
+        self.last_tap_ns = now_ns
+        if not last:
+            return None
+        interval = now_ns - last
+        if interval > self.max_interval_ns:
+            self.intervals.clear()
+            self._outlier_ns = 0
+            return None
+        if self.intervals and not self._agrees(interval, statistics.median(self.intervals)):
+            if not (self._outlier_ns and self._agrees(interval, self._outlier_ns)):
+                self._outlier_ns = interval
+                self.rejected += 1
+                return None
+            self.intervals.clear()
+            self.intervals.append(self._outlier_ns)
+        self._outlier_ns = 0
+        self.intervals.append(interval)
+        return 60e9 * len(self.intervals) / sum(self.intervals)
+
+
+class MIDIClock(threading.Thread):
+    """Sends MIDI Clock at 24 PPQN from a dedicated thread.
+
+    Tick ``n`` is due at ``anchor + n * period``, computed from the anchor
+    every time instead of adding up sleeps, so late wake-ups never
+    accumulate into drift. The thread sleeps until just before a deadline
+    and spins for the rest (``SPIN_NS``). A tick missed by more than a
+    whole period is skipped rather than sent in a burst.
+
+    Clock bytes go straight to the outputs, next to the controller's own
+    sends: real-time messages may sit between any two MIDI messages and
+    each ``send_message`` call is a complete message. Sends to one output
+    are serialized with ``port_lock``; the output thread holds it for a
+    single message at a time.
+    """
+
+    def __init__(self, outputs: List[object], spin_ns: int = SPIN_NS):
+        super().__init__(name="midi-clock", daemon=True)
+        self.outputs = outputs
+        self.spin_ns = spin_ns
+        # (tick period ns, anchor ns), replaced as a whole on a tempo change
+        self._schedule: Optional[Tuple[int, int]] = None
+        self.bpm: Optional[float] = None
+        self.playing = False
+        # START / STOP waiting to go out right before the next tick
+        self._transport: Optional[Tuple[int]] = None
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self.ticks = 0
+        self.skipped = 0
+        # |send time - deadline| per tick
+        self.jitter = LatencyHistogram()
+
+    def set_tempo(self, bpm: float, anchor_ns: Optional[int] = None):
+        """Run at ``bpm`` with a beat on ``anchor_ns`` (e.g. the last tap)."""
+        self.bpm = bpm
+        self._schedule = (int(60e9 / (bpm * PPQN)), anchor_ns or time.monotonic_ns())
+        self._wake.set()
+
+    def play(self):
+        self.playing = True
+        self._transport = START
+        self._wake.set()
+
+    def halt(self):
+        self.playing = False
+        self._transport = STOP
+        self._wake.set()
+
+    def _send(self, message):
+        for midi_out in self.outputs:
+            with port_lock(midi_out):
+                midi_out.send_message(message)
+
+    def _sleep_until(self, deadline_ns: int) -> bool:
+        """Wait for the deadline; False if woken early by a change."""
+        while True:
+            remaining = deadline_ns - time.monotonic_ns()
+            if remaining <= 0:
+                return True
+            if remaining > self.spin_ns:
+                if self._wake.wait((remaining - self.spin_ns) / 1e9):
+                    self._wake.clear()
+                    return False
+
+    def run(self):
+        schedule = None
+        index = 0
+        while not self._stop_event.is_set():
+            if self._schedule is not schedule:
+                schedule = self._schedule
+                if schedule:
+                    period_ns, anchor_ns = schedule
+                    index = max(-(-(time.monotonic_ns() - anchor_ns) // period_ns), 0)
+            if schedule is None:
+                # No tempo yet: only transport messages, sent right away
+                self._wake.wait()
+                self._wake.clear()
+                transport, self._transport = self._transport, None
+                if transport:
+                    self._send(transport)
+                continue
+
+            deadline_ns = anchor_ns + index * period_ns
+            if not self._sleep_until(deadline_ns):
+                continue
+            transport, self._transport = self._transport, None
+            if transport:
+                self._send(transport)
+            self._send(CLOCK)
+            now_ns = time.monotonic_ns()
+            self.ticks += 1
+            self.jitter.record(now_ns - deadline_ns)
+            index += 1
+            behind = now_ns - (anchor_ns + index * period_ns)
+            if behind > period_ns:
+                missed = behind // period_ns
+                self.skipped += missed
+                index += missed
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        if self.is_alive():
+            self.join()
+
+    def stats(self) -> str:
+        bpm = f"{self.bpm:.1f} BPM" if self.bpm else "no tempo"
+        return f"{bpm}, {self.ticks} ticks, {self.skipped} skipped, jitter {self.jitter.summary()}"
@@ -0,0 +1,56 @@
+import json
+import logging
+import os
+import time
+from devices import hidbackend
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceInventory:
+    """Snapshot of the HID bus from a single enumeration pass.
+
+    Every device type is looked up in the same snapshot, so one scan costs
+    one enumeration no matter how many kinds of device are configured.
+    """
+
+    def __init__(self):
+        self.devices: List[dict] = []
+        # Duration of the last enumeration (seconds)
+        self.scan_time = 0.0
+
+    def refresh(self) -> List[dict]:
+        start = time.perf_counter()
+        self.devices = hidbackend.enumerate()
+        self.scan_time = time.perf_counter() - start
+        return self.devices
+
+    def find(self, vendor_id: int, product_id: int) -> List[dict]:
+        return [
+            device_info for device_info in self.devices
+            if device_info['vendor_id'] == vendor_id and device_info['product_id'] == product_id
+        ]
+
+
+def load_device_cache(filename: str) -> List[Dict[str, str]]:
+    """Known devices from a previous run: [{'type', 'path', 'serial'}, ...]."""
+    try:
+        with open(filename, encoding='utf-8') as cache_file:
+            entries = json.load(cache_file)
+    except (OSError, ValueError):
+        return []
+    return [entry for entry in entries if {'type', 'path', 'serial'} <= set(entry)]
+
+
+def save_device_cache(filename: str, entries: List[Dict[str, str]]):
+    """Write the cache atomically so a crash never leaves a torn file."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(directory, exist_ok=True)
+    temp_name = f"{filename}.tmp"
+    try:
+        with open(temp_name, 'w', encoding='utf-8') as cache_file:
+            json.dump(entries, cache_file, indent=2)
+        os.replace(temp_name, filename)
+    except OSError as e:
+        logger.warning("Could not write device cache %s: %s", filename, e)
@@ -0,0 +1,243 @@
+from dataclasses import dataclass, field, replace
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from devices.patterns import RELEASE
+
+logger = logging.getLogger(__name__)
+
+# Timer wheel resolution and size: 512 slots of 5 ms cover 2.56 s per turn
+WHEEL_TICK_MS = 5
+WHEEL_SLOTS = 512
+
+
+class Timer:
+    __slots__ = ('deadline_tick', 'callback', 'slot')
+
+    def __init__(self, deadline_tick: int, callback: Callable[[], None], slot: Set['Timer']):
+        self.deadline_tick = deadline_tick
+        self.callback = callback
+        self.slot = slot
+
+
+class TimerWheel:
+    """Hashed timer wheel: scheduling and cancelling are O(1).
+
+    A timer goes into the slot its deadline tick hashes to; ``advance()``
+    visits each elapsed tick's slot once and fires the timers that are due,
+    leaving those that belong to a later turn of the wheel.
+    """
+
+    def __init__(self, tick_ms: float = WHEEL_TICK_MS, slots: int = WHEEL_SLOTS):
+        self.tick_ns = int(tick_ms * 1e6)
+        self.slots: List[Set[Timer]] = [set() for _ in range(slots)]
+        self.current_tick = time.monotonic_ns() // self.tick_ns
+        self.pending = 0
+
+    def schedule(self, deadline_ns: int, callback: Callable[[], None]) -> Timer:
+        # Never schedule into a tick the wheel has already visited
+        tick = max(-(-deadline_ns // self.tick_ns), self.current_tick + 1)
+        slot = self.slots[tick % len(self.slots)]
+        timer = Timer(tick, callback, slot)
+        slot.add(timer)
+        self.pending += 1
+        return timer
+
+    def cancel(self, timer: Optional[Timer]):
+        if timer is not None and timer in timer.slot:
+            timer.slot.discard(timer)
+            self.pending -= 1
+
+    def advance(self, now_ns: int):
+        """Fire every timer whose deadline is at or before ``now_ns``."""
+        target = now_ns // self.tick_ns
+        if not self.pending:
+            self.current_tick = max(self.current_tick, target)
+            return
+        while self.current_tick < target:
+            self.current_tick += 1
+            slot = self.slots[self.current_tick % len(self.slots)]
+            if not slot:
+                continue
+            due = [timer for timer in slot if timer.deadline_tick <= self.current_tick]
+            for timer in due:
+                slot.discard(timer)
+                self.pending -= 1
+                timer.callback()
+            if not self.pending:
+                self.current_tick = target
+
+
+@dataclass
+class Gesture:
+    """What else a command key does besides a plain press (all optional)."""
+    # Action sent instead of the press when the button is held
+    long_press: Optional[str] = None
+    # Action sent instead of two presses in quick succession
+    double_tap: Optional[str] = None
+    # Action sent when the button is let go
+    release: Optional[str] = None
+
+
+@dataclass
+class GestureConfig:
+    gestures: Dict[str, Gesture] = field(default_factory=dict)
+    # (key, key) pressed together on two pedals -> action
+    chords: Dict[Tuple[str, str], str] = field(default_factory=dict)
+    long_press_ms: float = 500
+    double_tap_ms: float = 300
+    chord_ms: float = 50
+
+
+class _Press:
+    __slots__ = ('event', 'gesture', 'timer', 'consumed')
+
+    def __init__(self, event, gesture: Optional[Gesture]):
+        self.event = event
+        self.gesture = gesture
+        # Long-press timer while it is pending
+        self.timer: Optional[Timer] = None
+        # Set once a chord took the press over (no release action)
+        self.consumed = False
+
+
+class GestureEngine:
+    """Turns press/release edges from each device into actions.
+
+    Fed with ``ActionEvent``s whose action is a command key (a press) or
+    ``RELEASE``; state is kept per device, so every pedal has its own taps
+    and holds. A press is sent immediately unless it is ambiguous: a key
+    with a long-press waits for the release or the hold time, one with a
+    double-tap waits out the tap window, and one that is part of a chord
+    waits ``chord_ms`` for the other pedal. Keys without gestures are sent
+    as before and their releases are ignored. Windows are timed from each
+    event's ``read_ns``, so a replay on the recorded clock resolves the
+    same gestures as the live session did.
+
+    Not thread safe: feed() and advance() must be called from one thread.
+    """
+
+    def __init__(self, config: GestureConfig, emit: Callable, wheel: Optional[TimerWheel] = None):
+        self.emit = emit
+        self.wheel = wheel or TimerWheel()
+        self.reconfigure(config)
+
+        # Per device (event.source): the held press, a press waiting for its
+        # chord partner, and taps waiting for a second tap per key
+        self.held: Dict[str, _Press] = {}
+        self.chord_wait: Dict[str, Tuple[object, Timer]] = {}
+        self.taps: Dict[Tuple[str, str], Tuple[object, Timer]] = {}
+
+    def reconfigure(self, config: GestureConfig):
+        """Use new gestures and timings; presses already waiting keep theirs."""
+        self.long_press_ns = int(config.long_press_ms * 1e6)
+        self.double_tap_ns = int(config.double_tap_ms * 1e6)
+        self.chord_ns = int(config.chord_ms * 1e6)
+        # key -> [(partner key, chord action), ...]
+        partners: Dict[str, List[Tuple[str, str]]] = {}
+        for (first, second), action in config.chords.items():
+            partners.setdefault(first, []).append((second, action))
+            partners.setdefault(second, []).append((first, action))
+        self.partners = partners
+        self.config = config
+
+    @property
+    def pending(self) -> int:
+        return self.wheel.pending
+
+    def feed(self, event):
+        source = event.source
+        now_ns = event.read_ns
+        if event.action == RELEASE:
+            self._release(source, now_ns)
+            return
+        if source in self.held or source in self.chord_wait:
+            # The device never reported the previous release
+            self._release(source, now_ns)
+        if event.action in self.partners:
+            self._chord_press(event, source)
+        else:
+            self._press(event, source, now_ns)
+
+    def advance(self, now_ns: Optional[int] = None):
+        self.wheel.advance(time.monotonic_ns() if now_ns is None else now_ns)
+
+    def _send(self, event, action: Optional[str]):
+        if action:
+            self.emit(event if action == event.action else replace(event, action=action))
+
+    def _chord_press(self, event, source: str):
+        for partner, action in self.partners[event.action]:
+            for other_source, (other, timer) in self.chord_wait.items():
+                if other_source != source and other.action == partner:
+                    self.wheel.cancel(timer)
+                    del self.chord_wait[other_source]
+                    self._hold(other, other_source, None).consumed = True
+                    self._hold(event, source, None).consumed = True
+                    self._send(event, action)
+                    return
+
+        deadline = event.read_ns + self.chord_ns
+
+        def expire():
+            del self.chord_wait[source]
+            self._press(event, source, deadline)
+
+        self.chord_wait[source] = (event, self.wheel.schedule(deadline, expire))
+
+    def _hold(self, event, source: str, gesture: Optional[Gesture]) -> _Press:
+        press = self.held[source] = _Press(event, gesture)
+        return press
+
+    def _press(self, event, source: str, now_ns: int):
+        gesture = self.config.gestures.get(event.action)
+        press = self._hold(event, source, gesture)
+        if gesture is None:
+            self._send(event, event.action)
+        elif gesture.long_press:
+            def long_press():
+                press.timer = None
+                self._send(event, gesture.long_press)
+
+            press.timer = self.wheel.schedule(now_ns + self.long_press_ns, long_press)
+        else:
+            self._tap(event, source, gesture, now_ns)
+
+    def _tap(self, event, source: str, gesture: Gesture, now_ns: int):
+        if not gesture.double_tap:
+            self._send(event, event.action)
+            return
+
+        key = (source, event.action)
+        waiting = self.taps.pop(key, None)
+        if waiting is not None:
+            self.wheel.cancel(waiting[1])
+            self._send(event, gesture.double_tap)
+            return
+
+        def single_tap():
+            del self.taps[key]
+            self._send(event, event.action)
+
+        deadline = now_ns + self.double_tap_ns
+        self.taps[key] = (event, self.wheel.schedule(deadline, single_tap))
+
+    def _release(self, source: str, now_ns: int):
+        waiting = self.chord_wait.pop(source, None)
+        if waiting is not None:
+            # Let go before a partner arrived: resolve as a normal press first
+            self.wheel.cancel(waiting[1])
+            self._press(waiting[0], source, waiting[0].read_ns)
+
+        press = self.held.pop(source, None)
+        if press is None:
+            return
+        gesture = press.gesture
+        if gesture is None:
+            return
+        if press.timer is not None:
+            # Released before the long-press time: it was a tap
+            self.wheel.cancel(press.timer)
+            self._tap(press.event, source, gesture, now_ns)
+        if gesture.release and not press.consumed:
+            self._send(press.event, gesture.release)
@@ -0,0 +1,132 @@
+from bisect import bisect_left
+import logging
+import threading
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in ns: 1 µs up to ~30 s, each ~9% wider
+# than the previous one, so percentiles are accurate to a few percent.
+BUCKET_BOUNDS = [int(1000 * 1.09 ** i) for i in range(200)]
+
+# Stages measured for every dispatched press, as (name, start, end) where
+# start/end index into the (read, match, dispatch, send) timestamps.
+STAGES = (
+    ('match', 0, 1),      # HID read returned -> pattern matched
+    ('queue', 1, 2),      # pattern matched -> picked up for dispatch
+    ('send', 2, 3),       # dispatch -> midi_out.send_message returned
+    ('total', 0, 3),      # HID read returned -> MIDI message sent
+)
+
+# How often the periodic summary line is printed (seconds, 0 = never)
+REPORT_INTERVAL = 60
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; recording never allocates."""
+
+    __slots__ = ('counts', 'count', 'max_ns')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.max_ns = 0
+
+    def record(self, ns: int):
+        self.counts[bisect_left(BUCKET_BOUNDS, ns)] += 1
+        self.count += 1
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, p: float) -> int:
+        """Upper bound (ns) of the bucket holding the p-th percentile."""
+        if not self.count:
+            return 0
+        target = self.count * p / 100
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                if index >= len(BUCKET_BOUNDS):
+                    return self.max_ns
+                return min(BUCKET_BOUNDS[index], self.max_ns)
+        return self.max_ns
+
+    def summary(self) -> str:
+        return (f"n={self.count} p50={_ms(self.percentile(50))} "
+                f"p95={_ms(self.percentile(95))} p99={_ms(self.percentile(99))} "
+                f"max={_ms(self.max_ns)}")
+
+
+def _ms(ns: int) -> str:
+    return f"{ns / 1e6:.3f}ms"
+
+
+class LatencyTracker:
+    """Press-to-MIDI latency per stage, per device and per action.
+
+    Timestamps come from ``time.monotonic_ns`` at four points: HID read
+    return, pattern match, dispatch and ``midi_out.send_message`` return.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, LatencyHistogram] = {name: LatencyHistogram() for name, _, _ in STAGES}
+        self.devices: Dict[str, LatencyHistogram] = {}
+        self.actions: Dict[str, LatencyHistogram] = {}
+
+    def record(self, source: str, action: str, read_ns: int, match_ns: int,
+               dispatch_ns: int, send_ns: int):
+        stamps = (read_ns, match_ns, dispatch_ns, send_ns)
+        for name, start, end in STAGES:
+            self.stages[name].record(stamps[end] - stamps[start])
+
+        total = send_ns - read_ns
+        histogram = self.devices.get(source)
+        if histogram is None:
+            histogram = self.devices[source] = LatencyHistogram()
+        histogram.record(total)
+        histogram = self.actions.get(action)
+        if histogram is None:
+            histogram = self.actions[action] = LatencyHistogram()
+        histogram.record(total)
+
+    def summary_line(self) -> str:
+        return f"Latency (press -> MIDI): {self.stages['total'].summary()}"
+
+    def report(self) -> List[str]:
+        """Full breakdown, one line per stage, device and action."""
+        lines: List[Tuple[str, LatencyHistogram]] = []
+        lines += [(f"stage {name}", histogram) for name, histogram in self.stages.items()]
+        lines += [(f"device {source}", histogram) for source, histogram in sorted(self.devices.items())]
+        lines += [(f"action {action}", histogram) for action, histogram in sorted(self.actions.items())]
+        width = max(len(label) for label, _ in lines)
+        return [f"{label:<{width}}  {histogram.summary()}" for label, histogram in lines]
+
+    def print_report(self):
+        if not self.stages['total'].count:
+            return
+        print("\n=== Press-to-MIDI latency ===")
+        for line in self.report():
+            print(line)
+
+
+class LatencyReporter(threading.Thread):
+    """Prints a one-line latency summary every ``interval`` seconds
+    whenever new presses were measured."""
+
+    def __init__(self, tracker: LatencyTracker, interval: float = REPORT_INTERVAL):
+        super().__init__(name="latency-reporter", daemon=True)
+        self.tracker = tracker
+        self.interval = interval
+        self._last_count = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            count = self.tracker.stages['total'].count
+            if count != self._last_count:
+                self._last_count = count
+                logger.info(self.tracker.summary_line())
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,114 @@
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Structured fields that may be attached to a record with ``extra=``
+FIELDS = ('device', 'path', 'action', 'effect', 'state', 'cc', 'value', 'latency_ms')
+
+# Repeated warnings: at most RATE_LIMIT_BURST per RATE_LIMIT_INTERVAL seconds
+# for the same logger and message template
+RATE_LIMIT_INTERVAL = 10.0
+RATE_LIMIT_BURST = 3
+
+CONSOLE_FORMAT = "[%(asctime)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class RateLimitFilter(logging.Filter):
+    """Drops repeats of the same warning beyond a small burst per interval.
+
+    Runs in the thread that logs, before the record is queued, so a device
+    failing on every read cannot flood the queue. The next record that gets through
+    mentions how many were suppressed.
+    """
+
+    def __init__(self, interval: float = RATE_LIMIT_INTERVAL, burst: int = RATE_LIMIT_BURST):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        # (logger, template) -> [window start, count in window, suppressed]
+        self._windows: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class ConsoleFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(CONSOLE_FORMAT, DATE_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            message += f" ({record.suppressed} similar message(s) suppressed)"
+        return message
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """One JSON object per record with the structured fields as keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in FIELDS + ('suppressed',):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value.decode(errors='replace') if isinstance(value, bytes) else value
+        return json.dumps(entry)
+
+
+def setup_logging(json_path: Optional[str] = None,
+                  level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """Route all logging through a queue drained by a listener thread.
+
+    Callers only pay for building the record; console and file output
+    happen on the listener's thread.
+
+    Returns:
+        QueueListener: Already started; stop() it on shutdown to flush.
+    """
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(RateLimitFilter())
+
+    console = logging.StreamHandler()
+    console.setFormatter(ConsoleFormatter())
+    sinks = [console]
+    if json_path:
+        json_sink = logging.FileHandler(json_path, encoding='utf-8')
+        json_sink.setFormatter(JSONLinesFormatter())
+        sinks.append(json_sink)
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(records, *sinks, respect_handler_level=True)
+    listener.start()
+    return listener
+
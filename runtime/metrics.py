@@ -0,0 +1,193 @@
+"""In-process metrics, a Prometheus text endpoint and a health check.
+
+Counting on the input path is a single integer increment: handlers,
+``InputState``, the MIDI output stage and the device monitor keep plain
+int counters, each written by one thread only. The registry reads them
+through collectors when the endpoint is scraped, so nothing is formatted
+or locked until someone asks.
+"""
+import http.server
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = '127.0.0.1'
+# A connected device without a report for this long is flagged (seconds)
+STALE_AFTER = 300.0
+# The input loop is falling behind when its last tick is older than this (seconds)
+LOOP_STALL = 1.0
+# Extra time a loop tick may take over its expected period before it
+# counts as an overrun (seconds)
+OVERRUN_SLACK = 0.01
+
+# (name, type, help, labels, value) as yielded by collectors
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+class LoopStats:
+    """Tick timing of the input loop.
+
+    The loop calls ``tick`` once per pass; a pass that started more than
+    ``period + OVERRUN_SLACK`` after the previous one is an overrun.
+    """
+
+    __slots__ = ('period_ns', 'ticks', 'overruns', 'last_tick_ns', 'max_period_ns')
+
+    def __init__(self):
+        self.period_ns = 0
+        self.ticks = 0
+        self.overruns = 0
+        # Monotonic ns of the last tick, 0 while no loop runs
+        self.last_tick_ns = 0
+        self.max_period_ns = 0
+
+    def start(self, period: float):
+        """A loop expecting a tick every ``period`` seconds takes over."""
+        self.period_ns = int((period + OVERRUN_SLACK) * 1e9)
+        self.last_tick_ns = 0
+
+    def tick(self, now_ns: int):
+        last = self.last_tick_ns
+        self.last_tick_ns = now_ns
+        self.ticks += 1
+        if last:
+            elapsed = now_ns - last
+            if elapsed > self.period_ns:
+                self.overruns += 1
+            if elapsed > self.max_period_ns:
+                self.max_period_ns = elapsed
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """Collectors sampled at scrape time."""
+
+    def __init__(self):
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def collector(self, collect: Callable[[], Iterable[Sample]]):
+        """Add a callable yielding samples whenever the registry is read."""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            collectors = list(self._collectors)
+        samples = []
+        for collect in collectors:
+            try:
+                samples.extend(collect())
+            except Exception as e:
+                # A collector racing a device going away must not break the scrape
+                logger.warning("Metrics collector failed: %s", e)
+        return samples
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        families: Dict[str, Tuple[str, str, list]] = {}
+        for name, kind, help, labels, value in self.samples():
+            family = families.get(name)
+            if family is None:
+                family = families[name] = (kind, help, [])
+            family[2].append((labels, value))
+        lines = []
+        for name, (kind, help, values) in families.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in values:
+                if labels:
+                    label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                    lines.append(f"{name}{{{label_text}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class HealthCheck:
+    """Flags silent devices and an input loop that stopped ticking.
+
+    ``devices`` returns (label, monotonic ns of the last report or of the
+    attach) for every connected device.
+    """
+
+    def __init__(self, devices: Callable[[], Iterable[Tuple[str, int]]], loop: LoopStats,
+                 stale_after: float = STALE_AFTER, loop_stall: float = LOOP_STALL):
+        self.devices = devices
+        self.loop = loop
+        self.stale_after_ns = int(stale_after * 1e9)
+        self.loop_stall_ns = int(loop_stall * 1e9)
+
+    def problems(self, now_ns: Optional[int] = None) -> List[str]:
+        now_ns = now_ns or time.monotonic_ns()
+        problems = []
+        if self.stale_after_ns:
+            for label, last_ns in self.devices():
+                if now_ns - last_ns > self.stale_after_ns:
+                    problems.append(f"{label}: no reports for {(now_ns - last_ns) / 1e9:.0f} s")
+        last_tick = self.loop.last_tick_ns
+        if last_tick and now_ns - last_tick > self.loop_stall_ns:
+            problems.append(f"input loop: no tick for {(now_ns - last_tick) / 1e9:.1f} s")
+        return problems
+
+    def collect(self) -> Iterable[Sample]:
+        yield ('pedalboard_healthy', 'gauge', "1 if the health check passes",
+               {}, 0 if self.problems() else 1)
+
+
+class MetricsServer(threading.Thread):
+    """Serves ``/metrics`` (Prometheus text) and ``/health`` on localhost.
+
+    ``/health`` answers 200 when the health check passes and 503 with the
+    problems otherwise, as JSON.
+    """
+
+    def __init__(self, registry: MetricsRegistry, health: HealthCheck,
+                 port: int, host: str = METRICS_HOST):
+        super().__init__(name="metrics-server", daemon=True)
+        self.registry = registry
+        self.health = health
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics':
+                    status = 200
+                    body = server.registry.render().encode()
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif path == '/health':
+                    problems = server.health.problems()
+                    status = 503 if problems else 200
+                    body = json.dumps({'status': 'failing' if problems else 'ok',
+                                       'problems': problems}).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics: " + format, *args)
+
+        self.httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.address = self.httpd.server_address
+
+    def run(self):
+        self.httpd.serve_forever(poll_interval=0.5)
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
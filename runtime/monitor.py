@@ -0,0 +1,180 @@
+from collections import Counter
+from dataclasses import dataclass
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from devices import hidbackend
+from devices.labels import path_label
+from runtime.discovery import DeviceInventory, save_device_cache
+
+logger = logging.getLogger(__name__)
+
+# Shortest and longest delay between two bus scans (seconds)
+MIN_SCAN_INTERVAL = 0.5
+MAX_SCAN_INTERVAL = 8.0
+
+
+@dataclass
+class DeviceType:
+    """A kind of device the monitor looks for and how to build its handler."""
+    name: str
+    vendor_id: int
+    product_id: int
+    create_handler: Callable[[], object]
+
+
+class DeviceMonitor(threading.Thread):
+    """Watches the HID bus in the background and manages handler lifetimes.
+
+    Every newly seen path gets a fresh handler connected to it, and handlers
+    whose read failed (the handler closes its own device on error, from the
+    thread that reads it) are dropped. Changes are reported through
+    ``on_attach`` / ``on_detach`` so the read path never has to enumerate or
+    wait for a device to come back.
+
+    Scans back off from ``MIN_SCAN_INTERVAL`` up to ``MAX_SCAN_INTERVAL``
+    while nothing changes, and drop back to the minimum as soon as a
+    device disappears so it is picked up again quickly.
+
+    Every handler gets a ``unit`` id before it is reported: the device's
+    serial number, or its path when the serial is missing, a placeholder
+    (cheap shutters all report ``000000``) or shared with another unit.
+    """
+
+    def __init__(self, device_types: List[DeviceType],
+                 on_attach: Callable, on_detach: Callable,
+                 min_interval: float = MIN_SCAN_INTERVAL,
+                 max_interval: float = MAX_SCAN_INTERVAL,
+                 cache_file: Optional[str] = None):
+        super().__init__(name="device-monitor", daemon=True)
+        self.device_types = device_types
+        self.on_attach = on_attach
+        self.on_detach = on_detach
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.attached: Dict[bytes, object] = {}
+        self.inventory = DeviceInventory()
+        self.cache_file = cache_file
+        # (device type name, serial number) of every attached path, for the cache
+        self.identities: Dict[bytes, tuple] = {}
+        # Counters: handlers attached, attaches of a path seen before, detaches
+        self.attaches = 0
+        self.reconnects = 0
+        self.detaches = 0
+        self._seen = set()
+        self._stop_event = threading.Event()
+
+    def scan(self) -> bool:
+        """Enumerate the bus once, attaching and detaching handlers.
+
+        Returns:
+            bool: True if any device was attached or detached.
+        """
+        changed = self.reap()
+        try:
+            self.inventory.refresh()
+        except Exception as e:
+            logger.warning("Could not enumerate HID devices: %s", e)
+            return changed
+
+        for device_type in self.device_types:
+            found = self.inventory.find(device_type.vendor_id, device_type.product_id)
+            serials = Counter(device_info.get('serial_number') or '' for device_info in found)
+            for device_info in found:
+                path = device_info['path']
+                if path in self.attached:
+                    continue
+                serial = device_info.get('serial_number') or ''
+                if self._attach(device_type, path, serial, shared=serials[serial] > 1):
+                    changed = True
+
+        if changed and self.cache_file:
+            save_device_cache(self.cache_file, self.cache_entries())
+        return changed
+
+    def warm_start(self, entries: List[Dict[str, str]]) -> int:
+        """Open devices remembered in the on-disk cache without enumerating.
+
+        Every cached path is checked first (vendor id, product id and serial
+        number, read by the backend without enumerating) since hidraw nodes
+        are renumbered across reboots. If any entry doesn't match, or can't
+        be checked (hidapi), nothing is attached and the caller does a
+        cold scan instead.
+
+        Returns:
+            int: Number of devices attached.
+        """
+        types = {device_type.name: device_type for device_type in self.device_types}
+        checked = []
+        for entry in entries:
+            device_type = types.get(entry['type'])
+            path = bytes.fromhex(entry['path'])
+            info = hidbackend.device_info(path)
+            if (device_type is None or info is None
+                    or (info['vendor_id'], info['product_id']) != (device_type.vendor_id, device_type.product_id)
+                    or (info.get('serial_number') or '') != entry['serial']):
+                logger.info("Could not confirm the cached %s at %s, scanning instead",
+                            entry['type'], path_label(path))
+                return 0
+            checked.append((device_type, path, entry['serial']))
+
+        serials = Counter((device_type.name, serial) for device_type, _, serial in checked)
+        attached = 0
+        for device_type, path, serial in checked:
+            if path not in self.attached:
+                if self._attach(device_type, path, serial, shared=serials[device_type.name, serial] > 1):
+                    attached += 1
+        return attached
+
+    def cache_entries(self) -> List[Dict[str, str]]:
+        return [
+            {'type': type_name, 'path': path.hex(), 'serial': serial}
+            for path, (type_name, serial) in self.identities.items()
+        ]
+
+    def unit_id(self, path: bytes, serial: str, shared: bool = False) -> str:
+        """Stable identity of the unit at ``path``."""
+        taken = {handler.unit for handler in self.attached.values()}
+        if serial.strip('0') and not shared and serial not in taken:
+            return serial
+        return path_label(path)
+
+    def _attach(self, device_type: DeviceType, path: bytes, serial: str, shared: bool = False) -> bool:
+        handler = device_type.create_handler()
+        if not handler.connect(path):
+            return False
+        handler.unit = self.unit_id(path, serial, shared)
+        self.attached[path] = handler
+        self.identities[path] = (device_type.name, serial)
+        self.attaches += 1
+        if path in self._seen:
+            self.reconnects += 1
+        self._seen.add(path)
+        self.on_attach(handler)
+        return True
+
+    def reap(self) -> bool:
+        """Detach handlers whose device was closed after a read error."""
+        dead = [path for path, handler in self.attached.items() if not handler.device]
+        for path in dead:
+            self.identities.pop(path, None)
+            self.detaches += 1
+            self.on_detach(self.attached.pop(path))
+        return bool(dead)
+
+    def run(self):
+        interval = self.min_interval
+        next_scan = time.monotonic() + interval
+        while not self._stop_event.wait(self.min_interval):
+            lost = self.reap()
+            if not lost and time.monotonic() < next_scan:
+                continue
+            if self.scan() or lost:
+                interval = self.min_interval
+            else:
+                interval = min(interval * 2, self.max_interval)
+            next_scan = time.monotonic() + interval
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,106 @@
+"""Sampling profiler for a running pedalboard.
+
+Started and stopped at runtime (``SIGUSR1`` or ``profile`` on the control
+socket), it writes folded stacks, one line per distinct stack with its
+sample count::
+
+    midi-dispatcher;run (runtime/threads.py:126);feed (runtime/gestures.py:88) 42
+
+which ``flamegraph.pl``, ``inferno-flamegraph`` and speedscope read as is.
+"""
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Time between two samples (seconds)
+PROFILE_INTERVAL = 0.005
+# How long a profile runs unless stopped earlier (seconds)
+PROFILE_SECONDS = 10.0
+# Output file name, with strftime() fields
+PROFILE_FILE = "pedalboard-%Y%m%d-%H%M%S.folded"
+
+
+class SamplingProfiler(threading.Thread):
+    """Samples the Python stack of every thread for ``duration`` seconds.
+
+    The stacks are read from this thread with ``sys._current_frames()``,
+    so the profiled threads run unmodified; each sample costs one stack
+    walk per thread. A frame is labelled with its function and the line it
+    is at, so a read blocked in hidapi shows up on the line calling it.
+    """
+
+    def __init__(self, filename: str, duration: float = PROFILE_SECONDS, interval: float = PROFILE_INTERVAL):
+        super().__init__(name="profiler", daemon=True)
+        self.filename = filename
+        self.duration = duration
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Dict[str, int] = collections.Counter()
+        # (code, line) -> frame label, thread ident -> thread name
+        self._labels: Dict[Tuple[object, int], str] = {}
+        self._threads: Dict[int, str] = {}
+        self._stop_event = threading.Event()
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        key = (code, frame.f_lineno)
+        label = self._labels.get(key)
+        if label is None:
+            path = code.co_filename
+            where = f"{os.path.basename(os.path.dirname(path))}/{os.path.basename(path)}:{frame.f_lineno}"
+            label = self._labels[key] = f"{code.co_name} ({where})".replace(';', ':')
+        return label
+
+    def _thread_name(self, ident: int) -> str:
+        name = self._threads.get(ident)
+        if name is None:
+            self._threads = {thread.ident: thread.name.replace(';', ':') for thread in threading.enumerate()}
+            name = self._threads.setdefault(ident, f"thread-{ident}")
+        return name
+
+    def sample(self):
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame))
+                frame = frame.f_back
+            stack.append(self._thread_name(ident))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def run(self):
+        deadline = time.monotonic() + self.duration
+        while not self._stop_event.wait(self.interval) and time.monotonic() < deadline:
+            self.sample()
+        self.write()
+
+    def write(self):
+        try:
+            with open(self.filename, 'w', encoding='utf-8') as profile_file:
+                for stack, count in sorted(self.stacks.items()):
+                    profile_file.write(f"{stack} {count}\n")
+        except OSError as e:
+            logger.warning("Could not write profile %s: %s", self.filename, e)
+            return
+        logger.info("Profile: %d sample(s) of %d stack(s) written to %s",
+                    self.samples, len(self.stacks), self.filename)
+
+    def stop(self, wait: bool = True):
+        """End the profile early; the stacks so far are written.
+
+        Args:
+            wait: Block until the file is written; otherwise this thread
+                writes it on its own after its current sample
+        """
+        self._stop_event.set()
+        if wait and self.is_alive():
+            self.join()
@@ -0,0 +1,200 @@
+import logging
+import mmap
+import queue
+import struct
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# File layout:
+#   file header   magic, version
+#   records       RECORD_HEADER followed by ``length`` payload bytes
+# A DEVICE record declares a device id (payload: vendor id, product id and
+# the HID path); REPORT records then carry the raw report bytes for that id.
+LOG_MAGIC = b'PBHL'
+LOG_VERSION = 1
+FILE_HEADER = struct.Struct('<4sB3x')
+RECORD_HEADER = struct.Struct('<BHHQ')    # kind, device id, length, monotonic ns
+DEVICE_INFO = struct.Struct('<HH')        # vendor id, product id
+
+KIND_DEVICE = 1
+KIND_REPORT = 2
+
+# Write buffer size and how often buffered records are flushed (seconds)
+WRITE_BUFFER_SIZE = 64 * 1024
+FLUSH_INTERVAL = 0.5
+# How often a realtime replay wakes up while gesture timers are pending (seconds)
+GESTURE_TICK = 0.005
+GESTURE_TICK_NS = int(GESTURE_TICK * 1e9)
+
+_STOP = object()
+
+
+class ReportRecorder(threading.Thread):
+    """Appends every raw HID report to a compact binary log.
+
+    ``record()`` only puts a reference on a queue; packing and buffered
+    file I/O happen on this thread so the live read path is not slowed.
+    """
+
+    def __init__(self, filename: str):
+        super().__init__(name="report-recorder", daemon=True)
+        self.filename = filename
+        self.recorded = 0
+        self._queue = queue.SimpleQueue()
+        self._device_ids: Dict[bytes, int] = {}
+        self._file = open(filename, 'wb', buffering=WRITE_BUFFER_SIZE)
+        self._file.write(FILE_HEADER.pack(LOG_MAGIC, LOG_VERSION))
+
+    def record(self, handler, data, read_ns: int):
+        """Queue a report read by ``handler`` (called on the hot path).
+
+        The report is copied: the hidraw backend reuses its read buffer.
+        """
+        self._queue.put((handler, bytes(data), read_ns))
+
+    def run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                self._write(*item)
+            now = time.monotonic()
+            if now - last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                last_flush = now
+        self._file.close()
+
+    def _write(self, handler, report: bytes, read_ns: int):
+        path = handler.path or b''
+        device_id = self._device_ids.get(path)
+        if device_id is None:
+            device_id = self._device_ids[path] = len(self._device_ids)
+            info = DEVICE_INFO.pack(handler.config.vendor_id, handler.config.product_id) + path
+            self._file.write(RECORD_HEADER.pack(KIND_DEVICE, device_id, len(info), read_ns))
+            self._file.write(info)
+        self._file.write(RECORD_HEADER.pack(KIND_REPORT, device_id, len(report), read_ns))
+        self._file.write(report)
+        self.recorded += 1
+
+    def stop(self):
+        self._queue.put(_STOP)
+        self.join()
+
+
+def read_log(filename: str) -> Iterator[Tuple[int, int, int, bytes]]:
+    """Yield (kind, device id, timestamp ns, payload) from a memory-mapped log."""
+    with open(filename, 'rb') as log_file:
+        with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, version = FILE_HEADER.unpack_from(mapped, 0)
+            if magic != LOG_MAGIC or version != LOG_VERSION:
+                raise ValueError(f"{filename} is not a pedalboard report log")
+            offset = FILE_HEADER.size
+            end = len(mapped)
+            while offset + RECORD_HEADER.size <= end:
+                kind, device_id, length, timestamp_ns = RECORD_HEADER.unpack_from(mapped, offset)
+                offset += RECORD_HEADER.size
+                if offset + length > end:
+                    break  # truncated final record (e.g. after a crash)
+                yield kind, device_id, timestamp_ns, mapped[offset:offset + length]
+                offset += length
+
+
+class ReplayDevice:
+    """Stands in for ``hid.device`` and returns one report per read()."""
+
+    def __init__(self):
+        self.pending: Optional[List[int]] = None
+        # When the pending report was read, on the replay's clock
+        self.report_ns = 0
+
+    def report_time(self) -> int:
+        """Handler clock for a replay that does not keep the recorded timing."""
+        return self.report_ns
+
+    def read(self, max_length: int, timeout_ms: int = 0) -> List[int]:
+        report, self.pending = self.pending, None
+        return report[:max_length] if report else []
+
+    def close(self):
+        self.pending = None
+
+
+def replay_log(filename: str, manager, device_types, realtime: bool = True) -> int:
+    """Feed a recorded log back through fresh handlers.
+
+    Each recorded device gets a handler of the matching type (by vendor and
+    product id) whose device is a ReplayDevice; reports are then pushed
+    through ``manager.read_handler`` in their original order, either with
+    their original spacing or as fast as possible. A fast replay runs the
+    handlers and gesture timers on the recorded timestamps (shifted to
+    start now), so debounce and gesture windows see the original spacing;
+    its press-to-MIDI latencies are then not meaningful.
+
+    Returns:
+        int: Number of reports replayed.
+    """
+    handlers = {}
+    replayed = 0
+    # Recorded time -> replay time
+    offset_ns = None
+    report_ns = 0
+    output = manager.midi_controller.output
+    for kind, device_id, timestamp_ns, payload in read_log(filename):
+        if kind == KIND_DEVICE:
+            vendor_id, product_id = DEVICE_INFO.unpack_from(payload)
+            path = bytes(payload[DEVICE_INFO.size:])
+            for device_type in device_types:
+                if (device_type.vendor_id, device_type.product_id) == (vendor_id, product_id):
+                    handler = device_type.create_handler()
+                    handler.device = ReplayDevice()
+                    handler.path = path
+                    if not realtime:
+                        handler.clock = handler.device.report_time
+                    handlers[device_id] = handler
+                    manager.attach_handler(handler)
+                    break
+            else:
+                logger.warning("No handler for recorded device %04x:%04x %s", vendor_id, product_id, path)
+            continue
+
+        handler = handlers.get(device_id)
+        if kind != KIND_REPORT or handler is None:
+            continue
+        if offset_ns is None:
+            offset_ns = time.monotonic_ns() - timestamp_ns
+        report_ns = timestamp_ns + offset_ns
+        if realtime:
+            while (delay_ns := report_ns - time.monotonic_ns()) > 0:
+                # Wake up for gesture deadlines that fall between reports
+                time.sleep(min(delay_ns / 1e9, GESTURE_TICK) if manager.gestures.pending else delay_ns / 1e9)
+                manager.gestures.advance()
+        else:
+            # Fire the gesture timers that were due before this report
+            manager.gestures.advance(report_ns)
+        handler.device.pending = list(payload)
+        handler.device.report_ns = report_ns
+        manager.read_handler(handler)
+        manager.gestures.advance(None if realtime else report_ns)
+        if output and not realtime:
+            # Send this report's messages before the next one, as the
+            # recorded spacing did, rather than coalescing them
+            output.drain()
+        replayed += 1
+
+    # Let long presses and double-tap windows still open at the end resolve
+    while manager.gestures.pending:
+        if realtime:
+            time.sleep(GESTURE_TICK)
+            manager.gestures.advance()
+        else:
+            report_ns += GESTURE_TICK_NS
+            manager.gestures.advance(report_ns)
+    return replayed
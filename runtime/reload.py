@@ -0,0 +1,149 @@
+"""Hot-reload of the mapping configs.
+
+The config modules are imported again and the resulting ``Mappings`` are
+handed to the running ``DeviceManager``, which compiles what changed and
+swaps it in between two events. A reload is triggered by a change to one
+of the config files (``ConfigWatcher``) or a ``reload`` line on a Unix
+control socket (``ControlServer``).
+"""
+from dataclasses import dataclass, fields
+import importlib
+import logging
+import os
+import re
+import socket
+import threading
+import zlib
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Mapping name -> (config module, attribute holding its config)
+CONFIG_MODULES: Dict[str, Tuple[str, str]] = {
+    'midi': ('config.midi_config', 'midi_config'),
+    'joystick': ('config.joystick_config', 'joystick_config'),
+    'm3': ('config.shutterM3_config', 'm3_config'),
+    'ab': ('config.shutterAB_config', 'ab_config'),
+    'gestures': ('config.gesture_config', 'gesture_config'),
+}
+
+# How often the watcher checks the config files (seconds)
+WATCH_INTERVAL = 1.0
+# How long a reload request waits for the input loop to apply it (seconds)
+APPLY_TIMEOUT = 5.0
+
+
+@dataclass
+class Mappings:
+    """Every config the running pedalboard can reload."""
+    midi: object
+    joystick: object
+    m3: object
+    ab: object
+    gestures: object
+
+
+def load_mappings(reload: bool = False) -> Mappings:
+    """Import the config modules (again, with ``reload``).
+
+    Raises:
+        Exception: Whatever a broken config module raises; nothing is
+            half-applied since the caller only swaps complete Mappings.
+    """
+    configs = {}
+    for name, (module_name, attribute) in CONFIG_MODULES.items():
+        module = importlib.import_module(module_name)
+        if reload:
+            module = importlib.reload(module)
+        configs[name] = getattr(module, attribute)
+    return Mappings(**configs)
+
+
+def mapping_versions(mappings: Mappings) -> Dict[str, int]:
+    """CRC32 of every config, stable across runs (object addresses are dropped)."""
+    return {
+        field.name: zlib.crc32(re.sub(r' at 0x[0-9a-fA-F]+', '', repr(getattr(mappings, field.name))).encode())
+        for field in fields(mappings)
+    }
+
+
+def config_files() -> List[str]:
+    return [importlib.import_module(module_name).__file__ for module_name, _ in CONFIG_MODULES.values()]
+
+
+class ConfigWatcher(threading.Thread):
+    """Calls ``on_change`` (which logs the outcome) whenever a config file's mtime changes."""
+
+    def __init__(self, on_change: Callable[[], str], interval: float = WATCH_INTERVAL):
+        super().__init__(name="config-watcher", daemon=True)
+        self.on_change = on_change
+        self.interval = interval
+        self.files = config_files()
+        self._mtimes = self._stat()
+        self._stop_event = threading.Event()
+
+    def _stat(self) -> Dict[str, float]:
+        mtimes = {}
+        for path in self.files:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = 0
+        return mtimes
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            mtimes = self._stat()
+            if mtimes != self._mtimes:
+                self._mtimes = mtimes
+                self.on_change()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class ControlServer(threading.Thread):
+    """Line-based commands on a Unix socket.
+
+    ``reload`` reloads the mappings and answers with what changed;
+    ``ping`` answers ``pong``. Try it with
+    ``echo reload | nc -U /tmp/pedalboard.sock``.
+    """
+
+    def __init__(self, path: str, commands: Dict[str, Callable[[], str]]):
+        super().__init__(name="control-server", daemon=True)
+        self.path = path
+        self.commands = dict(commands, ping=lambda: "pong")
+        if os.path.exists(path):
+            os.unlink(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(4)
+        self.sock.settimeout(0.5)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                conn, _ = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            with conn:
+                conn.settimeout(APPLY_TIMEOUT)
+                try:
+                    for line in conn.makefile('r', encoding='utf-8'):
+                        command = self.commands.get(line.strip())
+                        reply = command() if command else f"error: unknown command '{line.strip()}'"
+                        conn.sendall(reply.encode() + b"\n")
+                except OSError as e:
+                    logger.warning("Control connection failed: %s", e)
+
+    def stop(self):
+        self._stop_event.set()
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
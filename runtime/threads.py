@@ -0,0 +1,133 @@
+from dataclasses import dataclass
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Optional
+from devices.labels import source_label
+from midi.output import log_effect
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of actions waiting for the dispatcher
+EVENT_QUEUE_SIZE = 256
+# Blocking read timeout used by reader threads (ms)
+READ_TIMEOUT_MS = 100
+# Dispatcher wake-up interval while gesture timers are pending (seconds)
+GESTURE_TICK = 0.005
+# Dispatcher wake-up interval otherwise (seconds)
+DISPATCH_TIMEOUT = 0.1
+
+
+@dataclass
+class ActionEvent:
+    action: str
+    device: str
+    path: Optional[bytes]
+    # Monotonic timestamps (ns): HID read returned, pattern matched
+    read_ns: int
+    match_ns: int
+
+    @classmethod
+    def from_handler(cls, handler, action: str) -> 'ActionEvent':
+        return cls(action, handler.__class__.__name__, handler.path, handler.read_ns, handler.match_ns)
+
+    @property
+    def source(self) -> str:
+        """Label identifying the device in reports, with the path decoded."""
+        return source_label(self.device, self.path)
+
+
+class PressTrace:
+    """Follows one press until its MIDI message has been sent, then
+    records its latency and logs the effect change."""
+
+    __slots__ = ('event', 'dispatch_ns', 'latency')
+
+    def __init__(self, event: ActionEvent, dispatch_ns: int, latency=None):
+        self.event = event
+        self.dispatch_ns = dispatch_ns
+        self.latency = latency
+
+    def sent(self, send_ns: int, fields: Optional[dict]):
+        event = self.event
+        if self.latency:
+            self.latency.record(event.source, event.action, event.read_ns, event.match_ns,
+                                self.dispatch_ns, send_ns)
+        if fields:
+            log_effect(fields, event.device, event.path, send_ns - event.read_ns)
+
+
+def dispatch(midi_controller, event: ActionEvent, latency=None):
+    """Send an action; its latency is recorded once the message has
+    actually left (possibly on the MIDI output thread)."""
+    midi_controller.trigger(event.action, PressTrace(event, time.monotonic_ns(), latency))
+
+
+class DeviceReader(threading.Thread):
+    """Reads a single handler and pushes matched actions onto the event queue.
+
+    The reader exits once its handler loses the device; the device monitor
+    attaches a fresh handler (and reader) when the device comes back.
+    """
+
+    def __init__(self, handler, resolve_action: Callable, events: queue.Queue,
+                 timeout_ms: int = READ_TIMEOUT_MS):
+        super().__init__(name=f"reader-{handler.__class__.__name__}", daemon=True)
+        self.handler = handler
+        self.resolve_action = resolve_action
+        self.events = events
+        self.timeout_ms = timeout_ms
+        self.dropped = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set() and self.handler.device:
+            result = self.handler.read(self.timeout_ms)
+            if not result:
+                continue
+            action = self.resolve_action(self.handler, result)
+            if not action:
+                continue
+
+            event = ActionEvent.from_handler(self.handler, action)
+            try:
+                self.events.put_nowait(event)
+            except queue.Full:
+                self.dropped += 1
+                logger.warning("Event queue full, dropped %s from %s", action, event.source,
+                               extra={'action': action, 'device': event.device, 'path': event.path})
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class MIDIDispatcher(threading.Thread):
+    """Feeds queued presses and releases to the gesture engine in arrival
+    order; the engine's actions are sent from this thread, so it is the
+    only one touching the MIDI controller."""
+
+    def __init__(self, gestures, events: queue.Queue, tick: Optional[Callable[[int], None]] = None):
+        super().__init__(name="midi-dispatcher", daemon=True)
+        self.gestures = gestures
+        self.events = events
+        # Called with the monotonic time (ns) once per pass, between events
+        self.tick = tick
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            # Wake up in time for pending long-press / double-tap deadlines
+            timeout = GESTURE_TICK if self.gestures.pending else DISPATCH_TIMEOUT
+            try:
+                event: Optional[ActionEvent] = self.events.get(timeout=timeout)
+            except queue.Empty:
+                event = None
+            if event is not None:
+                self.gestures.feed(event)
+            self.gestures.advance()
+            if self.tick:
+                self.tick(time.monotonic_ns())
+
+    def stop(self):
+        self._stop_event.set()
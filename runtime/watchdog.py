@@ -0,0 +1,126 @@
+from collections import deque
+from dataclasses import dataclass
+import logging
+import time
+from typing import Callable, Dict, Optional
+from runtime.latency import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Work one input loop pass may take, blocking reads not counted (ms)
+WATCHDOG_BUDGET_MS = 5.0
+# Overruns kept for the control socket and the exit report
+RECENT_OVERRUNS = 32
+# Blamed when the time went to the loop itself (gesture timers, a reload,
+# axis flushes) rather than to one device
+LOOP_SOURCE = 'loop'
+
+
+@dataclass
+class Overrun:
+    """One input loop pass that took longer than the budget."""
+    at_ns: int
+    # Work done in the pass (ns), time spent blocked in reads left out
+    pass_ns: int
+    # The device whose read took longest in the pass, or LOOP_SOURCE
+    source: str
+    # That device's time in read() and in dispatching its action (ns)
+    read_ns: int = 0
+    dispatch_ns: int = 0
+
+    def describe(self) -> str:
+        if self.source == LOOP_SOURCE:
+            return f"{self.pass_ns / 1e6:.1f} ms in the loop itself"
+        return (f"{self.pass_ns / 1e6:.1f} ms, slowest {self.source} "
+                f"(read {self.read_ns / 1e6:.1f} ms, dispatch {self.dispatch_ns / 1e6:.1f} ms)")
+
+
+class Watchdog:
+    """Times every input loop pass against a budget.
+
+    The loop calls ``begin`` and ``end`` around a pass and ``lap`` after
+    each device read. The part of a read within its own blocking timeout
+    is waiting, not work, and is left out. A pass whose remaining time
+    exceeds ``budget_ms`` is an overrun, blamed on the device with the
+    slowest lap (split into read and dispatch time), or on the loop when
+    more time went elsewhere. Used only from the thread running the loop.
+    """
+
+    def __init__(self, budget_ms: float = WATCHDOG_BUDGET_MS, describe: Callable[[object], str] = str):
+        self.budget_ns = int(budget_ms * 1e6)
+        # Label of a lap's source, only computed for an overrun
+        self.describe = describe
+        self.passes = 0
+        self.overruns = 0
+        # Work per pass
+        self.costs = LatencyHistogram()
+        # Source label -> overruns blamed on it
+        self.by_source: Dict[str, int] = {}
+        self.recent = deque(maxlen=RECENT_OVERRUNS)
+        self.worst: Optional[Overrun] = None
+        # The pass in progress (none while _start_ns is 0): start, time
+        # blocked in reads, total lap work, and the slowest lap's work and
+        # (source, read ns, dispatch ns)
+        self.begin(0)
+
+    def begin(self, now_ns: int):
+        self._start_ns = now_ns
+        self._blocked_ns = 0
+        self._laps_ns = 0
+        self._slowest_ns = 0
+        self._slowest = (None, 0, 0)
+
+    def lap(self, source, start_ns: int, timeout_ms: int = 0, read_end_ns: int = 0):
+        """A read of ``source`` that started at ``start_ns`` is done.
+
+        Args:
+            timeout_ms: Blocking timeout of the read
+            read_end_ns: When read() returned a result, if it did; the rest
+                of the lap went to dispatching it
+        """
+        end_ns = time.monotonic_ns()
+        read = (read_end_ns or end_ns) - start_ns
+        if timeout_ms:
+            blocked = min(read, timeout_ms * 1_000_000)
+            self._blocked_ns += blocked
+            read -= blocked
+        work = read + (end_ns - read_end_ns if read_end_ns else 0)
+        self._laps_ns += work
+        if work > self._slowest_ns:
+            self._slowest_ns = work
+            self._slowest = (source, read, work - read)
+
+    def end(self, now_ns: int):
+        if not self._start_ns:
+            return
+        cost = now_ns - self._start_ns - self._blocked_ns
+        self._start_ns = 0
+        self.passes += 1
+        self.costs.record(cost)
+        if cost > self.budget_ns:
+            self._overrun(now_ns, cost)
+
+    def _overrun(self, now_ns: int, cost: int):
+        source, read_ns, dispatch_ns = self._slowest
+        if source is None or self._slowest_ns < cost - self._laps_ns:
+            overrun = Overrun(now_ns, cost, LOOP_SOURCE)
+        else:
+            overrun = Overrun(now_ns, cost, self.describe(source), read_ns, dispatch_ns)
+        self.overruns += 1
+        self.by_source[overrun.source] = self.by_source.get(overrun.source, 0) + 1
+        self.recent.append(overrun)
+        if self.worst is None or cost > self.worst.pass_ns:
+            self.worst = overrun
+        logger.warning("Input loop pass over its %.1f ms budget: %s", self.budget_ns / 1e6, overrun.describe(),
+                       extra={'device': overrun.source, 'latency_ms': round(cost / 1e6, 3)})
+
+    def summary(self) -> str:
+        lines = [f"{self.passes} pass(es), {self.overruns} over {self.budget_ns / 1e6:g} ms; "
+                 f"work per pass {self.costs.summary()}"]
+        if self.worst:
+            lines.append(f"worst: {self.worst.describe()}")
+        # Snapshot: the input loop may add a source while this runs on the
+        # control socket's thread
+        for source, count in sorted(list(self.by_source.items()), key=lambda item: -item[1]):
+            lines.append(f"{count} overrun(s) blamed on {source}")
+        return "\n".join(lines)
@@ -0,0 +1,301 @@
+"""Device readers in worker processes feeding shared-memory event rings.
+
+Every device gets a worker process that owns the HID handle and writes
+fixed-size records into its own single-producer/single-consumer ring in
+``multiprocessing.shared_memory``. The parent drains the rings without
+pickling anything. A worker that crashes or stops responding is restarted
+while the MIDI port stays open in the parent.
+"""
+import dataclasses
+import logging
+import multiprocessing
+import multiprocessing.connection
+import signal
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from devices import hidbackend
+
+logger = logging.getLogger(__name__)
+
+# Records per ring; a full ring drops new events
+RING_CAPACITY = 256
+# Ring header: head (written by the worker), tail (written by the parent),
+# last heartbeat of the worker (monotonic ns)
+RING_HEADER = struct.Struct('<QQQ')
+# Record: read ns, match ns, kind, cc, channel, value, action (utf-8, NUL padded)
+RING_RECORD = struct.Struct('<QQBBBB16s')
+KIND_ACTION = 1
+KIND_AXIS = 2
+
+# Blocking read timeout in the worker; also its heartbeat interval (ms)
+WORKER_READ_TIMEOUT_MS = 100
+# A worker without a heartbeat for this long is considered hung (seconds)
+HANG_TIMEOUT = 2.0
+# Allowance for interpreter start-up before the first heartbeat (seconds)
+STARTUP_TIMEOUT = 10.0
+# Restart delays after a crash, doubling up to the maximum (seconds)
+MIN_RESTART_DELAY = 0.5
+MAX_RESTART_DELAY = 8.0
+# Worker exit code when its device is gone (no restart; the monitor rescans)
+EXIT_DEVICE_GONE = 3
+
+# Worker processes start from a fresh interpreter: nothing of the parent's
+# threads, MIDI port or logging queue is inherited
+_context = multiprocessing.get_context('spawn')
+
+
+class EventRing:
+    """Fixed-size event records in shared memory, one producer, one consumer."""
+
+    def __init__(self, name: Optional[str] = None, capacity: int = RING_CAPACITY):
+        size = RING_HEADER.size + capacity * RING_RECORD.size
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.name = self.shm.name
+        self.capacity = capacity
+        self.buffer = self.shm.buf
+        if self.owner:
+            RING_HEADER.pack_into(self.buffer, 0, 0, 0, time.monotonic_ns())
+        # The producer keeps its own copy of head; restarts pick it up again
+        self.head = RING_HEADER.unpack_from(self.buffer, 0)[0]
+        self.dropped = 0
+
+    def _offset(self, index: int) -> int:
+        return RING_HEADER.size + (index % self.capacity) * RING_RECORD.size
+
+    def put(self, kind: int, read_ns: int, match_ns: int, action: str = '',
+            cc: int = 0, channel: int = 0, value: int = 0) -> bool:
+        """Append a record (worker side); False if the ring is full."""
+        head = self.head
+        tail = struct.unpack_from('<Q', self.buffer, 8)[0]
+        if head - tail >= self.capacity:
+            self.dropped += 1
+            return False
+        RING_RECORD.pack_into(self.buffer, self._offset(head), read_ns, match_ns,
+                              kind, cc, channel, value, action.encode()[:16])
+        # Publish the record only after it is complete
+        self.head = head + 1
+        struct.pack_into('<Q', self.buffer, 0, self.head)
+        return True
+
+    def beat(self, now_ns: int):
+        struct.pack_into('<Q', self.buffer, 16, now_ns)
+
+    def heartbeat_ns(self) -> int:
+        return struct.unpack_from('<Q', self.buffer, 16)[0]
+
+    def drain(self) -> Iterator[Tuple[int, int, int, str, int, int, int]]:
+        """Yield (kind, read ns, match ns, action, cc, channel, value) (parent side)."""
+        head, tail, _ = RING_HEADER.unpack_from(self.buffer, 0)
+        while tail < head:
+            read_ns, match_ns, kind, cc, channel, value, action = RING_RECORD.unpack_from(
+                self.buffer, self._offset(tail))
+            tail += 1
+            struct.pack_into('<Q', self.buffer, 8, tail)
+            yield kind, read_ns, match_ns, action.rstrip(b'\0').decode(), cc, channel, value
+
+    def close(self):
+        self.buffer = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def run_worker(create_handler: Callable, path: bytes, ring_name: str, notify, stop, backend: str):
+    """Worker process: read one device and publish what it reports."""
+    # Ctrl+C goes to the whole process group; the parent stops workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    hidbackend.select(backend)
+    ring = EventRing(ring_name)
+    handler = create_handler()
+
+    def on_axis(mapping, value: int):
+        if ring.put(KIND_AXIS, handler.read_ns, handler.read_ns, cc=mapping.cc,
+                    channel=mapping.channel or 0, value=value):
+            notify.send_bytes(b'\0')
+
+    handler.on_axis = on_axis
+    if not handler.connect(path):
+        sys.exit(EXIT_DEVICE_GONE)
+    try:
+        while not stop.is_set():
+            result = handler.read(WORKER_READ_TIMEOUT_MS)
+            ring.beat(time.monotonic_ns())
+            if result:
+                if ring.put(KIND_ACTION, handler.read_ns, handler.match_ns, result):
+                    notify.send_bytes(b'\0')
+            elif not handler.device:
+                sys.exit(EXIT_DEVICE_GONE)
+    finally:
+        handler.cleanup()
+        ring.close()
+
+
+class _WorkerDevice:
+    """Stands in for the device while the worker process owns it."""
+
+    def __init__(self, path: bytes):
+        self.path = path
+
+    def get_serial_number_string(self) -> str:
+        for info in hidbackend.enumerate():
+            if info['path'] == self.path:
+                return info['serial_number']
+        raise OSError(f"device {self.path!r} is gone")
+
+
+class WorkerHandler:
+    """Parent-side proxy for a handler that runs in a worker process.
+
+    ``handler`` is an unconnected instance of the real handler, used to
+    resolve actions and to name the device. ``device`` stays set while the
+    worker runs or is due to be restarted, and becomes None once the device
+    itself is gone, so the device monitor reaps the proxy as usual.
+    """
+
+    def __init__(self, create_handler: Callable):
+        self.create_handler = create_handler
+        self.handler = create_handler()
+        self.config = self.handler.config
+        self.device = None
+        self.path: Optional[bytes] = None
+        self.unit: Optional[str] = None
+        self.recorder = None
+        # Monotonic ns of the last event drained from the worker
+        self.read_ns = 0
+        self.ring: Optional[EventRing] = None
+        self.process = None
+        self.notify = None
+        self._notify_writer = None
+        self._stop = None
+        self.restarts = 0
+        self.started_at = 0.0
+        self.started_ns = 0
+        self.restart_at = 0.0
+        self.restart_delay = MIN_RESTART_DELAY
+
+    def connect(self, path: Optional[bytes] = None) -> bool:
+        if path is None:
+            return False
+        self.path = path
+        self.ring = EventRing()
+        self.notify, self._notify_writer = _context.Pipe(duplex=False)
+        self.device = _WorkerDevice(path)
+        self.start()
+        return True
+
+    def start(self):
+        self._stop = _context.Event()
+        self.process = _context.Process(
+            target=run_worker,
+            args=(self.create_handler, self.path, self.ring.name, self._notify_writer, self._stop,
+                  hidbackend.name),
+            name=f"reader-{self.handler.__class__.__name__}",
+            daemon=True,
+        )
+        self.process.start()
+        self.started_at = time.monotonic()
+        # Count the start itself as a heartbeat
+        self.started_ns = time.monotonic_ns()
+        self.ring.beat(self.started_ns)
+
+    def wait_handles(self) -> List:
+        """Connections/sentinels that become ready on an event or exit."""
+        if self.process is None:
+            return []
+        return [self.notify, self.process.sentinel]
+
+    def drain(self):
+        while self.notify.poll():
+            self.notify.recv_bytes()
+        return self.ring.drain()
+
+    def check(self, now: float):
+        """Supervise the worker: restart it after a crash or hang.
+
+        Called from the parent's loop; a worker that exits because its
+        device is gone is not restarted.
+        """
+        if self.device is None:
+            return
+        process = self.process
+        if process is not None:
+            if process.exitcode is None:
+                heartbeat_ns = self.ring.heartbeat_ns()
+                timeout = STARTUP_TIMEOUT if heartbeat_ns == self.started_ns else HANG_TIMEOUT
+                if time.monotonic_ns() - heartbeat_ns < timeout * 1e9:
+                    if now - self.started_at > MAX_RESTART_DELAY:
+                        self.restart_delay = MIN_RESTART_DELAY
+                    return
+                logger.warning("Reader for %s stopped responding, restarting", self.path,
+                               extra={'device': self.handler.__class__.__name__, 'path': self.path})
+                process.kill()
+                process.join()
+            elif process.exitcode == EXIT_DEVICE_GONE:
+                process.join()
+                self.process = None
+                self.device = None
+                return
+            else:
+                logger.warning("Reader for %s exited with code %s, restarting", self.path, process.exitcode,
+                               extra={'device': self.handler.__class__.__name__, 'path': self.path})
+                process.join()
+            self.process = None
+            self.restart_at = now + self.restart_delay
+            self.restart_delay = min(self.restart_delay * 2, MAX_RESTART_DELAY)
+            return
+
+        if now >= self.restart_at:
+            self.restarts += 1
+            self.start()
+
+    def button_actions(self, unit: Optional[str]) -> Dict[str, str]:
+        return self.handler.button_actions(unit)
+
+    def reconfigure(self, create_handler: Callable):
+        """Restart the worker with a handler built from a reloaded config.
+
+        The worker's handler lives in another process, so unlike the
+        in-process handlers this reopens the device, unless only the
+        per-unit mappings changed: those are resolved in this process.
+        """
+        handler = create_handler()
+        restart = dataclasses.replace(handler.config, units=self.config.units) != self.config
+        self.create_handler = create_handler
+        self.handler = handler
+        self.config = handler.config
+        if restart and self.process is not None:
+            self._stop_worker()
+            self.start()
+
+    def _stop_worker(self):
+        self._stop.set()
+        self.process.join(WORKER_READ_TIMEOUT_MS / 1000 * 5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.process = None
+
+    def cleanup(self):
+        if self.process is not None:
+            self._stop_worker()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        if self.notify is not None:
+            self.notify.close()
+            self._notify_writer.close()
+            self.notify = None
+        self.device = None
+
+
+def wait_for_workers(handlers: List[WorkerHandler], timeout: float) -> List:
+    """Block until any worker has events or exits, or ``timeout`` passes."""
+    handles = [handle for handler in handlers for handle in handler.wait_handles()]
+    if not handles:
+        time.sleep(timeout)
+        return []
+    return multiprocessing.connection.wait(handles, timeout)
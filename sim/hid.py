@@ -0,0 +1,243 @@
+"""Simulated stand-in for the hidapi ``hid`` module.
+
+Put this directory first on the import path and the pedalboard runs
+against replayed captures from ``shutters/`` instead of real hardware:
+
+    PYTHONPATH=sim python3 main.py
+
+Which devices exist and how fast they talk is controlled with:
+
+    PEDALBOARD_SIM_DEVICES  e.g. "ab=2,m3=1,joystick=1" (default one of each)
+    PEDALBOARD_SIM_RATE     reports per second per device, 0 = as fast as
+                            possible (default 10)
+    PEDALBOARD_SIM_LOOP     1 to replay the capture forever, 0 to play it
+                            once (default 1)
+
+or programmatically with ``configure()``.
+"""
+import ast
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Lets the backend selection tell the simulator from real hidapi
+SIMULATED = True
+
+CAPTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shutters')
+
+# Simulated device kinds and the capture each one replays
+CAPTURES = {
+    'ab': 'AB shutter3-new.txt',
+    'm3': 'BLE-m3.txt',
+    'joystick': 'ps2-controller.txt',
+}
+
+DEFAULT_DEVICES = 'ab=1,m3=1,joystick=1'
+DEFAULT_RATE = 10.0
+
+_REPORT_LINE = re.compile(r'(?:Raw Data|New pattern detected):\s*(\[[0-9,\s]*\])')
+_HEX_FIELD = re.compile(r'(Vendor ID|Product ID|vendor_id|product_id)\s*[:=]\s*(?:0x)?([0-9a-fA-F]+)')
+_TEXT_FIELD = re.compile(r'(Serial Number|Manufacturer|Product):\s*(.+)')
+
+
+class Capture:
+    """Device information and report stream parsed from a capture file."""
+
+    def __init__(self, filename: str):
+        self.name = filename
+        self.vendor_id = 0
+        self.product_id = 0
+        self.serial_number = ''
+        self.manufacturer = ''
+        self.product = os.path.splitext(filename)[0]
+        self.reports: List[List[int]] = []
+
+        with open(os.path.join(CAPTURE_DIR, filename), encoding='utf-8') as capture_file:
+            for line in capture_file:
+                if match := _REPORT_LINE.search(line):
+                    self.reports.append(ast.literal_eval(match.group(1)))
+                elif match := _HEX_FIELD.search(line):
+                    value = int(match.group(2), 16)
+                    if match.group(1).lower().startswith('vendor'):
+                        self.vendor_id = value
+                    else:
+                        self.product_id = value
+                elif match := _TEXT_FIELD.search(line):
+                    field, value = match.group(1), match.group(2).strip()
+                    if field == 'Serial Number':
+                        self.serial_number = value
+                    elif field == 'Manufacturer':
+                        self.manufacturer = value
+                    else:
+                        self.product = value
+
+
+class SimulatedDevice:
+    """One simulated unit replaying a capture on a fixed schedule."""
+
+    def __init__(self, kind: str, index: int, capture: Capture, rate: float, loop: bool):
+        self.kind = kind
+        self.capture = capture
+        self.path = f"sim/{kind}/{index}".encode()
+        self.serial_number = f"{capture.serial_number or kind}-{index}"
+        self.rate = rate
+        self.loop = loop
+        self.position = 0
+        self.started_ns = 0
+
+    def info(self) -> dict:
+        return {
+            'path': self.path,
+            'vendor_id': self.capture.vendor_id,
+            'product_id': self.capture.product_id,
+            'serial_number': self.serial_number,
+            'release_number': 0,
+            'manufacturer_string': self.capture.manufacturer,
+            'product_string': self.capture.product,
+            'usage_page': 0,
+            'usage': 0,
+            'interface_number': -1,
+        }
+
+    def start(self):
+        self.position = 0
+        self.started_ns = time.monotonic_ns()
+
+    def next_due_ns(self) -> Optional[int]:
+        """When the next report is due, or None if the capture has ended."""
+        if not self.loop and self.position >= len(self.capture.reports):
+            return None
+        if self.rate <= 0:
+            return self.started_ns
+        return self.started_ns + int(self.position * 1e9 / self.rate)
+
+    def pop(self) -> List[int]:
+        reports = self.capture.reports
+        report = reports[self.position % len(reports)]
+        self.position += 1
+        return list(report)
+
+
+_lock = threading.Lock()
+_devices: Optional[List[SimulatedDevice]] = None
+_captures: Dict[str, Capture] = {}
+
+
+def _parse_devices(spec: str) -> Dict[str, int]:
+    counts = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        kind, _, count = item.partition('=')
+        if kind not in CAPTURES:
+            raise ValueError(f"Unknown simulated device kind: {kind}")
+        counts[kind] = int(count or 1)
+    return counts
+
+
+def configure(devices: Optional[Dict[str, int]] = None, rate: Optional[float] = None,
+              loop: Optional[bool] = None):
+    """(Re)create the simulated bus.
+
+    Args:
+        devices: Number of units per kind, e.g. {'ab': 4}; defaults to
+                 PEDALBOARD_SIM_DEVICES
+        rate: Reports per second per unit (0 = as fast as possible)
+        loop: Replay the capture forever instead of once
+    """
+    global _devices
+    if devices is None:
+        devices = _parse_devices(os.environ.get('PEDALBOARD_SIM_DEVICES', DEFAULT_DEVICES))
+    if rate is None:
+        rate = float(os.environ.get('PEDALBOARD_SIM_RATE', DEFAULT_RATE))
+    if loop is None:
+        loop = os.environ.get('PEDALBOARD_SIM_LOOP', '1') != '0'
+
+    with _lock:
+        _devices = []
+        for kind, count in devices.items():
+            if kind not in _captures:
+                _captures[kind] = Capture(CAPTURES[kind])
+            for index in range(count):
+                _devices.append(SimulatedDevice(kind, index, _captures[kind], rate, loop))
+
+
+def simulated_devices() -> List[SimulatedDevice]:
+    if _devices is None:
+        configure()
+    return _devices
+
+
+def enumerate(vendor_id: int = 0, product_id: int = 0) -> List[dict]:
+    return [
+        unit.info() for unit in simulated_devices()
+        if (not vendor_id or unit.capture.vendor_id == vendor_id)
+        and (not product_id or unit.capture.product_id == product_id)
+    ]
+
+
+class device:
+    """Mirror of ``hid.device`` reading from a simulated unit."""
+
+    def __init__(self):
+        self._unit: Optional[SimulatedDevice] = None
+        self._nonblocking = False
+
+    def open(self, vendor_id: int, product_id: int, serial_number: Optional[str] = None):
+        for unit in simulated_devices():
+            if (unit.capture.vendor_id, unit.capture.product_id) == (vendor_id, product_id):
+                if serial_number is None or unit.serial_number == serial_number:
+                    return self._attach(unit)
+        raise IOError('open failed')
+
+    def open_path(self, path: bytes):
+        for unit in simulated_devices():
+            if unit.path == path:
+                return self._attach(unit)
+        raise IOError('open failed')
+
+    def _attach(self, unit: SimulatedDevice):
+        self._unit = unit
+        unit.start()
+
+    def set_nonblocking(self, nonblocking) -> int:
+        self._nonblocking = bool(nonblocking)
+        return 0
+
+    def read(self, max_length: int, timeout_ms: int = 0) -> List[int]:
+        if self._unit is None:
+            raise ValueError('not open')
+        due_ns = self._unit.next_due_ns()
+        now_ns = time.monotonic_ns()
+        if due_ns is not None and due_ns <= now_ns:
+            return self._unit.pop()[:max_length]
+
+        if timeout_ms > 0:
+            wait_ns = timeout_ms * 1_000_000
+        elif self._nonblocking:
+            return []
+        else:
+            wait_ns = None
+
+        if due_ns is None:
+            if wait_ns is not None:
+                time.sleep(wait_ns / 1e9)
+                return []
+            raise IOError('read error')
+        if wait_ns is not None and due_ns - now_ns > wait_ns:
+            time.sleep(wait_ns / 1e9)
+            return []
+        time.sleep((due_ns - now_ns) / 1e9)
+        return self._unit.pop()[:max_length]
+
+    def close(self):
+        self._unit = None
+
+    def get_manufacturer_string(self) -> str:
+        return self._unit.capture.manufacturer if self._unit else ''
+
+    def get_product_string(self) -> str:
+        return self._unit.capture.product if self._unit else ''
+
+    def get_serial_number_string(self) -> str:
+        return self._unit.serial_number if self._unit else ''
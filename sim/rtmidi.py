@@ -0,0 +1,82 @@
+"""Simulated stand-in for ``python-rtmidi`` that records what would be sent.
+
+Used together with ``sim/hid.py`` (``PYTHONPATH=sim``) to run the
+pedalboard and the benchmarks without a MIDI stack.
+"""
+from collections import deque
+import os
+import time
+from typing import List
+
+# Number of recorded messages kept per port
+HISTORY_SIZE = 100_000
+
+
+class _MidiBase:
+    def __init__(self, *args, **kwargs):
+        self.port_name = None
+
+    def get_ports(self) -> List[str]:
+        # Hardware ports to pretend exist, comma separated (e.g. "KATANA MIDI 1")
+        names = os.environ.get('PEDALBOARD_SIM_MIDI_PORTS', '')
+        return [name.strip() for name in names.split(',') if name.strip()]
+
+    def open_port(self, port: int = 0, name: str = None):
+        self.port_name = name or f"sim port {port}"
+        return self
+
+    def open_virtual_port(self, name: str = None):
+        self.port_name = name or "sim virtual port"
+        return self
+
+    def is_port_open(self) -> bool:
+        return self.port_name is not None
+
+    def close_port(self):
+        self.port_name = None
+
+
+class MidiIn(_MidiBase):
+    """Delivers messages passed to ``inject()`` to the registered callback."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.callback = None
+        self.data = None
+        self.ignore_sysex = True
+        self.last_ns = time.monotonic_ns()
+
+    def ignore_types(self, sysex: bool = True, timing: bool = True, active_sense: bool = True):
+        self.ignore_sysex = sysex
+
+    def set_callback(self, func, data=None):
+        self.callback = func
+        self.data = data
+
+    def cancel_callback(self):
+        self.callback = None
+
+    def inject(self, message):
+        now = time.monotonic_ns()
+        delta, self.last_ns = (now - self.last_ns) / 1e9, now
+        if self.ignore_sysex and message[0] == 0xF0:
+            return
+        if self.callback:
+            self.callback((list(message), delta), self.data)
+
+
+class MidiOut(_MidiBase):
+    """Records every message with the monotonic time it was sent."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.sent = 0
+        self.messages = deque(maxlen=HISTORY_SIZE)
+
+    def send_message(self, message):
+        self.messages.append((time.monotonic_ns(), list(message)))
+        self.sent += 1
+
+    def reset(self):
+        self.sent = 0
+        self.messages.clear()
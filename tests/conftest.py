@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Simulated hid and rtmidi backends from sim/, also picked up by spawned workers
+sys.path[:0] = [os.path.join(ROOT, 'sim'), ROOT]
+# One simulated AB shutter on the bus
+os.environ['PEDALBOARD_SIM_DEVICES'] = 'ab=1'
@@ -0,0 +1,61 @@
+import pytest
+
+from devices.axes import AXIS_CENTER, AxisFilter, AxisMapping, build_curve_table
+
+MS = 1_000_000
+# Far from 0 so the first sample is never rate limited
+T0 = 1_000_000 * MS
+
+
+def test_deadband_reads_as_the_centre():
+    table = build_curve_table(AxisMapping(cc=7, deadband=10))
+    centre = table[AXIS_CENTER]
+    assert table[AXIS_CENTER - 10] == table[AXIS_CENTER + 10] == centre
+    assert table[AXIS_CENTER + 11] > centre
+    assert table[AXIS_CENTER - 11] < centre
+
+
+def test_curve_range_and_invert():
+    table = build_curve_table(AxisMapping(cc=7, min_value=20, max_value=100, invert=True))
+    assert table[0] == 100 and table[255] == 20
+    with pytest.raises(ValueError):
+        build_curve_table(AxisMapping(cc=7, curve=[0] * 10))
+
+
+def test_hysteresis_at_the_threshold():
+    axis = AxisFilter(AxisMapping(cc=7, hysteresis=2, max_rate=0))
+    assert axis.update(100, T0) == axis.table[100]
+    # A change of exactly the hysteresis is jitter
+    assert axis.update(102, T0 + MS) is None
+    assert axis.update(98, T0 + 2 * MS) is None
+    # One more moves the output
+    assert axis.update(103, T0 + 3 * MS) == axis.table[103]
+
+
+def test_ends_are_always_reachable():
+    axis = AxisFilter(AxisMapping(cc=7, hysteresis=4, max_rate=0))
+    axis.update(253, T0)
+    assert axis.update(255, T0 + MS) == 127
+    axis.update(2, T0 + 2 * MS)
+    assert axis.update(0, T0 + 3 * MS) == 0
+
+
+def test_rate_limit_holds_the_latest_value_for_flush():
+    axis = AxisFilter(AxisMapping(cc=7, hysteresis=0, max_rate=100))
+    assert axis.update(0, T0) == 0
+    # Within the 10 ms interval: held back, the newest value wins
+    assert axis.update(100, T0 + 2 * MS) is None
+    assert axis.update(200, T0 + 4 * MS) is None
+    assert axis.flush(T0 + 8 * MS) is None
+    assert axis.flush(T0 + 10 * MS) == axis.table[200]
+    assert axis.flush(T0 + 30 * MS) is None
+    assert axis.sent == 2
+
+
+def test_a_held_value_back_at_the_last_sent_one_is_dropped():
+    axis = AxisFilter(AxisMapping(cc=7, hysteresis=0, max_rate=100))
+    axis.update(0, T0)
+    assert axis.update(200, T0 + 2 * MS) is None
+    assert axis.update(0, T0 + 4 * MS) is None
+    assert axis.flush(T0 + 20 * MS) is None
+    assert axis.sent == 1
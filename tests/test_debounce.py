@@ -0,0 +1,40 @@
+from devices.debounce import DebounceProfile, InputState
+from devices.patterns import RELEASE
+
+MS = 1_000_000
+PROFILE = DebounceProfile(press_ms=60, release_ms=20, hold_ms=500)
+
+
+def test_held_reports_are_holds():
+    state = InputState(PROFILE, ['a', 'b'])
+    assert state.edge('a', 1000 * MS) == 'a'
+    assert state.edge('a', 1100 * MS) is None
+    assert state.edge('a', 1400 * MS) is None
+    assert state.edge(RELEASE, 1500 * MS) == RELEASE
+    assert state.holds == 2
+
+
+def test_press_after_missed_release_is_a_new_edge():
+    state = InputState(PROFILE, ['a', 'b'])
+    assert state.edge('a', 1000 * MS) == 'a'
+    # The [1, 0, 0] release report never arrived
+    assert state.edge('a', 2000 * MS) == 'a'
+    assert state.presses == 2
+    assert state.edge(RELEASE, 2100 * MS) == RELEASE
+
+
+def test_press_of_another_button_clears_a_stale_hold():
+    state = InputState(PROFILE, ['a', 'b'])
+    assert state.edge('a', 1000 * MS) == 'a'
+    assert state.edge('b', 1100 * MS) == 'b'
+    assert state.held_count == 1
+    # 'a' was released when 'b' went down, so it presses again
+    assert state.edge('a', 1200 * MS) == 'a'
+
+
+def test_retransmit_is_still_a_bounce():
+    state = InputState(PROFILE, ['a'])
+    assert state.edge('a', 1000 * MS) == 'a'
+    assert state.edge(RELEASE, 1010 * MS) == RELEASE
+    assert state.edge('a', 1030 * MS) is None
+    assert state.bounces == 1
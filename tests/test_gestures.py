@@ -0,0 +1,109 @@
+import time
+
+from devices.patterns import RELEASE
+from runtime.gestures import Gesture, GestureConfig, GestureEngine, TimerWheel
+from runtime.threads import ActionEvent
+
+MS = 1_000_000
+
+
+class Pedals:
+    """A gesture engine fed by hand, with a clock that only moves on advance()."""
+
+    def __init__(self, **config):
+        self.sent = []
+        self.engine = GestureEngine(GestureConfig(**config), lambda event: self.sent.append(event.action))
+        self.start_ns = time.monotonic_ns()
+
+    def press(self, action, at_ms, pedal=b'p1'):
+        self.engine.feed(ActionEvent(action, 'Pedal', pedal, self.start_ns + at_ms * MS, 0))
+
+    def release(self, at_ms, pedal=b'p1'):
+        self.press(RELEASE, at_ms, pedal)
+
+    def advance(self, to_ms):
+        self.engine.advance(self.start_ns + to_ms * MS)
+
+
+def test_long_press():
+    pedals = Pedals(gestures={'7': Gesture(long_press='8')}, long_press_ms=500)
+    pedals.press('7', 0)
+    pedals.advance(400)
+    assert pedals.sent == []
+    pedals.advance(600)
+    assert pedals.sent == ['8']
+    # Released after the long press fired: no tap on top
+    pedals.release(700)
+    pedals.advance(1500)
+    assert pedals.sent == ['8']
+
+
+def test_short_press_of_a_long_press_key_is_a_tap():
+    pedals = Pedals(gestures={'7': Gesture(long_press='8')}, long_press_ms=500)
+    pedals.press('7', 0)
+    pedals.release(100)
+    assert pedals.sent == ['7']
+    pedals.advance(1000)
+    assert pedals.sent == ['7']
+
+
+def test_double_tap_and_single_tap():
+    pedals = Pedals(gestures={'a': Gesture(double_tap='c')}, double_tap_ms=300)
+    pedals.press('a', 0)
+    pedals.release(50)
+    pedals.press('a', 120)
+    assert pedals.sent == ['c']
+    pedals.release(170)
+
+    pedals.advance(1000)
+    pedals.press('a', 1000)
+    pedals.release(1050)
+    assert pedals.sent == ['c']
+    pedals.advance(1400)
+    assert pedals.sent == ['c', 'a']
+
+
+def test_release_action():
+    pedals = Pedals(gestures={'1': Gesture(release='1')})
+    pedals.press('1', 0)
+    pedals.release(200)
+    assert pedals.sent == ['1', '1']
+
+
+def test_chord_on_two_pedals():
+    pedals = Pedals(chords={('a', 'b'): 'h'}, chord_ms=50)
+    pedals.press('a', 0, b'p1')
+    pedals.press('b', 10, b'p2')
+    assert pedals.sent == ['h']
+    pedals.release(100, b'p1')
+    pedals.release(100, b'p2')
+    assert pedals.sent == ['h']
+
+
+def test_chord_key_alone_fires_after_the_window():
+    pedals = Pedals(chords={('a', 'b'): 'h'}, chord_ms=50)
+    pedals.press('a', 0)
+    pedals.advance(20)
+    assert pedals.sent == []
+    pedals.advance(100)
+    assert pedals.sent == ['a']
+
+
+def test_timers_that_wrap_around_the_wheel():
+    # 8 slots of 5 ms: one turn is 40 ms
+    wheel = TimerWheel(tick_ms=5, slots=8)
+    start_ns = wheel.current_tick * wheel.tick_ns
+    fired = []
+    wheel.schedule(start_ns + 100 * MS, lambda: fired.append('late'))
+    wheel.schedule(start_ns + 20 * MS, lambda: fired.append('early'))
+    cancelled = wheel.schedule(start_ns + 60 * MS, lambda: fired.append('cancelled'))
+    wheel.cancel(cancelled)
+
+    wheel.advance(start_ns + 45 * MS)
+    assert fired == ['early']
+    # The 100 ms timer hashes to the same slot as the 20 and 60 ms ones; it waits for its own turn
+    wheel.advance(start_ns + 95 * MS)
+    assert fired == ['early']
+    wheel.advance(start_ns + 100 * MS)
+    assert fired == ['early', 'late']
+    assert wheel.pending == 0
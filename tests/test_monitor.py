@@ -0,0 +1,55 @@
+from devices import hidbackend, hidraw
+from runtime.monitor import DeviceMonitor, DeviceType
+
+AB = (0x2717, 0x0040)
+JOYSTICK = (0x0810, 0x0001)
+
+
+class FakeHandler:
+    def __init__(self):
+        self.path = None
+        self.device = None
+        self.unit = None
+
+    def connect(self, path):
+        self.path = path
+        self.device = object()
+        return True
+
+
+def fake_sysfs(root, nodes):
+    """hidraw sysfs entries: node name -> (vendor id, product id, serial)."""
+    for name, (vendor_id, product_id, serial) in nodes.items():
+        device = root / name / 'device'
+        device.mkdir(parents=True)
+        (device / 'uevent').write_text(f"HID_ID=0005:{vendor_id:08X}:{product_id:08X}\nHID_UNIQ={serial}\n")
+
+
+def monitor(attached):
+    types = [DeviceType("AB shutter", *AB, FakeHandler), DeviceType("joystick", *JOYSTICK, FakeHandler)]
+    return DeviceMonitor(types, on_attach=attached.append, on_detach=None)
+
+
+def cache_entry(type_name, node, serial=''):
+    return {'type': type_name, 'path': f"/dev/{node}".encode().hex(), 'serial': serial}
+
+
+def test_warm_start_checks_vendor_and_product(tmp_path, monkeypatch):
+    monkeypatch.setattr(hidbackend, '_backend', hidraw)
+    monkeypatch.setattr(hidraw, 'SYSFS_ROOT', str(tmp_path))
+    # After a reboot the joystick got the node the shutter had
+    fake_sysfs(tmp_path, {'hidraw0': (*JOYSTICK, ''), 'hidraw1': (*AB, 'aa:bb')})
+    attached = []
+    assert monitor(attached).warm_start([cache_entry("AB shutter", 'hidraw0')]) == 0
+    assert attached == []
+
+    entries = [cache_entry("AB shutter", 'hidraw1', 'aa:bb'), cache_entry("joystick", 'hidraw0')]
+    assert monitor(attached).warm_start(entries) == 2
+    assert [handler.path for handler in attached] == [b'/dev/hidraw1', b'/dev/hidraw0']
+
+
+def test_warm_start_scans_when_the_backend_cannot_check(monkeypatch):
+    monkeypatch.setattr(hidbackend, '_backend', hidbackend.hid)
+    attached = []
+    assert monitor(attached).warm_start([cache_entry("joystick", 'hidraw0')]) == 0
+    assert attached == []
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from midi.output import MIDIOutputStage
+from midi.tempo import CLOCK, MIDIClock
+
+
+class SlowOutput:
+    """A MIDI output that notices overlapping send_message calls."""
+
+    def __init__(self):
+        self.sending = False
+        self.overlaps = 0
+        self.messages = []
+
+    def send_message(self, message):
+        if self.sending:
+            self.overlaps += 1
+        self.sending = True
+        time.sleep(0.0005)
+        self.messages.append(tuple(message))
+        self.sending = False
+
+
+def test_clock_and_output_thread_do_not_send_at_once():
+    midi_out = SlowOutput()
+    stage = MIDIOutputStage()
+    stage.start()
+    clock = MIDIClock([midi_out])
+
+    def ticks():
+        for _ in range(200):
+            clock._send(CLOCK)
+
+    ticker = threading.Thread(target=ticks)
+    ticker.start()
+    for value in range(200):
+        stage.submit(((midi_out, (0xB0, 1, value % 128)),), key=object())
+        time.sleep(0.0002)
+    ticker.join()
+    stage.stop()
+
+    assert midi_out.overlaps == 0
+    assert midi_out.messages.count(CLOCK) == 200
+    assert stage.sent == 200
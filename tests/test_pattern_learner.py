@@ -0,0 +1,63 @@
+from devices.patterns import RELEASE, Masked
+from helpers.pattern_learner import cluster, learn_patterns, sequences_from_log
+from runtime.recorder import DEVICE_INFO, FILE_HEADER, KIND_DEVICE, KIND_REPORT, LOG_MAGIC, LOG_VERSION, RECORD_HEADER
+
+MS = 1_000_000
+UP = (2, 0x00, 0x00, 0x00)
+# Sent while any button is held
+HELD = (3, 0x00)
+
+
+def write_log(filename, reports):
+    with open(filename, 'wb') as log_file:
+        log_file.write(FILE_HEADER.pack(LOG_MAGIC, LOG_VERSION))
+        info = DEVICE_INFO.pack(0x1234, 0x5678) + b'sim/learn/0'
+        log_file.write(RECORD_HEADER.pack(KIND_DEVICE, 0, len(info), 0))
+        log_file.write(info)
+        for timestamp_ns, report in reports:
+            log_file.write(RECORD_HEADER.pack(KIND_REPORT, 0, len(report), timestamp_ns))
+            log_file.write(bytes(report))
+
+
+def test_learns_prefixes_and_release_from_a_log(tmp_path):
+    first, second = (2, 0x01, 0x00, 0x00), (2, 0x02, 0x00, 0x00)
+    reports = []
+    # Each press: the button report, one report while held, then the release
+    for index, button in enumerate([first, second, first, second]):
+        start_ns = 1000 * MS + index * 500 * MS
+        reports += [(start_ns, button), (start_ns + 20 * MS, HELD), (start_ns + 80 * MS, UP)]
+    filename = str(tmp_path / 'presses.pbhl')
+    write_log(filename, reports)
+
+    vendor_id, product_id, sequences = sequences_from_log(filename, 250)
+    assert (vendor_id, product_id) == (0x1234, 0x5678)
+    assert len(sequences) == 4
+    labelled = cluster(sequences)
+    assert sorted(labelled) == ['button1', 'button2']
+
+    profile = learn_patterns(labelled)
+    assert profile.patterns == {(2, 0x01): 'button1', (2, 0x02): 'button2', (2, 0x00): RELEASE}
+    assert profile.recognised == {'button1': (2, 2), 'button2': (2, 2)}
+    assert profile.holds == {'button1': 1, 'button2': 1}
+    assert not profile.problems
+
+
+def test_masks_the_state_bits_that_vary_between_presses():
+    # The low bits of byte 1 count presses; the high nibble names the button
+    labelled = {
+        'a': [((1, 0x10 | count, 9), (1, 0x00, 0)) for count in range(3)],
+        'b': [((1, 0x20, 9), (1, 0x00, 0)) for _ in range(3)],
+    }
+    profile = learn_patterns(labelled)
+    assert profile.patterns == {(1, Masked(0x10, 0xFC)): 'a', (1, 0x20): 'b', (1, 0x00): RELEASE}
+    assert profile.recognised == {'a': (3, 3), 'b': (3, 3)}
+
+
+def test_reports_shared_by_every_button_are_a_problem():
+    labelled = {
+        'a': [((1, 0x05),), ((1, 0x05),)],
+        'b': [((1, 0x05),), ((1, 0x05),)],
+    }
+    profile = learn_patterns(labelled)
+    assert not profile.patterns
+    assert len(profile.problems) == 2
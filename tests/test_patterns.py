@@ -0,0 +1,62 @@
+from devices.patterns import ANY, Masked, PatternMatcher
+
+
+def test_longest_pattern_wins():
+    matcher = PatternMatcher({(1,): 'short', (1, 2): 'long', (1, 2, 3): 'longest'})
+    assert matcher.match([1, 9]) == 'short'
+    assert matcher.match([1, 2, 9]) == 'long'
+    assert matcher.match([1, 2, 3, 4]) == 'longest'
+
+
+def test_first_declared_wins_among_equal_lengths():
+    matcher = PatternMatcher({(1, ANY): 'any', (1, 2): 'exact'})
+    assert matcher.match([1, 2]) == 'any'
+    assert matcher.match([1, 7]) == 'any'
+
+
+def test_any_and_masked_bytes():
+    matcher = PatternMatcher({(1, ANY, 5): 'wild', (2, Masked(0x80, 0xF0)): 'masked'})
+    assert matcher.match([1, 0, 5]) == 'wild'
+    assert matcher.match([1, 255, 5, 0]) == 'wild'
+    assert matcher.match([2, 0x8F]) == 'masked'
+    assert matcher.match([2, 0x7F]) is None
+
+
+def test_release_pattern_next_to_presses():
+    # The AB shutter's buttons and the report every button sends when let go
+    matcher = PatternMatcher({(1, 1, 0): 'a', (1, 2, 0): 'b', (1, 0, 0): 'release'})
+    assert matcher.match([1, 1, 0]) == 'a'
+    assert matcher.match([1, 2, 0]) == 'b'
+    assert matcher.match([1, 0, 0]) == 'release'
+    assert matcher.match([1, 3, 0]) is None
+
+
+def test_non_matching_reports_and_prefixes():
+    matcher = PatternMatcher({(1, 2, 3): 'a'})
+    assert matcher.match([1, 2]) is None
+    assert matcher.match([1, 3, 3]) is None
+    assert matcher.match([]) is None
+    assert PatternMatcher({}).match([1]) is None
+
+
+def starts_with(pattern, report):
+    """Reference check of one pattern, byte by byte."""
+    if len(report) < len(pattern):
+        return False
+    for spec, byte in zip(pattern, report):
+        if isinstance(spec, Masked):
+            if byte & spec.mask != spec.value & spec.mask:
+                return False
+        elif spec is not ANY and spec != byte:
+            return False
+    return True
+
+
+def test_matcher_agrees_with_a_pattern_by_pattern_check():
+    patterns = {(1, ANY): 'x', (1, Masked(4, 4), 0): 'y', (3,): 'z'}
+    matcher = PatternMatcher(patterns)
+    for report in ([1, 4, 0], [1, 5, 0], [1, 3, 0], [3, 1], [2, 4, 0]):
+        matching = [(pattern, action) for pattern, action in patterns.items() if starts_with(pattern, report)]
+        # Longest first; sorted() keeps declaration order among equal lengths
+        best = sorted(matching, key=lambda item: -len(item[0]))
+        assert matcher.match(report) == (best[0][1] if best else None)
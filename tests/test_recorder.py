@@ -0,0 +1,39 @@
+from midi.controller import MIDIController
+from runtime.recorder import (
+    DEVICE_INFO, FILE_HEADER, KIND_DEVICE, KIND_REPORT, LOG_MAGIC, LOG_VERSION, RECORD_HEADER, replay_log,
+)
+
+import main as pedalboard
+
+MS = 1_000_000
+PRESS = bytes([1, 1, 0])
+RELEASE = bytes([1, 0, 0])
+
+
+def write_log(filename, config, reports):
+    with open(filename, 'wb') as log_file:
+        log_file.write(FILE_HEADER.pack(LOG_MAGIC, LOG_VERSION))
+        info = DEVICE_INFO.pack(config.vendor_id, config.product_id) + b'sim/ab/0'
+        log_file.write(RECORD_HEADER.pack(KIND_DEVICE, 0, len(info), 0))
+        log_file.write(info)
+        for timestamp_ns, report in reports:
+            log_file.write(RECORD_HEADER.pack(KIND_REPORT, 0, len(report), timestamp_ns))
+            log_file.write(report)
+
+
+def test_max_speed_replay_keeps_every_press(tmp_path):
+    manager = pedalboard.DeviceManager()
+    manager.midi_controller = MIDIController(manager.mappings.midi)
+    filename = str(tmp_path / 'presses.pbhl')
+    # Three presses 150 ms apart, well outside the debounce windows
+    write_log(filename, manager.mappings.ab, [
+        (1000 * MS, PRESS), (1075 * MS, RELEASE),
+        (1150 * MS, PRESS), (1225 * MS, RELEASE),
+        (1300 * MS, PRESS), (1375 * MS, RELEASE),
+    ])
+    try:
+        assert replay_log(filename, manager, pedalboard.device_types(), realtime=False) == 6
+        assert manager.latency.stages['total'].count == 3
+        assert len(manager.midi_controller.midi_out.messages) == 3
+    finally:
+        manager.cleanup()
@@ -0,0 +1,62 @@
+from dataclasses import replace
+
+import pytest
+
+import main as pedalboard
+from midi import controller as midi_controller
+from midi.controller import MIDIController
+from midi.routing import MIDIPort
+from midi.scenes import Scene
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """Every MIDI output the reload opens."""
+    ports = []
+
+    def open_ports(wanted):
+        result = real_open_ports(wanted)
+        ports.extend(result.values())
+        return result
+
+    real_open_ports = midi_controller.open_ports
+    monkeypatch.setattr(midi_controller, 'open_ports', open_ports)
+    return ports
+
+
+def with_port(mappings, **changes):
+    midi = replace(mappings.midi, ports={**mappings.midi.ports, 'extra': MIDIPort('extra')}, **changes)
+    return replace(mappings, midi=midi)
+
+
+def test_failed_compile_closes_the_new_ports(opened):
+    manager = pedalboard.DeviceManager()
+    manager.midi_controller = MIDIController(manager.mappings.midi)
+    opened.clear()
+    mappings = with_port(manager.mappings, scenes={'a': Scene({'no-such-command': True})})
+    try:
+        with pytest.raises(ValueError):
+            manager.prepare_reload(mappings)
+        assert len(opened) == 1
+        assert not opened[0].is_port_open()
+    finally:
+        manager.cleanup()
+
+
+def test_reload_not_picked_up_closes_the_new_ports(opened, monkeypatch, tmp_path):
+    manager = pedalboard.DeviceManager()
+    manager.midi_controller = MIDIController(manager.mappings.midi)
+    opened.clear()
+    manager.restore_state(str(tmp_path / 'state.bin'))
+    commands = {**manager.mappings.midi.commands, '99': (99, 'Extra')}
+    monkeypatch.setattr(pedalboard, 'load_mappings', lambda reload: with_port(manager.mappings, commands=commands))
+    monkeypatch.setattr(pedalboard, 'APPLY_TIMEOUT', 0.01)
+    try:
+        # No input loop is running to apply it
+        assert manager.reload().startswith("error:")
+        assert len(opened) == 1
+        assert not opened[0].is_port_open()
+        assert not (tmp_path / 'state.bin.tmp').exists()
+        assert manager._reload is None
+    finally:
+        manager.cleanup()
@@ -0,0 +1,21 @@
+from midi.state import StateStore
+
+
+def test_install_swaps_in_the_new_layout(tmp_path):
+    filename = str(tmp_path / 'state.bin')
+    store = StateStore(filename)
+    store.layout({'1': True, '2': False}, None, {'midi': 1})
+    old_map = store._slots[0]
+
+    prepared = store.prepare({'2': False, '3': False}, None, {'midi': 2})
+    # Toggled between prepare and install
+    store.set_state('2', True)
+    store.install(prepared, {'2': True, '3': False}, 'live')
+    store.set_state('3', True)
+    store.stop()
+
+    assert old_map.closed
+    saved = StateStore(filename)
+    assert saved.saved_states == {'2': True, '3': True}
+    assert saved.saved_scene == 'live'
+    assert saved.saved_versions == {'midi': 2}
@@ -0,0 +1,88 @@
+import time
+
+from midi.tempo import CLOCK, PPQN, MIDIClock, TapTempo
+
+MS = 1_000_000
+
+
+def tap_series(tempo, intervals_ms, start_ms=1000):
+    """Tap at the given intervals; returns what every tap returned."""
+    at = start_ms
+    results = [tempo.tap(at * MS)]
+    for interval in intervals_ms:
+        at += interval
+        results.append(tempo.tap(at * MS))
+    return results
+
+
+def test_steady_taps_give_the_mean_tempo():
+    tempo = TapTempo(taps=4)
+    results = tap_series(tempo, [500, 500, 500])
+    assert results[0] is None
+    assert results[1:] == [120.0, 120.0, 120.0]
+    # Only the last `taps` intervals count
+    assert tap_series(tempo, [600] * 4, start_ms=2500)[-1] == 100.0
+
+
+def test_one_outlier_is_ignored():
+    tempo = TapTempo(taps=4, tolerance=0.2)
+    tap_series(tempo, [500, 500, 500])
+    # A missed tap doubles one interval
+    assert tempo.tap(3500 * MS) is None
+    assert tempo.rejected == 1
+    assert tempo.tap(4000 * MS) == 120.0
+
+
+def test_two_agreeing_outliers_are_a_tempo_change():
+    tempo = TapTempo(taps=4, tolerance=0.2)
+    results = tap_series(tempo, [500, 500, 500, 375, 375])
+    assert results[-2] is None
+    assert results[-1] == 160.0
+    assert list(tempo.intervals) == [375 * MS, 375 * MS]
+
+
+def test_double_hits_and_long_pauses():
+    tempo = TapTempo(taps=4, min_bpm=30, max_bpm=300)
+    tap_series(tempo, [500, 500])
+    # Faster than 300 BPM: a double hit, and the tap it followed still counts
+    assert tempo.tap(2050 * MS) is None
+    assert tempo.tap(2500 * MS) == 120.0
+    # Longer than a 30 BPM beat starts over
+    assert tempo.tap(5000 * MS) is None
+    assert len(tempo.intervals) == 0
+    assert tempo.tap(5400 * MS) == 150.0
+
+
+class RecordingOutput:
+    def __init__(self):
+        self.ticks = []
+
+    def send_message(self, message):
+        if tuple(message) == CLOCK:
+            self.ticks.append(time.monotonic_ns())
+
+
+def test_set_tempo_moves_the_deadlines_to_the_new_anchor():
+    midi_out = RecordingOutput()
+    clock = MIDIClock([midi_out])
+    clock.start()
+    try:
+        anchor_ns = time.monotonic_ns() + 30 * MS
+        clock.set_tempo(600, anchor_ns)
+        time.sleep(0.1)
+        assert midi_out.ticks and midi_out.ticks[0] >= anchor_ns
+
+        retempo_ns = time.monotonic_ns()
+        new_anchor_ns = retempo_ns + 50 * MS
+        clock.set_tempo(300, new_anchor_ns)
+        time.sleep(0.15)
+    finally:
+        clock.stop()
+
+    period_ns = 60e9 / (300 * PPQN)
+    # A tick may already have been on its way when the tempo changed
+    after = [tick for tick in midi_out.ticks if tick > retempo_ns + MS]
+    assert len(after) >= 5
+    assert after[0] >= new_anchor_ns
+    # No faster than the new tempo (late wake-ups only ever delay or skip a tick)
+    assert len(after) <= (after[-1] - new_anchor_ns) // period_ns + 1
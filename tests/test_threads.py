@@ -0,0 +1,10 @@
+import main as pedalboard
+from devices.shutterAB import ShutterABHandler
+from runtime.threads import ActionEvent
+
+
+def test_event_source_matches_the_handler_label():
+    handler = ShutterABHandler(pedalboard.load_mappings().ab)
+    handler.path = b'sim/ab/0'
+    event = ActionEvent.from_handler(handler, 'a')
+    assert event.source == pedalboard._source_label(handler) == 'ShutterABHandler:sim/ab/0'
@@ -0,0 +1,24 @@
+import functools
+import time
+from multiprocessing import shared_memory
+
+import pytest
+
+import main as pedalboard
+from devices.shutterAB import ShutterABHandler
+from runtime.workers import WorkerHandler
+
+
+def test_detached_worker_releases_its_ring():
+    manager = pedalboard.DeviceManager()
+    proxy = WorkerHandler(functools.partial(ShutterABHandler, manager.mappings.ab))
+    assert proxy.connect(b'sim/ab/0')
+    manager.attach_handler(proxy)
+    name = proxy.ring.name
+
+    manager.detach_handler(proxy)
+    manager.tick(time.monotonic_ns())
+
+    assert proxy.ring is None
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)